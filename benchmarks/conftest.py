@@ -0,0 +1,40 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+# 未配置 .env 时提供 SECRET_KEY（导入 wecom.db 时即需要）
+os.environ.setdefault("SECRET_KEY", "bench_secret")
+
+from wecom.config import settings as settings_module  # noqa: E402
+
+# 各基准的平均耗时上限（微秒），按测试 id 索引
+BUDGETS = json.loads(Path(__file__).with_name("budgets.json").read_text())
+# 在较慢的机器上可整体放宽，例如 BENCH_BUDGET_FACTOR=2
+BUDGET_FACTOR = float(os.environ.get("BENCH_BUDGET_FACTOR", "1"))
+
+
+@pytest.fixture(autouse=True)
+def fresh_settings():
+    settings_module.reset_settings()
+    yield
+    settings_module.reset_settings()
+
+
+@pytest.fixture
+def budget(request):
+    """基准跑完后调用 budget(benchmark)，平均耗时超过上限时失败"""
+    def check(benchmark):
+        limit = BUDGETS.get(request.node.name)
+        stats = getattr(benchmark, "stats", None)
+        if limit is None or stats is None:
+            # 未设上限或使用了 --benchmark-disable
+            return
+        mean_us = stats.stats.mean * 1e6
+        if mean_us > limit * BUDGET_FACTOR:
+            pytest.fail(
+                f"{request.node.name}: mean {mean_us:.1f}us exceeds budget "
+                f"{limit * BUDGET_FACTOR:.1f}us"
+            )
+    return check
@@ -0,0 +1,117 @@
+# 本地模拟企业微信服务端（qyapi.weixin.qq.com），用于压测时替代真实接口
+# 启动：python benchmarks/fake_wecom.py --port 9000 --latency-ms 50 --error-rate 0.01
+# 被测服务设置 WECOM_API_BASE=http://127.0.0.1:9000/cgi-bin
+# 回调方向（企业微信 -> 本服务）由 loadtest.py 的 callback 场景模拟
+
+import argparse
+import asyncio
+import random
+import secrets
+from collections import Counter
+
+from fastapi import FastAPI, Query, Request
+
+# 常见错误码：45009 接口调用超过限制，42001 access_token 过期，-1 系统繁忙
+DEFAULT_ERRCODE = 45009
+
+
+def create_app(
+    latency_ms: float = 0,
+    jitter_ms: float = 0,
+    error_rate: float = 0,
+    errcode: int = DEFAULT_ERRCODE,
+    invalid_prefix: str = "invalid_",
+) -> FastAPI:
+    """
+    latency_ms / jitter_ms: 每个请求的模拟耗时（均匀分布在 ±jitter 内）
+    error_rate: 按该概率返回 errcode
+    invalid_prefix: 以此开头的 userid 视为无效成员，出现在 invaliduser 中
+    """
+    app = FastAPI(title="fake wecom")
+    stats = Counter()
+    tokens = set()
+
+    async def delay():
+        wait = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+        if wait > 0:
+            await asyncio.sleep(wait / 1000)
+
+    def maybe_error():
+        if error_rate and random.random() < error_rate:
+            stats["errors"] += 1
+            return {"errcode": errcode, "errmsg": "simulated error"}
+        return None
+
+    def new_token() -> str:
+        token = secrets.token_hex(32)
+        tokens.add(token)
+        return token
+
+    @app.get("/cgi-bin/service/get_provider_token")
+    async def get_provider_token(corpid: str = Query(...), provider_secret: str = Query(...)):
+        """被测服务（AsyncWeComClient._fetch_access_token）实际调用的取 token 接口"""
+        stats["get_provider_token"] += 1
+        await delay()
+        error = maybe_error()
+        if error:
+            return error
+        return {"errcode": 0, "errmsg": "ok", "provider_access_token": new_token(), "expires_in": 7200}
+
+    @app.get("/cgi-bin/gettoken")
+    async def gettoken(corpid: str = Query(...), corpsecret: str = Query(...)):
+        stats["gettoken"] += 1
+        await delay()
+        error = maybe_error()
+        if error:
+            return error
+        return {"errcode": 0, "errmsg": "ok", "access_token": new_token(), "expires_in": 7200}
+
+    @app.post("/cgi-bin/message/send")
+    async def message_send(request: Request, access_token: str = Query(...)):
+        stats["message_send"] += 1
+        await delay()
+        if access_token not in tokens:
+            return {"errcode": 40014, "errmsg": "invalid access_token"}
+        error = maybe_error()
+        if error:
+            return error
+        body = await request.json()
+        users = [u for u in body.get("touser", "").split("|") if u]
+        invalid = [u for u in users if u.startswith(invalid_prefix)]
+        if users and len(invalid) == len(users):
+            return {"errcode": 81013, "errmsg": "user & party & tag all invalid",
+                    "invaliduser": "|".join(invalid)}
+        return {"errcode": 0, "errmsg": "ok", "invaliduser": "|".join(invalid),
+                "msgid": secrets.token_hex(8)}
+
+    @app.get("/_stats")
+    async def get_stats():
+        """压测结束后查看各接口被调用次数"""
+        return dict(stats)
+
+    @app.post("/_stats/reset")
+    async def reset_stats():
+        stats.clear()
+        return {}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local fake WeCom API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--errcode", type=int, default=DEFAULT_ERRCODE)
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.errcode)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
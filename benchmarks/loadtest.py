@@ -0,0 +1,250 @@
+# 端到端压测：按场景并发请求被测服务，统计吞吐与 p50/p95/p99 延迟，结果保存为 JSON
+#
+# 场景：
+#   send      HMAC 签名的批量发送 POST /api/messages/bulk
+#   login     登录突发 POST /auth/token
+#   poll      通知轮询 GET /api/notifications
+#   callback  模拟企业微信推送加密回调 POST /callback/{corp_id}
+#
+# 示例：
+#   python benchmarks/loadtest.py --scenarios send,poll --concurrency 50 --duration 30 \
+#       --output benchmarks/results/$(git rev-parse --short HEAD).json \
+#       --compare benchmarks/results/baseline.json
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法计算百分位，输入需已排序"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0,
+        "mean_ms": ms(sum(values) / len(values)) if values else 0,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else 0,
+    }
+
+
+def succeeded(resp: httpx.Response) -> bool:
+    """
+    HTTP 状态成功且响应体没有报告失败
+    /api/messages/bulk 部分或全部批次失败时仍返回 200，需按 failed_batches 和 recipients 判断
+    """
+    if resp.status_code >= 400:
+        return False
+    if resp.headers.get("content-type", "").startswith("application/json"):
+        body = resp.json()
+        if isinstance(body, dict) and (
+            body.get("failed_batches") or "failed" in (body.get("recipients") or {}).values()
+        ):
+            return False
+    return True
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+class Scenarios:
+    """各场景的单次请求，返回 httpx.Response"""
+
+    def __init__(self, args):
+        self.args = args
+        self._bearer: Optional[str] = None
+        self._crypto = None
+
+    async def send(self, client: httpx.AsyncClient) -> httpx.Response:
+        body = json.dumps({
+            "content": "load test",
+            "touser": [f"user{random.randrange(100000)}" for _ in range(self.args.recipients)],
+        }).encode()
+        signature = hmac.new(self.args.api_secret.encode(), body, hashlib.sha256).hexdigest()
+        return await client.post("/api/messages/bulk", content=body, headers={
+            "Content-Type": "application/json",
+            "X-API-Key": self.args.api_key,
+            "X-Signature": signature,
+        })
+
+    async def login(self, client: httpx.AsyncClient) -> httpx.Response:
+        return await client.post("/auth/token", data={
+            "username": self.args.email, "password": self.args.password
+        })
+
+    async def poll(self, client: httpx.AsyncClient) -> httpx.Response:
+        if self._bearer is None:
+            resp = await self.login(client)
+            resp.raise_for_status()
+            self._bearer = resp.json()["access_token"]
+        return await client.get(
+            "/api/notifications", params={"limit": 50},
+            headers={"Authorization": f"Bearer {self._bearer}"}
+        )
+
+    async def callback(self, client: httpx.AsyncClient) -> httpx.Response:
+        if self._crypto is None:
+            # 延迟导入：仅此场景需要 wecom 包及其配置
+            from wecom.core.callback import WeComCrypto
+            self._crypto = WeComCrypto(self.args.callback_token, self.args.aes_key, self.args.corp_id)
+        event = (
+            f"<xml><ToUserName>{self.args.corp_id}</ToUserName><FromUserName>sys</FromUserName>"
+            f"<CreateTime>{int(time.time())}</CreateTime><MsgType>event</MsgType>"
+            f"<Event>change_contact</Event><ChangeType>update_user</ChangeType>"
+            f"<UserID>user{random.randrange(10 ** 9)}</UserID></xml>"
+        )
+        encrypted = self._crypto.encrypt(event)
+        timestamp, nonce = str(int(time.time())), str(random.randrange(10 ** 9))
+        return await client.post(
+            f"/callback/{self.args.corp_id}",
+            params={
+                "msg_signature": self._crypto.signature(timestamp, nonce, encrypted),
+                "timestamp": timestamp, "nonce": nonce,
+            },
+            content=f"<xml><Encrypt><![CDATA[{encrypted}]]></Encrypt></xml>",
+        )
+
+
+async def run_scenario(name: str, request: Callable, args) -> dict:
+    """concurrency 个协程在 duration 秒内循环发请求"""
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        # 预热，避免首个请求的建连和 token 获取计入结果
+        try:
+            await request(client)
+        except httpx.HTTPError:
+            pass
+        deadline = time.perf_counter() + args.duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    resp = await request(client)
+                    ok = succeeded(resp)
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    result = summarize(latencies, errors, elapsed)
+    print(f"{name:>9}: {result['throughput_rps']:>9} rps  p50 {result['p50_ms']} ms  "
+          f"p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  errors {errors}")
+    return result
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """与基线比较：吞吐下降或 p95/p99 上升超过 threshold 视为回归"""
+    regressions = []
+    for name, stats in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if base["throughput_rps"] and stats["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {base['throughput_rps']} -> {stats['throughput_rps']} rps")
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and stats[key] > base[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {base[key]} -> {stats[key]}")
+    return regressions
+
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="End-to-end load test for the wecom service")
+    parser.add_argument("--base-url", default=env("LOADTEST_BASE_URL", "http://127.0.0.1:8000"))
+    parser.add_argument("--scenarios", default="send,login,poll",
+                        help="comma separated: send, login, poll, callback")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="seconds per scenario")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--recipients", type=int, default=100, help="touser count per send")
+    parser.add_argument("--api-key", default=env("LOADTEST_API_KEY"))
+    parser.add_argument("--api-secret", default=env("LOADTEST_API_SECRET"))
+    parser.add_argument("--email", default=env("LOADTEST_EMAIL"))
+    parser.add_argument("--password", default=env("LOADTEST_PASSWORD"))
+    parser.add_argument("--corp-id", default=env("LOADTEST_CORP_ID"))
+    parser.add_argument("--callback-token", default=env("LOADTEST_CALLBACK_TOKEN"))
+    parser.add_argument("--aes-key", default=env("LOADTEST_AES_KEY"))
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="allowed relative regression (default 10%%)")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    scenarios = Scenarios(args)
+    results: Dict[str, dict] = {}
+    for name in filter(None, args.scenarios.split(",")):
+        request = getattr(scenarios, name, None)
+        if request is None or name.startswith("_"):
+            print(f"Unknown scenario: {name}", file=sys.stderr)
+            return 2
+        results[name] = await run_scenario(name, request, args)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "recipients": args.recipients,
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
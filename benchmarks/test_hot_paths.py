@@ -0,0 +1,180 @@
+# 每个请求都会经过的认证与 token 路径的微基准
+# 运行：pytest benchmarks/ --benchmark-only
+# 与保存的基线比较：pytest benchmarks/ --benchmark-autosave，之后
+#   pytest benchmarks/ --benchmark-compare --benchmark-compare-fail=mean:15%
+
+import asyncio
+import hashlib
+import hmac
+import os
+from datetime import timedelta
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fakeredis import FakeAsyncRedis
+from jose import jwt
+
+from wecom.config import get_settings
+from wecom.core import auth
+from wecom.core.auth import EnterpriseAuthenticator, SecretManager
+from wecom.core.client import WeComClient, _loop_thread
+from wecom.core.token_cache import AccessTokenCache
+from wecom.routers.auth import create_access_token
+
+API_KEY = "bench_api_key"
+SECRET = "bench_enterprise_secret"
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def scalars(self):
+        return self
+
+    def first(self):
+        return self.row
+
+
+class FakeSession:
+    """返回固定企业记录的异步会话，不访问数据库"""
+    def __init__(self, enterprise):
+        self.enterprise = enterprise
+
+    async def execute(self, statement):
+        return FakeResult(self.enterprise)
+
+
+class FakeRequest:
+    """按 64KB 分块返回请求体（与 uvicorn 的接收块大小一致）"""
+    def __init__(self, body: bytes, signature: str, chunk_size: int = 64 * 1024):
+        self.chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        self.headers = {"X-API-Key": API_KEY, "X-Signature": signature}
+        self.state = SimpleNamespace()
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.fixture(scope="module")
+def secret_manager():
+    return SecretManager()
+
+
+@pytest.fixture(scope="module")
+def enterprise(secret_manager):
+    class Enterprise:
+        id = 1
+        name = "Bench Corp"
+        is_active = True
+        api_key = API_KEY
+        wecom_corp_id = "corp_bench"
+        wecom_secret = "wecom_secret"
+        db_cluster = None
+        encrypted_secret = secret_manager.encrypt_secret(SECRET)
+    return Enterprise
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.mark.parametrize("size", [1024, 64 * 1024, 1024 * 1024])
+def test_authenticate_request_cached(benchmark, budget, loop, secret_manager, enterprise, size):
+    body = os.urandom(size)
+    request = FakeRequest(body, hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest())
+    authenticator = EnterpriseAuthenticator(FakeSession(enterprise), secret_manager)
+    auth.credential_cache.clear()
+
+    result = benchmark(lambda: loop.run_until_complete(authenticator.authenticate_request(request)))
+    assert result["enterprise_id"] == 1
+    budget(benchmark)
+
+
+def test_authenticate_request_uncached(benchmark, budget, loop, secret_manager, enterprise):
+    body = b'{"content": "hello", "touser": ["zhangsan"]}'
+    request = FakeRequest(body, hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest())
+    authenticator = EnterpriseAuthenticator(FakeSession(enterprise), secret_manager)
+
+    def run():
+        auth.credential_cache.clear()
+        return loop.run_until_complete(authenticator.authenticate_request(request))
+
+    assert benchmark(run)["enterprise_id"] == 1
+    budget(benchmark)
+
+
+def test_decrypt_secret(benchmark, budget, secret_manager, enterprise):
+    assert benchmark(secret_manager.decrypt_secret, enterprise.encrypted_secret) == SECRET
+    budget(benchmark)
+
+
+def test_create_access_token(benchmark, budget):
+    token = benchmark(create_access_token, {"sub": "user@example.com"}, timedelta(minutes=30))
+    assert token.count(".") == 2
+    budget(benchmark)
+
+
+def test_jwt_decode(benchmark, budget):
+    settings = get_settings()
+    token = create_access_token({"sub": "user@example.com"}, timedelta(minutes=30))
+    payload = benchmark(jwt.decode, token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    assert payload["sub"] == "user@example.com"
+    budget(benchmark)
+
+
+def test_get_settings(benchmark, budget):
+    get_settings()
+    assert benchmark(get_settings) is get_settings()
+    budget(benchmark)
+
+
+@pytest.fixture
+def wecom_client(monkeypatch):
+    def handler(request):
+        return httpx.Response(200, json={
+            "errcode": 0, "errmsg": "ok",
+            "provider_access_token": "token_bench", "expires_in": 7200
+        })
+    monkeypatch.setattr(
+        "wecom.core.client.get_async_http_client",
+        lambda: httpx.AsyncClient(base_url="https://qyapi.weixin.qq.com/cgi-bin",
+                                  transport=httpx.MockTransport(handler))
+    )
+    client = WeComClient("corp_bench", "secret_bench")
+    client._async._token_cache = AccessTokenCache(FakeAsyncRedis())
+    return client
+
+
+def test_access_token_l1_hit(benchmark, budget, wecom_client):
+    wecom_client.access_token
+    assert benchmark(lambda: wecom_client.access_token) == "token_bench"
+    budget(benchmark)
+
+
+def test_access_token_l2_hit(benchmark, budget, wecom_client):
+    wecom_client.access_token
+    cache = wecom_client._async.token_cache
+
+    def run():
+        cache.invalidate("corp_bench")
+        return wecom_client.access_token
+
+    assert benchmark(run) == "token_bench"
+    budget(benchmark)
+
+
+def test_access_token_miss(benchmark, budget, wecom_client):
+    cache = wecom_client._async.token_cache
+
+    def run():
+        _loop_thread.run(cache.delete("corp_bench"))
+        return wecom_client.access_token
+
+    assert benchmark(run) == "token_bench"
+    budget(benchmark)
@@ -1,5 +1,5 @@
 __version__ = "0.1.0"
 
-from .config import get_settings, Settings
+from .config import get_settings, reload_settings, Settings
 
-__all__ = ['get_settings', 'Settings']
\ No newline at end of file
+__all__ = ['get_settings', 'reload_settings', 'Settings']
\ No newline at end of file
@@ -0,0 +1,4 @@
+# 启动耗时统计的起点：main 第一个导入本模块，记录的时间早于导入其他依赖
+import time
+
+import_started = time.perf_counter()
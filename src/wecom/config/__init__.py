@@ -1,3 +1,3 @@
-from .settings import get_settings, Settings
+from .settings import get_settings, reload_settings, subscribe, Settings
 
-__all__ = ['get_settings', 'Settings']
\ No newline at end of file
+__all__ = ['get_settings', 'reload_settings', 'subscribe', 'Settings']
@@ -1,6 +1,11 @@
+import logging
+import threading
+from functools import cached_property
 from pydantic import Field, AnyUrl, RedisDsn, PostgresDsn
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
 
 class Settings(BaseSettings):
     # 应用配置
@@ -19,6 +24,9 @@ class Settings(BaseSettings):
     REDIS_PORT: int = Field(6379, env="REDIS_PORT")
     REDIS_DB: int = Field(0, env="REDIS_DB")
     REDIS_PASSWORD: Optional[str] = Field(None, env="REDIS_PASSWORD")
+    REDIS_MAX_CONNECTIONS: int = Field(50, env="REDIS_MAX_CONNECTIONS")  # 每个连接池（同步一个，每个事件循环一个）
+    REDIS_POOL_TIMEOUT: float = Field(5.0, env="REDIS_POOL_TIMEOUT")  # 等待空闲连接的秒数
+    REDIS_SOCKET_TIMEOUT: float = Field(5.0, env="REDIS_SOCKET_TIMEOUT")
     
     # Celery 配置
     CELERY_BROKER_URL: AnyUrl = Field(
@@ -29,6 +37,13 @@ class Settings(BaseSettings):
         "redis://redis:6379/0", 
         env="CELERY_RESULT_BACKEND"
     )
+    CELERY_PREFETCH_MULTIPLIER: int = Field(4, env="CELERY_PREFETCH_MULTIPLIER")
+    CELERY_DELIVERY_QUEUE: str = Field("wecom.delivery", env="CELERY_DELIVERY_QUEUE")
+    CELERY_CALLBACK_QUEUE: str = Field("wecom.callback", env="CELERY_CALLBACK_QUEUE")
+
+    # 回调接收配置
+    CALLBACK_DEDUP_TTL: int = Field(86400, env="CALLBACK_DEDUP_TTL")  # 企业微信重试窗口内去重
+    CALLBACK_CONFIG_CACHE_TTL: int = Field(300, env="CALLBACK_CONFIG_CACHE_TTL")
 
     # 数据库配置
     POSTGRES_HOST: str = Field("postgres", env="POSTGRES_HOST")
@@ -45,11 +60,96 @@ class Settings(BaseSettings):
     POOL_TIMEOUT: int = Field(30, env="POOL_TIMEOUT")
     ECHO_POOL: bool = Field(False, env="ECHO_POOL")
 
+    # 只读副本连接串（JSON 数组），为空时所有查询走主库
+    DB_REPLICA_URLS: List[str] = Field([], env="DB_REPLICA_URLS")
+    DB_REPLICA_CHECK_INTERVAL: int = Field(5, env="DB_REPLICA_CHECK_INTERVAL")  # 副本健康检查间隔（秒）
+
+    # 分库配置：Enterprise.db_cluster -> 数据库连接串（JSON），未列出的集群使用默认库
+    DB_CLUSTERS: Dict[str, str] = Field({}, env="DB_CLUSTERS")
+    DB_CLUSTER_POOL_SIZE: int = Field(5, env="DB_CLUSTER_POOL_SIZE")  # 每个集群的常驻连接数
+    DB_CLUSTER_MAX_OVERFLOW: int = Field(5, env="DB_CLUSTER_MAX_OVERFLOW")
+    DB_CLUSTER_MAX_CONNECTIONS: int = Field(100, env="DB_CLUSTER_MAX_CONNECTIONS")  # 所有集群连接池的总上限
+    DB_CLUSTER_IDLE_TIMEOUT: int = Field(600, env="DB_CLUSTER_IDLE_TIMEOUT")  # 空闲超过该秒数的引擎被释放
+
+    # 企业微信 API 配置
+    WECOM_API_BASE: str = Field("https://qyapi.weixin.qq.com/cgi-bin", env="WECOM_API_BASE")
+    WECOM_AGENT_ID: int = Field(1000002, env="WECOM_AGENT_ID")
+    WECOM_HTTP2: bool = Field(True, env="WECOM_HTTP2")
+    WECOM_MAX_CONNECTIONS: int = Field(100, env="WECOM_MAX_CONNECTIONS")  # 单个主机最大连接数
+    WECOM_MAX_KEEPALIVE: int = Field(20, env="WECOM_MAX_KEEPALIVE")  # 保活的空闲连接数
+    WECOM_KEEPALIVE_EXPIRY: float = Field(30.0, env="WECOM_KEEPALIVE_EXPIRY")
+    WECOM_CONNECT_TIMEOUT: float = Field(5.0, env="WECOM_CONNECT_TIMEOUT")
+    WECOM_READ_TIMEOUT: float = Field(10.0, env="WECOM_READ_TIMEOUT")
+    WECOM_POOL_TIMEOUT: float = Field(5.0, env="WECOM_POOL_TIMEOUT")  # 等待空闲连接的超时
+    WECOM_TOKEN_TTL: int = Field(7000, env="WECOM_TOKEN_TTL")  # 实际有效7200秒
+    WECOM_TOKEN_REFRESH_MARGIN: int = Field(600, env="WECOM_TOKEN_REFRESH_MARGIN")  # 剩余多少秒时提前续期
+    WECOM_TOKEN_LOCK_TIMEOUT: float = Field(10.0, env="WECOM_TOKEN_LOCK_TIMEOUT")
+    WECOM_TOKEN_IDLE_TIMEOUT: int = Field(3600, env="WECOM_TOKEN_IDLE_TIMEOUT")  # 超过多少秒未使用的企业不再续期
+    WECOM_BULK_CONCURRENCY: int = Field(10, env="WECOM_BULK_CONCURRENCY")  # 批量发送时并发的批次数
+    WECOM_RETRY_ATTEMPTS: int = Field(3, env="WECOM_RETRY_ATTEMPTS")  # 临时性失败的最大重试次数
+    WECOM_RETRY_BASE_DELAY: float = Field(0.1, env="WECOM_RETRY_BASE_DELAY")  # 退避基数（秒）
+    WECOM_RETRY_MAX_DELAY: float = Field(2.0, env="WECOM_RETRY_MAX_DELAY")
+    WECOM_RETRY_BUDGET_RATIO: float = Field(0.2, env="WECOM_RETRY_BUDGET_RATIO")  # 重试数不超过请求数的比例
+    WECOM_RETRY_BUDGET_MIN: int = Field(10, env="WECOM_RETRY_BUDGET_MIN")  # 窗口内始终允许的重试数
+    WECOM_RETRY_BUDGET_WINDOW: float = Field(10.0, env="WECOM_RETRY_BUDGET_WINDOW")  # 秒
+    WECOM_BREAKER_FAILURES: int = Field(5, env="WECOM_BREAKER_FAILURES")  # 连续失败多少次后熔断
+    WECOM_BREAKER_OPEN_SECONDS: float = Field(30.0, env="WECOM_BREAKER_OPEN_SECONDS")  # 熔断后多久放行探测请求
+    APPCHAT_CONCURRENCY: int = Field(10, env="APPCHAT_CONCURRENCY")  # 批量建群/改群时并发的请求数
+    APPCHAT_JOB_TTL: int = Field(86400, env="APPCHAT_JOB_TTL")  # 批量任务进度保留时间，期间可用同一 job_id 续跑
+
+    # 企业微信 API 频率限制（每企业单接口不超过1万次/分钟，留出余量）
+    WECOM_CORP_RATE_LIMIT: float = Field(150.0, env="WECOM_CORP_RATE_LIMIT")  # 每秒令牌数
+    WECOM_CORP_RATE_BURST: int = Field(300, env="WECOM_CORP_RATE_BURST")
+    WECOM_AGENT_RATE_LIMIT: float = Field(30.0, env="WECOM_AGENT_RATE_LIMIT")
+    WECOM_AGENT_RATE_BURST: int = Field(60, env="WECOM_AGENT_RATE_BURST")
+
+    # 入站请求配额（按订阅等级，每个窗口内的数量，0 表示不限）
+    RATE_LIMIT_WINDOW: int = Field(60, env="RATE_LIMIT_WINDOW")  # 窗口长度（秒）
+    RATE_LIMIT_REQUESTS: Dict[str, int] = Field(
+        {"basic": 600, "premium": 3000, "enterprise": 12000}, env="RATE_LIMIT_REQUESTS"
+    )
+    RATE_LIMIT_SENDS: Dict[str, int] = Field(
+        {"basic": 20000, "premium": 200000, "enterprise": 1000000}, env="RATE_LIMIT_SENDS"
+    )  # 发送接口按接收人数计
+    RATE_LIMIT_REDIS_TIMEOUT_MS: int = Field(50, env="RATE_LIMIT_REDIS_TIMEOUT_MS")  # 超时后改用进程内计数
+
+    # 企业凭据缓存配置
+    ENTERPRISE_CACHE_SIZE: int = Field(1024, env="ENTERPRISE_CACHE_SIZE")
+    ENTERPRISE_CACHE_TTL: int = Field(300, env="ENTERPRISE_CACHE_TTL")  # 秒
+    ENTERPRISE_NEGATIVE_CACHE_TTL: int = Field(5, env="ENTERPRISE_NEGATIVE_CACHE_TTL")  # 无效 api_key 的缓存时间
+
+    # 认证缓存配置
+    TOKEN_CACHE_SIZE: int = Field(10000, env="TOKEN_CACHE_SIZE")
+    TOKEN_CACHE_MAX_TTL: int = Field(300, env="TOKEN_CACHE_MAX_TTL")  # 同时受 token 的 exp 限制
+    SUBSCRIBER_CACHE_SIZE: int = Field(10000, env="SUBSCRIBER_CACHE_SIZE")
+    SUBSCRIBER_CACHE_TTL: int = Field(30, env="SUBSCRIBER_CACHE_TTL")
+
+    # 投递记录批量写入配置
+    WRITER_BATCH_SIZE: int = Field(5000, env="WRITER_BATCH_SIZE")
+    WRITER_FLUSH_INTERVAL_MS: int = Field(200, env="WRITER_FLUSH_INTERVAL_MS")
+    WRITER_MAX_BUFFER: int = Field(100000, env="WRITER_MAX_BUFFER")  # 缓冲写满后发送接口会等待
+
+    # 发送接口幂等配置
+    IDEMPOTENCY_TTL: int = Field(86400, env="IDEMPOTENCY_TTL")  # 带 Idempotency-Key 的响应保留时间
+    IDEMPOTENCY_CONTENT_TTL: int = Field(60, env="IDEMPOTENCY_CONTENT_TTL")  # 未带 Key 时按请求体去重的时间窗口，0 关闭
+    IDEMPOTENCY_LOCK_TTL: int = Field(120, env="IDEMPOTENCY_LOCK_TTL")  # 执行中占位的过期时间
+    IDEMPOTENCY_WAIT_TIMEOUT: float = Field(30.0, env="IDEMPOTENCY_WAIT_TIMEOUT")  # 重复请求等待首个请求的上限
+
+    # 客户联系人同步配置
+    CONTACT_SYNC_CONCURRENCY: int = Field(8, env="CONTACT_SYNC_CONCURRENCY")  # 并发拉取的跟进成员数
+    CONTACT_SYNC_PAGE_SIZE: int = Field(100, env="CONTACT_SYNC_PAGE_SIZE")  # 每页客户数，企业微信上限100
+
     # 安全配置
     SECRET_KEY: str = Field(..., env="SECRET_KEY")
     SECRET_KEY_EXPIRE_MINUTES: int = Field(1440, env="SECRET_KEY_EXPIRE_MINUTES")
+    ALGORITHM: str = Field("HS256", env="ALGORITHM")  # JWT 签名算法
+    MAX_REQUEST_BODY_SIZE: int = Field(10 * 1024 * 1024, env="MAX_REQUEST_BODY_SIZE")  # 签名请求体上限（字节）
+    ADMIN_TOKEN: Optional[str] = Field(None, env="ADMIN_TOKEN")  # 管理接口令牌，未配置时禁用
+    BCRYPT_ROUNDS: int = Field(12, env="BCRYPT_ROUNDS")  # 修改后用户下次登录时自动重新哈希
+    PASSWORD_HASH_WORKERS: int = Field(4, env="PASSWORD_HASH_WORKERS")  # 密码哈希线程数
+    PASSWORD_HASH_MAX_PENDING: int = Field(32, env="PASSWORD_HASH_MAX_PENDING")  # 超过后返回503
 
-    @property
+    @cached_property
     def SQLALCHEMY_DATABASE_URL(self) -> PostgresDsn:
         """动态生成数据库连接字符串"""
         return PostgresDsn.build(
@@ -61,7 +161,7 @@ class Settings(BaseSettings):
             path=f"{self.POSTGRES_DB}"
         )
 
-    @property
+    @cached_property
     def REDIS_URL(self) -> RedisDsn:
         """动态生成Redis连接字符串"""
         return RedisDsn.build(
@@ -75,6 +175,50 @@ class Settings(BaseSettings):
         env_file = ".env"
         env_file_encoding = "utf-8"
         case_sensitive = False  # 允许小写环境变量
+        frozen = True  # 快照不可修改，变更需通过 reload_settings
+
+# 进程内共享的配置快照
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+# 配置重新加载后的回调，参数为 (旧配置, 新配置)
+_listeners: List[Callable[[Settings, Settings], None]] = []
+
+def get_settings() -> Settings:
+    """返回当前配置快照（首次调用时读取环境变量与 .env）"""
+    global _settings
+    settings = _settings
+    if settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = Settings()
+            settings = _settings
+    return settings
+
+def reload_settings() -> Settings:
+    """
+    重新读取配置，校验通过后原子替换快照并通知订阅者
+    校验失败时抛出 ValidationError，继续使用旧配置
+    """
+    global _settings
+    new_settings = Settings()
+    with _settings_lock:
+        old_settings, _settings = _settings, new_settings
+    if old_settings is not None:
+        for listener in list(_listeners):
+            try:
+                listener(old_settings, new_settings)
+            except Exception:
+                logger.exception("Settings reload listener %r failed", listener)
+    logger.info("Settings reloaded")
+    return new_settings
+
+def reset_settings():
+    """丢弃快照，下次 get_settings 时重新读取（测试用）"""
+    global _settings
+    with _settings_lock:
+        _settings = None
 
-def get_settings():
-    return Settings()
\ No newline at end of file
+def subscribe(listener: Callable[[Settings, Settings], None]):
+    """注册配置变更回调，可用作装饰器"""
+    _listeners.append(listener)
+    return listener
\ No newline at end of file
@@ -0,0 +1,169 @@
+# 批量群聊管理：并发建群、增删成员，逐项返回结果，失败后可用同一 job_id 续跑
+# - 未指定 chatid 的群按 (corp_id, job_id, 序号) 生成确定的 chatid，
+#   续跑时重复创建会返回“会话ID已存在”，视为已创建，不会建出重复的群
+# - 每项成功后记入 Redis 中的任务进度，续跑时直接跳过，不再调用企业微信
+# - 调用受每企业、每应用令牌桶限流，同时在途的请求数不超过 concurrency
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from typing import Dict, List, Optional, Sequence
+
+from redis.asyncio import Redis as AsyncRedis
+
+from ..config import get_settings
+from .ratelimit import AsyncTokenBucket, wecom_buckets
+
+logger = logging.getLogger(__name__)
+
+ERRCODE_CHAT_EXISTS = 86215  # 会话ID已经存在
+
+_JOB_KEY = "wecom:appchat:job:{corp_id}:{job_id}"
+
+
+def make_chatid(corp_id: str, job_id: str, index: int) -> str:
+    """确定性的 chatid（企业微信要求 0-9a-zA-Z，最长32位）"""
+    return hashlib.sha1(f"{corp_id}:{job_id}:{index}".encode()).hexdigest()[:32]
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+class ChatJob:
+    """批量任务进度：Redis hash，字段为单项的键，值为成功结果"""
+
+    def __init__(self, redis: Optional[AsyncRedis], corp_id: str, job_id: str):
+        self.redis = redis
+        self.key = _JOB_KEY.format(corp_id=corp_id, job_id=job_id)
+
+    async def completed(self) -> Dict[str, dict]:
+        if self.redis is None:
+            return {}
+        data = await self.redis.hgetall(self.key)
+        return {
+            (k.decode() if isinstance(k, bytes) else k): json.loads(v)
+            for k, v in data.items()
+        }
+
+    async def record(self, item_key: str, result: dict):
+        if self.redis is None:
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key, item_key, json.dumps(result))
+            pipe.expire(self.key, get_settings().APPCHAT_JOB_TTL)
+            await pipe.execute()
+
+
+class _BulkRunner:
+    """并发执行一组企业微信调用，汇总逐项结果"""
+
+    def __init__(self, client, redis: Optional[AsyncRedis], job_id: Optional[str],
+                 concurrency: Optional[int]):
+        self.client = client
+        self.job_id = job_id or new_job_id()
+        self.job = ChatJob(redis, client.corp_id, self.job_id)
+        self.bucket = AsyncTokenBucket(redis) if redis is not None else None
+        self.concurrency = concurrency or get_settings().APPCHAT_CONCURRENCY
+
+    async def run(self, items: List[dict], call, ok_errcodes=(0,)) -> dict:
+        """
+        items 中每项需包含 key（进度字段）与 chatid，call(item) 返回企业微信响应
+        返回 {"job_id", "succeeded", "failed", "skipped", "results"}，results 与 items 顺序一致
+        """
+        done = await self.job.completed()
+        results: List[Optional[dict]] = [None] * len(items)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        buckets = wecom_buckets(self.client.corp_id, self.client.agent_id)
+        skipped = 0
+
+        async def run_one(index: int, item: dict):
+            # 在任务内获取许可，任务在开始前被取消时不会占用许可
+            async with semaphore:
+                try:
+                    if self.bucket is not None:
+                        await self.bucket.acquire(buckets)
+                    resp = await call(item)
+                except Exception as e:
+                    logger.warning("Appchat request failed for corp %s: %s", self.client.corp_id, e)
+                    resp = {"errcode": -1, "errmsg": str(e)}
+            errcode = resp.get("errcode", -1)
+            result = {
+                "chatid": item["chatid"],
+                "status": "ok" if errcode in ok_errcodes else "failed",
+                "errcode": errcode,
+                "errmsg": resp.get("errmsg", ""),
+            }
+            if result["status"] == "ok":
+                await self.job.record(item["key"], result)
+            results[index] = result
+
+        tasks = []
+        for index, item in enumerate(items):
+            if item["key"] in done:
+                results[index] = {**done[item["key"]], "status": "skipped"}
+                skipped += 1
+                continue
+            tasks.append(asyncio.create_task(run_one(index, item)))
+        await asyncio.gather(*tasks)
+
+        failed = sum(1 for r in results if r["status"] == "failed")
+        return {
+            "job_id": self.job_id,
+            "succeeded": len(items) - failed - skipped,
+            "failed": failed,
+            "skipped": skipped,
+            "results": results,
+        }
+
+
+async def create_chats(
+    client,
+    chats: Sequence[dict],
+    redis: Optional[AsyncRedis] = None,
+    job_id: Optional[str] = None,
+    concurrency: Optional[int] = None,
+) -> dict:
+    """
+    批量建群，chats 每项包含 name、owner、userlist，可选 chatid
+    同一 job_id 续跑时 chats 的顺序需保持不变（未指定 chatid 时按序号生成）
+    """
+    runner = _BulkRunner(client, redis, job_id, concurrency)
+    items = []
+    for index, chat in enumerate(chats):
+        chatid = chat.get("chatid") or make_chatid(client.corp_id, runner.job_id, index)
+        items.append({**chat, "chatid": chatid, "key": f"create:{chatid}"})
+
+    async def call(item):
+        return await client.create_appchat(
+            item["name"], item["owner"], item["userlist"], chatid=item["chatid"]
+        )
+
+    # 续跑时群已存在视为创建成功
+    return await runner.run(items, call, ok_errcodes=(0, ERRCODE_CHAT_EXISTS))
+
+
+async def update_members(
+    client,
+    updates: Sequence[dict],
+    redis: Optional[AsyncRedis] = None,
+    job_id: Optional[str] = None,
+    concurrency: Optional[int] = None,
+) -> dict:
+    """批量增删群成员，updates 每项包含 chatid、add_user_list、del_user_list"""
+    runner = _BulkRunner(client, redis, job_id, concurrency)
+    items = [
+        {**update, "key": f"update:{index}:{update['chatid']}"}
+        for index, update in enumerate(updates)
+    ]
+
+    async def call(item):
+        return await client.update_appchat(
+            item["chatid"],
+            add_user_list=item.get("add_user_list", ()),
+            del_user_list=item.get("del_user_list", ()),
+        )
+
+    return await runner.run(items, call)
@@ -1,17 +1,40 @@
 # 基于HMAC的多企业认证
 
+import asyncio
 import hashlib
 import hmac
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
 from fastapi import HTTPException, Request
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
-from cryptography.fernet import Fernet, InvalidToken
-from ..db.models import Enterprise
+from sqlalchemy.ext.asyncio import AsyncSession
+from redis.asyncio import Redis as AsyncRedis
+from ..db import crud
 from ..config import get_settings
+from .cache import TTLCache
+from .redis_pool import get_async_redis, get_sync_redis
+
+logger = logging.getLogger(__name__)
+
+# 企业信息变更时通过该频道通知所有 worker 清除缓存
+# 消息为 api_key（清除凭据缓存），或 "corp:<corp_id>"（清除按 corp_id 缓存的 secret、回调加解密器等）
+INVALIDATION_CHANNEL = "wecom:enterprise:invalidate"
+CORP_PREFIX = "corp:"
+_MISS = object()
+
+_settings = get_settings()
+# api_key -> 解密后的凭据；None 表示 api_key 无效（负缓存）
+credential_cache = TTLCache(
+    maxsize=_settings.ENTERPRISE_CACHE_SIZE,
+    ttl=_settings.ENTERPRISE_CACHE_TTL
+)
 
 
 class SecretManager:
     def __init__(self, master_key=None):
+        # 延迟导入 cryptography，加快进程启动
+        from cryptography.fernet import Fernet
         # 主密钥建议通过环境变量注入
         self.master_key = master_key or Fernet.generate_key()
         self.cipher = Fernet(self.master_key)
@@ -20,32 +43,41 @@ class SecretManager:
         return self.cipher.encrypt(plaintext.encode())
 
     def decrypt_secret(self, encrypted_data: bytes) -> str:
+        from cryptography.fernet import InvalidToken
         try:
             return self.cipher.decrypt(encrypted_data).decode()
         except InvalidToken:
             raise ValueError("Invalid decryption key or corrupted data")
 
+_secret_manager: Optional[SecretManager] = None
+
+
+def get_secret_manager() -> SecretManager:
+    """进程内共享的 SecretManager（构造 Fernet 有开销，不在每个请求中创建）"""
+    global _secret_manager
+    if _secret_manager is None:
+        _secret_manager = SecretManager()  # 生产环境应从配置加载master_key
+    return _secret_manager
+
+
 class EnterpriseAuthenticator:
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: AsyncSession, secret_manager: SecretManager = None):
         self.db = db_session
-        self.secret_manager = SecretManager()  # 生产环境应从配置加载master_key
-        
-    async def authenticate_request(self, request: Request) -> dict:
-        # 获取请求头
-        api_key = request.headers.get("X-API-Key")
-        client_signature = request.headers.get("X-Signature")
-        
-        if not (api_key and client_signature):
-            raise HTTPException(401, "Missing authentication headers")
-            
+        self.secret_manager = secret_manager or get_secret_manager()
+
+    async def load_credentials(self, api_key: str):
+        """读取企业凭据（优先命中缓存），api_key 无效时返回 None"""
+        credentials = credential_cache.get(api_key, _MISS)
+        if credentials is not _MISS:
+            return credentials
+
         # 查询企业信息
-        enterprise = self.db.query(Enterprise).filter(
-            Enterprise.api_key == api_key
-        ).first()
-        
+        enterprise = await crud.get_active_enterprise_by_api_key(self.db, api_key)
+
         if not enterprise:
-            raise HTTPException(403, "Invalid API key or inactive account")
-            
+            credential_cache.set(api_key, None, ttl=get_settings().ENTERPRISE_NEGATIVE_CACHE_TTL)
+            return None
+
         # 解密加密的密钥（核心修改点）
         try:
             decrypted_secret = self.secret_manager.decrypt_secret(
@@ -53,20 +85,13 @@ class EnterpriseAuthenticator:
             )
         except ValueError as e:
             raise HTTPException(500, f"Secret decryption failed: {str(e)}")
-            
-        # 验证请求签名
-        request_body = await request.body()
-        expected_signature = hmac.new(
-            decrypted_secret.encode('utf-8'),
-            request_body,
-            hashlib.sha256
-        ).hexdigest()
-        
-        if not hmac.compare_digest(client_signature, expected_signature):
-            raise HTTPException(403, "Invalid request signature")
-            
-        return {
+
+        credentials = {
             "enterprise_id": enterprise.id,
+            "db_cluster": enterprise.db_cluster,
+            "subscription_tier": getattr(enterprise, "subscription_tier", None) or "basic",
+            "subscriber_id": getattr(enterprise, "subscriber_id", None),
+            "secret": decrypted_secret.encode('utf-8'),
             "wecom_config": {
                 "name": enterprise.name,
                 "is_active": enterprise.is_active,
@@ -74,4 +99,133 @@ class EnterpriseAuthenticator:
                 "corp_id": enterprise.wecom_corp_id,
                 "secret": enterprise.wecom_secret
             }
-        }
\ No newline at end of file
+        }
+        credential_cache.set(api_key, credentials)
+        return credentials
+
+    async def authenticate_request(self, request: Request) -> dict:
+        # 获取请求头
+        api_key = request.headers.get("X-API-Key")
+        client_signature = request.headers.get("X-Signature")
+
+        if not (api_key and client_signature):
+            raise HTTPException(401, "Missing authentication headers")
+
+        credentials = await self.load_credentials(api_key)
+        if not credentials:
+            raise HTTPException(403, "Invalid API key or inactive account")
+
+        # 验证请求签名：边接收边计算 HMAC，超过大小上限立即拒绝
+        max_size = get_settings().MAX_REQUEST_BODY_SIZE
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_size:
+            raise HTTPException(413, "Request body too large")
+
+        mac = hmac.new(credentials["secret"], digestmod=hashlib.sha256)
+        chunks, size = [], 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > max_size:
+                raise HTTPException(413, "Request body too large")
+            mac.update(chunk)
+            chunks.append(chunk)
+
+        if not hmac.compare_digest(client_signature, mac.hexdigest()):
+            raise HTTPException(403, "Invalid request signature")
+
+        # 已验证的请求体交给后续处理，避免再次读取（接收流已被消费）
+        body = b"".join(chunks)
+        request._body = body
+        request.state.verified_body = body
+
+        return {
+            "enterprise_id": credentials["enterprise_id"],
+            "db_cluster": credentials["db_cluster"],
+            "subscription_tier": credentials["subscription_tier"],
+            "subscriber_id": credentials["subscriber_id"],
+            "wecom_config": dict(credentials["wecom_config"])
+        }
+
+
+# corp_id 失效时调用的清理函数，由按 corp_id 缓存企业配置的模块注册
+_corp_listeners: List[Callable[[str], None]] = []
+
+
+def on_corp_invalidated(listener: Callable[[str], None]):
+    """注册 corp_id 失效时的清理函数（可用作装饰器）"""
+    _corp_listeners.append(listener)
+    return listener
+
+
+def _evict_corp(corp_id: str):
+    for listener in _corp_listeners:
+        try:
+            listener(corp_id)
+        except Exception:
+            logger.exception("Failed to evict cached config for corp %s", corp_id)
+
+
+def _publish(message: str):
+    try:
+        get_sync_redis().publish(INVALIDATION_CHANNEL, message)
+    except Exception:
+        # 通知失败时其他 worker 的缓存最迟在 TTL 后过期
+        logger.exception("Failed to publish cache invalidation %s", message)
+
+
+def invalidate_enterprise_credentials(api_key: str):
+    """清除本进程缓存并通知其他 worker（企业更新或停用后调用）"""
+    credential_cache.pop(api_key)
+    _publish(api_key)
+
+
+def invalidate_corp(corp_id: str):
+    """清除各进程中按 corp_id 缓存的 secret 与回调配置（企业停用、secret 或回调配置变更后调用）"""
+    _evict_corp(corp_id)
+    _publish(CORP_PREFIX + corp_id)
+
+
+def _handle_invalidation(data):
+    message = data.decode() if isinstance(data, bytes) else data
+    if message.startswith(CORP_PREFIX):
+        _evict_corp(message[len(CORP_PREFIX):])
+    else:
+        credential_cache.pop(message)
+
+
+async def listen_for_invalidations(redis: AsyncRedis = None):
+    """订阅失效通知并清除本进程缓存（在应用生命周期内作为后台任务运行）"""
+    redis = redis or get_async_redis()
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # 重新订阅期间可能错过通知，保守起见清空缓存
+                credential_cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    _handle_invalidation(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Credential invalidation listener disconnected, retrying")
+            await asyncio.sleep(1)
+
+
+def start_invalidation_thread() -> threading.Thread:
+    """在后台线程中订阅失效通知（供没有事件循环的 Celery worker 进程使用）"""
+    def listen():
+        while True:
+            try:
+                pubsub = get_sync_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    _handle_invalidation(message["data"])
+            except Exception:
+                logger.exception("Credential invalidation listener disconnected, retrying")
+                time.sleep(1)
+
+    thread = threading.Thread(target=listen, name="wecom-invalidation", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,175 @@
+# 企业微信回调：签名校验、消息解密、事件解析与去重
+# 加解密方案见企业微信文档“加解密方案说明”：
+#   msg_signature = sha1(sort(token, timestamp, nonce, msg_encrypt))
+#   AESKey = base64_decode(EncodingAESKey + "=")，AES-256-CBC，IV 取 AESKey 前16字节，PKCS#7 按32字节补位
+#   明文 = random(16B) + msg_len(4B 网络字节序) + msg + receiveid
+
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import socket
+import struct
+import xml.etree.ElementTree as ET
+from typing import Optional
+
+from redis.asyncio import Redis as AsyncRedis
+
+from ..config import get_settings
+from .auth import on_corp_invalidated
+from .cache import TTLCache
+from .redis_pool import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+_BLOCK_SIZE = 32
+_DEDUP_KEY = "wecom:callback:seen:{corp_id}:{event_key}"
+
+
+class CallbackError(ValueError):
+    """签名不匹配或密文无法解密"""
+
+
+class WeComCrypto:
+    """单个企业的回调加解密器，AES 密钥与 Cipher 在构造时计算一次"""
+
+    def __init__(self, token: str, encoding_aes_key: str, receive_id: str):
+        # 延迟导入 cryptography，加快进程启动
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+        self.token = token
+        self.receive_id = receive_id
+        try:
+            key = base64.b64decode(encoding_aes_key + "=")
+        except (ValueError, TypeError):
+            raise CallbackError("Invalid EncodingAESKey")
+        if len(key) != 32:
+            raise CallbackError("Invalid EncodingAESKey")
+        self._cipher = Cipher(algorithms.AES(key), modes.CBC(key[:16]))
+
+    def signature(self, timestamp: str, nonce: str, encrypted: str) -> str:
+        parts = sorted([self.token, timestamp, nonce, encrypted])
+        return hashlib.sha1("".join(parts).encode()).hexdigest()
+
+    def verify(self, msg_signature: str, timestamp: str, nonce: str, encrypted: str):
+        expected = self.signature(timestamp, nonce, encrypted)
+        if not hmac.compare_digest(expected, msg_signature or ""):
+            raise CallbackError("Invalid msg_signature")
+
+    def decrypt(self, encrypted: str) -> str:
+        try:
+            data = base64.b64decode(encrypted)
+            decryptor = self._cipher.decryptor()
+            plain = decryptor.update(data) + decryptor.finalize()
+        except ValueError:
+            raise CallbackError("Invalid ciphertext")
+
+        pad = plain[-1] if plain else 0
+        if not 1 <= pad <= _BLOCK_SIZE:
+            raise CallbackError("Invalid padding")
+        plain = plain[:-pad]
+        if len(plain) < 20:
+            raise CallbackError("Invalid message length")
+        msg_len = socket.ntohl(struct.unpack("I", plain[16:20])[0])
+        try:
+            msg = plain[20:20 + msg_len].decode()
+            receive_id = plain[20 + msg_len:].decode()
+        except UnicodeDecodeError:
+            # 密文被篡改或密钥不匹配时解出的是乱码
+            raise CallbackError("Invalid message encoding")
+        if receive_id != self.receive_id:
+            raise CallbackError("ReceiveId mismatch")
+        return msg
+
+    def encrypt(self, msg: str) -> str:
+        """加密被动回复（测试中也用于构造回调报文）"""
+        body = msg.encode()
+        plain = (
+            os.urandom(16) + struct.pack("I", socket.htonl(len(body)))
+            + body + self.receive_id.encode()
+        )
+        pad = _BLOCK_SIZE - len(plain) % _BLOCK_SIZE
+        plain += bytes([pad]) * pad
+        encryptor = self._cipher.encryptor()
+        return base64.b64encode(encryptor.update(plain) + encryptor.finalize()).decode()
+
+    def verify_and_decrypt(self, msg_signature: str, timestamp: str, nonce: str,
+                           encrypted: str) -> str:
+        self.verify(msg_signature, timestamp, nonce, encrypted)
+        return self.decrypt(encrypted)
+
+
+# corp_id -> WeComCrypto；None 表示该企业未配置回调（负缓存）
+_cryptos = TTLCache(maxsize=4096, ttl=get_settings().CALLBACK_CONFIG_CACHE_TTL)
+
+
+def get_cached_crypto(corp_id: str, default=None):
+    return _cryptos.get(corp_id, default)
+
+
+def cache_crypto(corp_id: str, token: Optional[str], encoding_aes_key: Optional[str]):
+    """根据企业的回调配置构造并缓存加解密器，未配置时缓存 None"""
+    crypto = None
+    if token and encoding_aes_key:
+        crypto = WeComCrypto(token, encoding_aes_key, corp_id)
+    _cryptos.set(corp_id, crypto)
+    return crypto
+
+
+@on_corp_invalidated
+def invalidate_crypto(corp_id: str):
+    """企业停用或回调配置变更后由失效通知调用"""
+    _cryptos.pop(corp_id)
+
+
+def extract_encrypted(body: bytes) -> str:
+    """取出回调 XML 中的 Encrypt 字段"""
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        raise CallbackError("Malformed XML")
+    encrypted = root.findtext("Encrypt")
+    if not encrypted:
+        raise CallbackError("Missing Encrypt element")
+    return encrypted
+
+
+def parse_event(xml: str) -> dict:
+    """将解密后的 XML 转为扁平字典（子节点按标签名取文本）"""
+    try:
+        root = ET.fromstring(xml)
+    except ET.ParseError:
+        raise CallbackError("Malformed message XML")
+    return {child.tag: (child.text or "") for child in root}
+
+
+def event_key(event: dict) -> str:
+    """
+    去重键：消息使用 MsgId；事件没有 MsgId，
+    按文档建议使用 FromUserName + CreateTime（再加上事件类型以区分同一秒内的不同事件）
+    """
+    if event.get("MsgId"):
+        return event["MsgId"]
+    raw = "|".join(event.get(k, "") for k in (
+        "FromUserName", "CreateTime", "Event", "ChangeType", "UserID", "ExternalUserID"
+    ))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_redis() -> AsyncRedis:
+    """回调去重使用的 Redis 客户端（进程共享连接池）"""
+    return get_async_redis()
+
+
+async def mark_seen(redis: AsyncRedis, corp_id: str, key: str) -> bool:
+    """首次收到返回 True，重复推送返回 False"""
+    return bool(await redis.set(
+        _DEDUP_KEY.format(corp_id=corp_id, event_key=key), 1,
+        nx=True, ex=get_settings().CALLBACK_DEDUP_TTL
+    ))
+
+
+async def unmark_seen(redis: AsyncRedis, corp_id: str, key: str):
+    """入队失败时撤销去重标记，让企业微信的重试能被再次处理"""
+    await redis.delete(_DEDUP_KEY.format(corp_id=corp_id, event_key=key))
@@ -1,31 +1,369 @@
-import requests
-from redis import Redis
+import asyncio
+import threading
+import time
+import weakref
+from typing import Dict, Iterable, Optional, Sequence, Tuple
 
-class WeComClient:
-    def __init__(self, corp_id: str, secret: str):
+import httpx
+from redis.asyncio import Redis as AsyncRedis
+
+from ..config import get_settings
+from . import metrics
+from .fanout import send_bulk
+from .resilience import (
+    ERRCODE_BUSY, RATE_LIMIT_ERRCODES, TOKEN_ERRCODES, RequestNotSentError, WeComAPIError,
+    backoff_delay, get_guard,
+)
+from .token_cache import AccessTokenCache, TokenFetcher, get_token_cache
+
+# 每个事件循环共享一个 AsyncClient（httpx 的连接绑定在创建它的事件循环上）
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+    weakref.WeakKeyDictionary()
+
+# 确定请求尚未发出的网络错误，非幂等请求也可以安全重试
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _is_upstream_failure(e: Exception) -> bool:
+    """网络错误、5xx、非 JSON 响应或企业微信系统繁忙，计入熔断并可重试"""
+    if isinstance(e, WeComAPIError):
+        return e.errcode == ERRCODE_BUSY
+    return isinstance(e, (httpx.TransportError, httpx.HTTPStatusError, ValueError))
+
+
+def _http_options() -> dict:
+    """根据配置生成 httpx 连接池参数"""
+    settings = get_settings()
+    return {
+        "base_url": settings.WECOM_API_BASE,
+        "http2": settings.WECOM_HTTP2,
+        # 所有请求都发往 qyapi.weixin.qq.com，连接池上限即单主机连接上限
+        "limits": httpx.Limits(
+            max_connections=settings.WECOM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.WECOM_MAX_KEEPALIVE,
+            keepalive_expiry=settings.WECOM_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(
+            settings.WECOM_READ_TIMEOUT,
+            connect=settings.WECOM_CONNECT_TIMEOUT,
+            pool=settings.WECOM_POOL_TIMEOUT,
+        ),
+    }
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """获取当前事件循环共享的 HTTP 连接池"""
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(**_http_options())
+        _async_http_clients[loop] = client
+    return client
+
+
+async def close_async_http_client():
+    """关闭当前事件循环的连接池（应用关闭时调用）"""
+    client = _async_http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class _LoopThread:
+    """后台事件循环线程，供同步客户端复用异步实现与连接池"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name="wecom-client-loop",
+                    daemon=True,
+                ).start()
+            return self._loop
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+_loop_thread = _LoopThread()
+
+
+def run_sync(coro):
+    """在后台事件循环中执行协程并等待结果（供 Celery 任务等同步代码使用）"""
+    return _loop_thread.run(coro)
+
+
+class AsyncWeComClient:
+    def __init__(
+        self,
+        corp_id: str,
+        secret: str,
+        agent_id: Optional[int] = None,
+        redis: Optional[AsyncRedis] = None,
+        http: Optional[httpx.AsyncClient] = None,
+    ):
         self.corp_id = corp_id
         self.secret = secret
-        self.redis = Redis.from_url("redis://localhost:6379/0")
-    
+        self.agent_id = agent_id or get_settings().WECOM_AGENT_ID
+        # 显式传入 redis 时使用独立缓存，否则共享当前事件循环的缓存
+        self._token_cache = AccessTokenCache(redis) if redis is not None else None
+        self._http = http
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        return self._http or get_async_http_client()
+
     @property
-    def access_token(self):
-        cache_key = f"wecom_token:{self.corp_id}"
-        token = self.redis.get(cache_key)
-        if not token:
-            url = f"https://qyapi.weixin.qq.com/cgi-bin/service/get_provider_token?corpid={self.corp_id}&provider_secret={self.secret}"
-            resp = requests.get(url).json()
-            if resp["errcode"] != 0:
-                raise Exception(f"Get token failed: {resp['errmsg']}")
-            token = resp["provider_access_token"].encode()
-            self.redis.setex(cache_key, 7000, token)  # 实际有效7200秒
-        return token.decode()
-
-    def send_message(self, userid: str, content: str):
-        url = f"https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={self.access_token}"
+    def token_cache(self) -> AccessTokenCache:
+        return self._token_cache or get_token_cache()
+
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        """发送请求到企业微信 API 并返回 JSON"""
+        api = path.lstrip("/")
+        start = time.perf_counter()
+        try:
+            resp = await self.http.request(method, path, **kwargs)
+            if resp.status_code >= 500:
+                resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            metrics.WECOM_API_ERRORS.labels(self.corp_id, api, type(e).__name__).inc()
+            raise
+        finally:
+            metrics.WECOM_API_SECONDS.labels(self.corp_id, api).observe(time.perf_counter() - start)
+        if data.get("errcode"):
+            metrics.WECOM_API_ERRORS.labels(self.corp_id, api, str(data["errcode"])).inc()
+        return data
+
+    async def _call(
+        self,
+        method: str,
+        path: str,
+        params: Optional[dict] = None,
+        json: Optional[dict] = None,
+        idempotent: Optional[bool] = None,
+    ) -> dict:
+        """
+        带 access_token 的接口调用
+        - 40014/42001：删除缓存的 token 后重试一次
+        - 系统繁忙、频率限制、5xx 和网络错误：在重试预算内按指数退避重试，
+          非幂等请求（默认 POST）的网络错误只在请求确定未发出时重试
+        - 该企业熔断时直接抛出 CircuitOpenError
+        - 放弃重试时若请求确定未发出，抛出 RequestNotSentError（原异常为 __cause__），调用方可安全重发
+        业务错误码原样返回给调用方；重试耗尽后返回最后的响应或抛出最后的异常
+        """
+        api = path.lstrip("/")
+        if idempotent is None:
+            idempotent = method == "GET"
+        guard = get_guard(self.corp_id)
+        guard.budget.record_request()
+        token_retried = False
+        attempt = 0
+        while True:
+            guard.breaker.before_call()
+            sent = False
+            try:
+                token = await self.get_access_token()
+                sent = True
+                data = await self._request(
+                    method, path, params={**(params or {}), "access_token": token}, json=json
+                )
+            except asyncio.CancelledError:
+                guard.breaker.release()
+                raise
+            except Exception as e:
+                if not _is_upstream_failure(e):
+                    # 上游给出了明确的结果（如 corpid 无效），不计入熔断
+                    guard.breaker.record_success()
+                    raise
+                guard.breaker.record_failure()
+                unsent = not sent or isinstance(e, _UNSENT_ERRORS)
+                if not ((idempotent or unsent) and self._may_retry(guard, api, attempt)):
+                    if unsent:
+                        message = str(e) or type(e).__name__
+                        raise RequestNotSentError(ERRCODE_BUSY, message, api) from e
+                    raise
+            else:
+                errcode = data.get("errcode", 0)
+                if errcode in TOKEN_ERRCODES and not token_retried:
+                    # token 在企业微信侧已失效（如被其他系统重新获取），丢弃缓存后重试一次
+                    guard.breaker.record_success()
+                    token_retried = True
+                    await self.token_cache.delete(self.corp_id)
+                    continue
+                if errcode == ERRCODE_BUSY:
+                    guard.breaker.record_failure()
+                else:
+                    guard.breaker.record_success()
+                transient = errcode == ERRCODE_BUSY or errcode in RATE_LIMIT_ERRCODES
+                if not (transient and self._may_retry(guard, api, attempt)):
+                    return data
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    def _may_retry(self, guard, api: str, attempt: int) -> bool:
+        if attempt >= get_settings().WECOM_RETRY_ATTEMPTS or not guard.budget.try_retry():
+            return False
+        metrics.WECOM_API_RETRIES.labels(self.corp_id, api).inc()
+        return True
+
+    async def _fetch_access_token(self):
+        api = "service/get_provider_token"
+        try:
+            resp = await self._request(
+                "GET",
+                "/" + api,
+                params={"corpid": self.corp_id, "provider_secret": self.secret},
+            )
+        except ValueError as e:
+            # 响应不是 JSON（如 404 或代理的错误页）
+            raise WeComAPIError(-1, f"invalid response: {e}", api) from e
+        errcode = resp.get("errcode", -1)
+        if errcode != 0 or "provider_access_token" not in resp:
+            raise WeComAPIError(errcode, resp.get("errmsg", "invalid response"), api)
+        return resp["provider_access_token"], resp.get("expires_in", 7200)
+
+    async def get_access_token(self) -> str:
+        return await self.token_cache.get(self.corp_id, self._fetch_access_token)
+
+    async def send_text(
+        self,
+        content: str,
+        touser: Sequence[str] = (),
+        toparty: Sequence[str] = (),
+        totag: Sequence[str] = (),
+    ) -> dict:
+        """发送文本消息，接收人以 | 拼接（touser 最多1000个，toparty/totag 最多100个）"""
         payload = {
-            "touser": userid,
             "msgtype": "text",
-            "agentid": 1000002,
+            "agentid": self.agent_id,
             "text": {"content": content}
         }
-        return requests.post(url, json=payload).json()
\ No newline at end of file
+        for field, ids in (("touser", touser), ("toparty", toparty), ("totag", totag)):
+            if ids:
+                payload[field] = "|".join(ids)
+        return await self._call("POST", "/message/send", json=payload)
+
+    async def send_message(self, userid: str, content: str) -> dict:
+        return await self.send_text(content, touser=[userid])
+
+    async def create_appchat(self, name: str, owner: str, userlist: Sequence[str],
+                             chatid: Optional[str] = None) -> dict:
+        """创建群聊会话（userlist 2~2000人），指定 chatid 时重复创建返回 86215"""
+        payload = {"name": name, "owner": owner, "userlist": list(userlist)}
+        if chatid:
+            payload["chatid"] = chatid
+        # 指定了 chatid 时重复提交只会返回 86215，可以安全重试
+        return await self._call("POST", "/appchat/create", json=payload, idempotent=bool(chatid))
+
+    async def update_appchat(
+        self,
+        chatid: str,
+        name: Optional[str] = None,
+        owner: Optional[str] = None,
+        add_user_list: Sequence[str] = (),
+        del_user_list: Sequence[str] = (),
+    ) -> dict:
+        """修改群聊名称、群主或增删成员"""
+        payload = {"chatid": chatid}
+        if name:
+            payload["name"] = name
+        if owner:
+            payload["owner"] = owner
+        if add_user_list:
+            payload["add_user_list"] = list(add_user_list)
+        if del_user_list:
+            payload["del_user_list"] = list(del_user_list)
+        return await self._call("POST", "/appchat/update", json=payload, idempotent=True)
+
+    async def get_appchat(self, chatid: str) -> dict:
+        return await self._call("GET", "/appchat/get", params={"chatid": chatid})
+
+    async def get_follow_user_list(self) -> dict:
+        """获取配置了客户联系功能的成员列表"""
+        return await self._call("GET", "/externalcontact/get_follow_user_list")
+
+    async def batch_get_external_contacts(
+        self,
+        userid_list: Sequence[str],
+        cursor: str = "",
+        limit: int = 100,
+    ) -> dict:
+        """批量获取成员添加的客户详情（userid_list 最多100个，limit 最大100），按 next_cursor 翻页"""
+        return await self._call(
+            "POST",
+            "/externalcontact/batch/get_by_user",
+            json={"userid_list": list(userid_list), "cursor": cursor, "limit": limit},
+            idempotent=True,
+        )
+
+    async def get_external_contact(self, external_userid: str) -> dict:
+        """获取单个客户详情及其全部跟进成员"""
+        return await self._call(
+            "GET", "/externalcontact/get", params={"external_userid": external_userid}
+        )
+
+
+async def get_access_tokens(clients: Iterable[AsyncWeComClient]) -> Dict[str, str]:
+    """批量获取多个企业的 access_token，共享同一缓存的客户端合并为一次 Redis 流水线读取"""
+    groups: Dict[int, Tuple[AccessTokenCache, Dict[str, TokenFetcher]]] = {}
+    for client in clients:
+        cache = client.token_cache
+        groups.setdefault(id(cache), (cache, {}))[1][client.corp_id] = client._fetch_access_token
+    tokens: Dict[str, str] = {}
+    for batch in await asyncio.gather(*(cache.get_many(f) for cache, f in groups.values())):
+        tokens.update(batch)
+    return tokens
+
+
+class WeComClient:
+    """同步客户端：在后台事件循环中调用 AsyncWeComClient"""
+
+    def __init__(self, corp_id: str, secret: str, agent_id: Optional[int] = None):
+        self.corp_id = corp_id
+        self.secret = secret
+        self._async = AsyncWeComClient(corp_id, secret, agent_id=agent_id)
+
+    @property
+    def access_token(self) -> str:
+        return _loop_thread.run(self._async.get_access_token())
+
+    def send_message(self, userid: str, content: str) -> dict:
+        return _loop_thread.run(self._async.send_message(userid, content))
+
+    def send_text(self, content: str, touser: Sequence[str] = (),
+                  toparty: Sequence[str] = (), totag: Sequence[str] = ()) -> dict:
+        return _loop_thread.run(self._async.send_text(content, touser, toparty, totag))
+
+    def send_bulk(self, content: str, touser: Iterable[str] = (),
+                  toparty: Iterable[str] = (), totag: Iterable[str] = ()) -> dict:
+        return _loop_thread.run(send_bulk(self._async, content, touser, toparty, totag))
+
+    def create_appchat(self, name: str, owner: str, userlist: Sequence[str],
+                       chatid: Optional[str] = None) -> dict:
+        return _loop_thread.run(self._async.create_appchat(name, owner, userlist, chatid))
+
+    def update_appchat(self, chatid: str, name: Optional[str] = None, owner: Optional[str] = None,
+                       add_user_list: Sequence[str] = (), del_user_list: Sequence[str] = ()) -> dict:
+        return _loop_thread.run(
+            self._async.update_appchat(chatid, name, owner, add_user_list, del_user_list)
+        )
+
+    def get_appchat(self, chatid: str) -> dict:
+        return _loop_thread.run(self._async.get_appchat(chatid))
+
+    def get_follow_user_list(self) -> dict:
+        return _loop_thread.run(self._async.get_follow_user_list())
+
+    def batch_get_external_contacts(self, userid_list: Sequence[str], cursor: str = "",
+                                    limit: int = 100) -> dict:
+        return _loop_thread.run(self._async.batch_get_external_contacts(userid_list, cursor, limit))
+
+    def get_external_contact(self, external_userid: str) -> dict:
+        return _loop_thread.run(self._async.get_external_contact(external_userid))
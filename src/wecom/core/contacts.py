@@ -0,0 +1,279 @@
+# 客户联系人同步：首次全量拉取，之后依靠检查点和变更回调只处理增量
+# - 每个跟进成员一条 batch/get_by_user 游标链，多个成员在并发上限内同时拉取
+# - 每页客户的 upsert 与该成员的游标检查点在同一事务中写入，任务中断后从检查点继续
+# - 成员拉取完成后删除本轮未再出现的客户关系（synced_at 早于本轮开始时间）
+# - 已完成的成员在后续运行中跳过，客户的增删改由 change_external_contact 回调同步
+# 数据库写入使用同步引擎并在线程中执行，与 BatchWriter 一致
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..config import get_settings
+from ..db import database
+from ..db.models import ContactSyncCheckpoint, ExternalContact
+from .ratelimit import AsyncTokenBucket, wecom_buckets
+from .resilience import WeComAPIError
+
+logger = logging.getLogger(__name__)
+
+# 该成员与客户之间不存在外部联系人关系（已被删除）
+ERRCODE_NO_RELATION = 84061
+
+_contacts = ExternalContact.__table__
+_checkpoints = ContactSyncCheckpoint.__table__
+_CONTACT_KEY = ["corp_id", "external_userid", "follow_userid"]
+_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+
+class ContactSyncError(WeComAPIError):
+    """企业微信客户联系接口返回错误"""
+
+    def __init__(self, api: str, resp: dict):
+        super().__init__(resp.get("errcode"), resp.get("errmsg", ""), api)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite 读回的时间不带时区，写入时均为 UTC
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _upsert(conn, table, rows: List[dict], key: List[str]):
+    """按唯一键插入或更新（PostgreSQL / SQLite 的 ON CONFLICT）"""
+    if not rows:
+        return
+    stmt = _INSERTS[conn.dialect.name](table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key,
+        set_={c: stmt.excluded[c] for c in rows[0] if c not in key},
+    )
+    conn.execute(stmt, rows)
+
+
+def batch_rows(corp_id: str, items: Iterable[dict], synced_at: datetime) -> List[dict]:
+    """batch/get_by_user 返回的 external_contact_list 转为表记录"""
+    rows = []
+    for item in items:
+        contact, follow = item.get("external_contact", {}), item.get("follow_info", {})
+        rows.append({
+            "corp_id": corp_id,
+            "external_userid": contact["external_userid"],
+            "follow_userid": follow["userid"],
+            "name": contact.get("name"),
+            "type": contact.get("type"),
+            "corp_name": contact.get("corp_name"),
+            "unionid": contact.get("unionid"),
+            "remark": follow.get("remark"),
+            "tag_ids": follow.get("tag_id") or [],
+            "add_time": follow.get("createtime"),
+            "synced_at": synced_at,
+        })
+    return rows
+
+
+def detail_rows(corp_id: str, data: dict, synced_at: datetime) -> List[dict]:
+    """externalcontact/get 的返回转为表记录（每个跟进成员一条）"""
+    contact = data.get("external_contact", {})
+    return [{
+        "corp_id": corp_id,
+        "external_userid": contact["external_userid"],
+        "follow_userid": follow["userid"],
+        "name": contact.get("name"),
+        "type": contact.get("type"),
+        "corp_name": contact.get("corp_name"),
+        "unionid": contact.get("unionid"),
+        "remark": follow.get("remark"),
+        "tag_ids": [t["tag_id"] for t in follow.get("tags", []) if t.get("tag_id")],
+        "add_time": follow.get("createtime"),
+        "synced_at": synced_at,
+    } for follow in data.get("follow_user", [])]
+
+
+def save_page(engine, corp_id: str, follow_userid: str, rows: List[dict],
+              cursor: Optional[str], started_at: datetime) -> int:
+    """
+    写入一页客户并推进检查点（同一事务）
+    cursor 为空表示该成员已拉取完成：同时删除本轮未出现的客户并标记完成，返回删除条数
+    """
+    with engine.begin() as conn:
+        _upsert(conn, _contacts, rows, _CONTACT_KEY)
+        removed = 0
+        if not cursor:
+            removed = conn.execute(delete(_contacts).where(and_(
+                _contacts.c.corp_id == corp_id,
+                _contacts.c.follow_userid == follow_userid,
+                _contacts.c.synced_at < started_at,
+            ))).rowcount
+        _upsert(conn, _checkpoints, [{
+            "corp_id": corp_id,
+            "follow_userid": follow_userid,
+            "cursor": cursor or None,
+            "started_at": started_at,
+            "completed_at": None if cursor else _now(),
+        }], ["corp_id", "follow_userid"])
+    return removed
+
+
+def load_checkpoints(engine, corp_id: str) -> Dict[str, dict]:
+    with engine.connect() as conn:
+        result = conn.execute(select(_checkpoints).where(_checkpoints.c.corp_id == corp_id))
+        return {row.follow_userid: dict(row._mapping) for row in result}
+
+
+def remove_follow_users(engine, corp_id: str, follow_userids: Iterable[str]) -> int:
+    """删除已不再使用客户联系功能的成员的客户与检查点"""
+    follow_userids = list(follow_userids)
+    if not follow_userids:
+        return 0
+    with engine.begin() as conn:
+        conn.execute(delete(_checkpoints).where(and_(
+            _checkpoints.c.corp_id == corp_id,
+            _checkpoints.c.follow_userid.in_(follow_userids),
+        )))
+        return conn.execute(delete(_contacts).where(and_(
+            _contacts.c.corp_id == corp_id,
+            _contacts.c.follow_userid.in_(follow_userids),
+        ))).rowcount
+
+
+def replace_contact(engine, corp_id: str, external_userid: str, rows: List[dict]):
+    """以最新详情替换客户的全部跟进关系（已不再跟进的成员的关系一并删除）"""
+    with engine.begin() as conn:
+        conn.execute(delete(_contacts).where(and_(
+            _contacts.c.corp_id == corp_id, _contacts.c.external_userid == external_userid
+        )))
+        _upsert(conn, _contacts, rows, _CONTACT_KEY)
+
+
+def delete_contact(engine, corp_id: str, external_userid: str,
+                   follow_userid: Optional[str] = None) -> int:
+    """删除客户关系，不指定 follow_userid 时删除该客户的全部跟进关系"""
+    cond = and_(_contacts.c.corp_id == corp_id, _contacts.c.external_userid == external_userid)
+    if follow_userid:
+        cond = and_(cond, _contacts.c.follow_userid == follow_userid)
+    with engine.begin() as conn:
+        return conn.execute(delete(_contacts).where(cond)).rowcount
+
+
+class ContactSync:
+    """单个企业的客户联系人同步"""
+
+    def __init__(
+        self,
+        client,
+        engine=None,
+        bucket: Optional[AsyncTokenBucket] = None,
+        concurrency: Optional[int] = None,
+        page_size: Optional[int] = None,
+    ):
+        settings = get_settings()
+        self.client = client
+        self.corp_id = client.corp_id
+        self._engine = engine
+        self.bucket = bucket
+        self.concurrency = concurrency or settings.CONTACT_SYNC_CONCURRENCY
+        self.page_size = min(page_size or settings.CONTACT_SYNC_PAGE_SIZE, 100)
+
+    @property
+    def engine(self):
+        return self._engine or database.get_engine()
+
+    async def _call(self, api: str, coro_func, *args) -> dict:
+        """受企业级令牌桶限流的接口调用，errcode 非0时抛出 ContactSyncError"""
+        if self.bucket is not None:
+            await self.bucket.acquire(wecom_buckets(self.corp_id))
+        resp = await coro_func(*args)
+        if resp.get("errcode"):
+            raise ContactSyncError(api, resp)
+        return resp
+
+    async def run(self, full: bool = False, since: Optional[datetime] = None) -> dict:
+        """
+        同步全部跟进成员的客户
+        full=False 时跳过已完成的成员、从未完成成员的检查点继续；full=True 时全部重新拉取
+        since 用于续跑中断的全量同步：只沿用该时间之后开始的检查点，更早的成员重新拉取
+        """
+        resp = await self._call("get_follow_user_list", self.client.get_follow_user_list)
+        follow_users = resp.get("follow_user", [])
+        checkpoints = await asyncio.to_thread(load_checkpoints, self.engine, self.corp_id)
+        stats = {"users": 0, "skipped": 0, "contacts": 0, "removed": 0}
+
+        gone = set(checkpoints) - set(follow_users)
+        if gone:
+            stats["removed"] += await asyncio.to_thread(
+                remove_follow_users, self.engine, self.corp_id, gone
+            )
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def sync_one(userid: str):
+            checkpoint = None if full else checkpoints.get(userid)
+            if checkpoint is not None and since is not None and _utc(checkpoint["started_at"]) < since:
+                checkpoint = None
+            if checkpoint is not None and checkpoint["completed_at"] is not None:
+                stats["skipped"] += 1
+                return
+            async with semaphore:
+                await self._sync_user(userid, checkpoint, stats)
+            stats["users"] += 1
+
+        await asyncio.gather(*(sync_one(userid) for userid in follow_users))
+        logger.info("Synced external contacts of corp %s: %s", self.corp_id, stats)
+        return stats
+
+    async def _sync_user(self, userid: str, checkpoint: Optional[dict], stats: dict):
+        if checkpoint is not None:
+            # 从中断处继续，清理时仍以最初的开始时间为界
+            cursor, started_at = checkpoint["cursor"] or "", checkpoint["started_at"]
+        else:
+            cursor, started_at = "", _now()
+        while True:
+            resp = await self._call(
+                "batch/get_by_user", self.client.batch_get_external_contacts,
+                [userid], cursor, self.page_size
+            )
+            rows = batch_rows(self.corp_id, resp.get("external_contact_list", []), _now())
+            cursor = resp.get("next_cursor") or ""
+            stats["contacts"] += len(rows)
+            stats["removed"] += await asyncio.to_thread(
+                save_page, self.engine, self.corp_id, userid, rows, cursor, started_at
+            )
+            if not cursor:
+                return
+
+    async def apply_change(self, event: dict) -> int:
+        """
+        处理 change_external_contact 回调，返回写入或删除的记录数
+        添加/编辑时重新拉取客户详情，删除时直接删除对应关系
+        """
+        change = event.get("ChangeType", "")
+        external_userid = event.get("ExternalUserID")
+        follow_userid = event.get("UserID")
+        if not external_userid:
+            return 0
+        if change in ("del_external_contact", "del_follow_user"):
+            return await asyncio.to_thread(
+                delete_contact, self.engine, self.corp_id, external_userid, follow_userid
+            )
+        if change not in ("add_external_contact", "edit_external_contact", "add_half_external_contact"):
+            return 0
+        try:
+            data = await self._call("get", self.client.get_external_contact, external_userid)
+        except ContactSyncError as e:
+            if e.errcode == ERRCODE_NO_RELATION:
+                return await asyncio.to_thread(
+                    delete_contact, self.engine, self.corp_id, external_userid
+                )
+            raise
+        rows = detail_rows(self.corp_id, data, _now())
+        await asyncio.to_thread(replace_contact, self.engine, self.corp_id, external_userid, rows)
+        return len(rows)
@@ -0,0 +1,132 @@
+# 批量消息分发：将接收人打包为最大批次并发发送
+
+import asyncio
+import logging
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# message/send 单次请求的接收人上限
+MAX_USERS_PER_SEND = 1000
+MAX_PARTIES_PER_SEND = 100
+MAX_TAGS_PER_SEND = 100
+
+# 企业微信返回的“接收人全部无效”
+ERRCODE_ALL_INVALID = 81013
+
+
+def _chunks(iterable: Iterable[str], size: int) -> Iterator[List[str]]:
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def pack_recipients(
+    touser: Iterable[str] = (),
+    toparty: Iterable[str] = (),
+    totag: Iterable[str] = (),
+) -> Iterator[dict]:
+    """
+    将接收人打包为尽量少的批次（惰性消费，可传入生成器）
+    部门和标签依次附加到前几个批次上，不单独占用请求
+    """
+    users = _chunks(touser, MAX_USERS_PER_SEND)
+    parties = _chunks(toparty, MAX_PARTIES_PER_SEND)
+    tags = _chunks(totag, MAX_TAGS_PER_SEND)
+    while True:
+        batch = {
+            "touser": next(users, []),
+            "toparty": next(parties, []),
+            "totag": next(tags, []),
+        }
+        if not any(batch.values()):
+            return
+        yield batch
+
+
+def new_bulk_result() -> dict:
+    return {
+        "batches": 0,
+        "failed_batches": 0,
+        "recipients": {},  # userid -> sent / invalid / unlicensed / failed
+        "invalid_parties": [],
+        "invalid_tags": [],
+        "errors": [],
+    }
+
+
+def merge_batch_result(result: dict, batch: dict, resp: dict):
+    """将单个批次的发送结果映射回每个接收人"""
+    result["batches"] += 1
+    recipients = result["recipients"]
+    errcode = resp.get("errcode", -1)
+
+    if errcode not in (0, ERRCODE_ALL_INVALID):
+        result["failed_batches"] += 1
+        result["errors"].append({
+            "errcode": errcode,
+            "errmsg": resp.get("errmsg", ""),
+            "touser": len(batch["touser"]),
+            "toparty": len(batch["toparty"]),
+            "totag": len(batch["totag"]),
+        })
+        for userid in batch["touser"]:
+            recipients[userid] = "failed"
+        return
+
+    if errcode == ERRCODE_ALL_INVALID:
+        invalid_users = set(batch["touser"])
+        result["invalid_parties"].extend(batch["toparty"])
+        result["invalid_tags"].extend(batch["totag"])
+    else:
+        invalid_users = set(filter(None, resp.get("invaliduser", "").split("|")))
+        result["invalid_parties"].extend(filter(None, resp.get("invalidparty", "").split("|")))
+        result["invalid_tags"].extend(filter(None, resp.get("invalidtag", "").split("|")))
+    unlicensed = set(resp.get("unlicenseduser", "").split("|")) - {""}
+
+    for userid in batch["touser"]:
+        if userid in invalid_users:
+            recipients[userid] = "invalid"
+        elif userid in unlicensed:
+            recipients[userid] = "unlicensed"
+        else:
+            recipients[userid] = "sent"
+
+
+async def send_bulk(
+    client,
+    content: str,
+    touser: Iterable[str] = (),
+    toparty: Iterable[str] = (),
+    totag: Iterable[str] = (),
+    concurrency: Optional[int] = None,
+) -> dict:
+    """
+    批量发送文本消息
+    按批次并发调用 client.send_text，同时在途的批次数不超过 concurrency
+    """
+    concurrency = concurrency or get_settings().WECOM_BULK_CONCURRENCY
+    semaphore = asyncio.Semaphore(concurrency)
+    result = new_bulk_result()
+
+    async def send_batch(batch: dict):
+        # 在任务内获取并发名额，任务在开始前被取消时不会占用名额
+        async with semaphore:
+            try:
+                resp = await client.send_text(content, **batch)
+            except Exception as e:
+                logger.warning("Bulk send batch failed for corp %s: %s", client.corp_id, e)
+                resp = {"errcode": -1, "errmsg": str(e)}
+        merge_batch_result(result, batch, resp)
+
+    tasks = [asyncio.create_task(send_batch(batch)) for batch in pack_recipients(touser, toparty, totag)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # 调用方被取消或某个批次出错时，不留下无人等待、仍在发送的批次
+        for task in tasks:
+            task.cancel()
+    return result
@@ -0,0 +1,170 @@
+# 发送请求幂等：同一企业的同一 Idempotency-Key（未提供时为请求体哈希）只执行一次
+# - Redis SET NX 占位（带较短的过期时间，进程崩溃后自动释放），执行成功后保存响应，重放时直接返回
+# - 执行期间定期续期占位，执行时间超过占位过期时间也不会被其他进程重复执行
+# - 同一进程内并发的重复请求共享同一次执行；其他进程的重复请求轮询 Redis 等待首个请求的结果
+# - 执行失败时删除占位，客户端重试会重新执行
+# - 同一 Key 携带不同请求体视为误用，拒绝执行
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from redis.asyncio import Redis as AsyncRedis
+
+from ..config import get_settings
+from .redis_pool import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+_KEY = "wecom:idempotency:{corp_id}:{key}"
+_PENDING = "pending"
+_DONE = "done"
+
+
+class IdempotencyConflict(RuntimeError):
+    """相同请求仍在执行，等待超时"""
+
+
+class IdempotencyKeyReused(ValueError):
+    """同一 Idempotency-Key 对应了不同的请求体"""
+
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class IdempotencyStore:
+
+    def __init__(
+        self,
+        redis: AsyncRedis,
+        ttl: Optional[int] = None,
+        lock_ttl: Optional[int] = None,
+        wait_timeout: Optional[float] = None,
+    ):
+        settings = get_settings()
+        self.redis = redis
+        self.ttl = ttl or settings.IDEMPOTENCY_TTL
+        self.lock_ttl = lock_ttl or settings.IDEMPOTENCY_LOCK_TTL
+        self.wait_timeout = wait_timeout or settings.IDEMPOTENCY_WAIT_TIMEOUT
+        # 本进程内正在执行的请求：redis key -> Future(响应, 请求指纹)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def run(
+        self,
+        corp_id: str,
+        key: str,
+        body_hash: str,
+        func: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+    ) -> Tuple[Any, bool]:
+        """执行 func 或返回已保存的响应，返回 (响应, 是否为重放)"""
+        redis_key = _KEY.format(corp_id=corp_id, key=key)
+        future = self._inflight.get(redis_key)
+        while future is not None:
+            try:
+                # shield：等待方被取消时不影响首个请求
+                response, stored_hash = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # 首个请求被取消（如客户端断开），由当前请求重新执行
+                future = self._inflight.get(redis_key)
+                continue
+            self._check(stored_hash, body_hash)
+            return response, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[redis_key] = future
+        try:
+            response, replayed = await self._run(redis_key, body_hash, func, ttl or self.ttl)
+            future.set_result((response, body_hash))
+            return response, replayed
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待方时避免 "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(redis_key) is future:
+                del self._inflight[redis_key]
+
+    async def _run(self, redis_key: str, body_hash: str, func, ttl: int) -> Tuple[Any, bool]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        delay = 0.05
+        # owner 区分占位属于哪一次执行，续期时不会延长其他进程的占位
+        pending = json.dumps({"state": _PENDING, "hash": body_hash, "owner": uuid.uuid4().hex})
+        while True:
+            if await self.redis.set(redis_key, pending, nx=True, ex=self.lock_ttl):
+                heartbeat = asyncio.create_task(self._heartbeat(redis_key, pending))
+                try:
+                    return await self._execute(redis_key, body_hash, func, ttl), False
+                finally:
+                    heartbeat.cancel()
+            stored = await self.redis.get(redis_key)
+            if stored is not None:
+                record = json.loads(stored)
+                self._check(record["hash"], body_hash)
+                if record["state"] == _DONE:
+                    return record["response"], True
+            # 其他进程仍在执行（或占位刚被释放），稍后重试
+            if loop.time() + delay > deadline:
+                raise IdempotencyConflict("A request with the same idempotency key is in progress")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    async def _heartbeat(self, redis_key: str, pending: str):
+        """执行期间每 1/3 个占位过期时间续期一次，占位已不属于本次执行时停止"""
+        interval = self.lock_ttl / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                stored = await self.redis.get(redis_key)
+                if stored is None or json.loads(stored) != json.loads(pending):
+                    return
+                await self.redis.expire(redis_key, self.lock_ttl)
+            except Exception:
+                logger.exception("Failed to extend idempotency lock %s", redis_key)
+
+    async def _execute(self, redis_key: str, body_hash: str, func, ttl: int):
+        try:
+            response = await func()
+        except BaseException:
+            try:
+                await self.redis.delete(redis_key)
+            except Exception:
+                logger.exception("Failed to release idempotency key %s", redis_key)
+            raise
+        record = json.dumps({"state": _DONE, "hash": body_hash, "response": response})
+        try:
+            await self.redis.set(redis_key, record, ex=ttl)
+        except Exception:
+            # 已经执行成功，保存失败只影响之后的重放
+            logger.exception("Failed to store idempotent response for %s", redis_key)
+        return response
+
+    @staticmethod
+    def _check(stored_hash: str, body_hash: str):
+        if stored_hash != body_hash:
+            raise IdempotencyKeyReused("Idempotency-Key was used with a different request body")
+
+
+_stores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """当前事件循环共享的幂等存储（进程内合并依赖同一个实例）"""
+    loop = asyncio.get_running_loop()
+    store = _stores.get(loop)
+    if store is None:
+        store = IdempotencyStore(get_async_redis())
+        _stores[loop] = store
+    return store
@@ -0,0 +1,136 @@
+# Prometheus 指标
+# 多 worker 部署时设置环境变量 PROMETHEUS_MULTIPROC_DIR（每次启动前清空该目录），
+# /metrics 会汇总所有 worker 的数据
+
+import logging
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+
+# 数据库连接池
+DB_POOL_CHECKED_OUT = Gauge(
+    "wecom_db_pool_checked_out", "Connections currently checked out",
+    ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_IDLE = Gauge(
+    "wecom_db_pool_idle", "Idle connections in the pool",
+    ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "wecom_db_pool_overflow", "Overflow connections beyond pool_size",
+    ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "wecom_db_pool_checkout_seconds", "Time spent waiting to check out a connection",
+    ["pool"], buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+# 入站 HTTP 请求
+HTTP_REQUEST_SECONDS = Histogram(
+    "wecom_http_request_duration_seconds", "Inbound request latency by route",
+    ["method", "route", "status"]
+)
+
+# 出站企业微信 API 调用
+WECOM_API_SECONDS = Histogram(
+    "wecom_api_request_duration_seconds", "Outbound WeCom API call latency",
+    ["corp_id", "api"]
+)
+WECOM_API_ERRORS = Counter(
+    "wecom_api_errors_total", "WeCom API calls that returned a non-zero errcode or failed",
+    ["corp_id", "api", "errcode"]
+)
+WECOM_API_RETRIES = Counter(
+    "wecom_api_retries_total", "WeCom API calls retried after a transient failure",
+    ["corp_id", "api"]
+)
+WECOM_CIRCUIT_STATE = Gauge(
+    "wecom_circuit_state", "Per-corp circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["corp_id"], multiprocess_mode="max"
+)
+
+# 进程启动耗时
+STARTUP_SECONDS = Gauge(
+    "wecom_startup_seconds", "Time spent starting this worker by phase",
+    ["phase"], multiprocess_mode="max"
+)
+
+
+def report_startup(import_started: float, import_finished: float, init_started: float):
+    """记录并输出启动耗时：模块导入、生命周期初始化及合计"""
+    now = time.perf_counter()
+    phases = {
+        "import": import_finished - import_started,
+        "init": now - init_started,
+        "total": now - import_started,
+    }
+    for phase, seconds in phases.items():
+        STARTUP_SECONDS.labels(phase).set(seconds)
+    logging.getLogger("wecom.startup").info(
+        "Worker %d started in %.0f ms (import %.0f ms, init %.0f ms)",
+        os.getpid(), phases["total"] * 1000, phases["import"] * 1000, phases["init"] * 1000
+    )
+    return phases
+
+
+def update_pool_gauges(pool, name: str):
+    DB_POOL_CHECKED_OUT.labels(name).set(pool.checkedout())
+    DB_POOL_IDLE.labels(name).set(pool.checkedin())
+    DB_POOL_OVERFLOW.labels(name).set(max(pool.overflow(), 0))
+
+
+class CheckoutTimingMixin:
+    """记录从连接池取连接的耗时（排队等待 + 新建连接 + pre_ping），与 QueuePool 系列一起使用"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(self._orig_logging_name or "default").observe(
+                time.perf_counter() - start
+            )
+
+
+def render_metrics():
+    """返回 (内容, Content-Type)"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """按路由模板记录请求耗时（ASGI 中间件，不缓冲响应体）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # 未匹配的路径统一归类，避免标签基数失控
+            path = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], path, str(status_code)).observe(
+                time.perf_counter() - start
+            )
@@ -0,0 +1,41 @@
+# 通知记录写入：每次发送后按接收人记录投递结果
+
+import logging
+from datetime import datetime, timezone
+from typing import Dict
+
+from ..db.writer import notification_writer
+
+logger = logging.getLogger(__name__)
+
+
+def build_rows(subscriber_id: int, enterprise_id: int, content: str,
+               recipients: Dict[str, str], msgtype: str = "text"):
+    # 写入是异步批量进行的，创建时间在入队时确定
+    created_at = datetime.now(timezone.utc)
+    for userid, status in recipients.items():
+        yield {
+            "subscriber_id": subscriber_id,
+            "enterprise_id": enterprise_id,
+            "recipient": userid,
+            "msgtype": msgtype,
+            "content": content,
+            "status": status,
+            "created_at": created_at,
+        }
+
+
+async def record_deliveries(enterprise: dict, content: str,
+                            recipients: Dict[str, str], msgtype: str = "text") -> int:
+    """
+    记录一次发送中每个接收人的投递结果（交给批量写入器），返回记录条数
+    记录归属企业上由管理员关联的订阅者，未关联时不记录；写入企业 db_cluster 对应的库
+    """
+    subscriber_id = enterprise.get("subscriber_id")
+    if subscriber_id is None:
+        logger.debug("No subscriber linked to enterprise %s, skip notification log",
+                     enterprise["enterprise_id"])
+        return 0
+    rows = list(build_rows(subscriber_id, enterprise["enterprise_id"], content, recipients, msgtype))
+    await notification_writer.put_many(rows, cluster=enterprise.get("db_cluster"))
+    return len(rows)
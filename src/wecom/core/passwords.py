@@ -0,0 +1,81 @@
+# 密码哈希：bcrypt 在有界线程池中执行，避免阻塞事件循环
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from ..config import get_settings
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+
+def build_crypt_context(rounds: int) -> "CryptContext":
+    """cost 与配置不一致的哈希会被标记为需要更新（登录时自动重新哈希）"""
+    # 延迟导入 passlib，加快进程启动
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+class PasswordHasher:
+    """
+    bcrypt 单次计算耗时 100ms 以上，放到专用线程池执行（bcrypt 计算时释放 GIL）
+    在途任务超过 max_pending 时直接返回 503，避免登录洪峰拖垮整个服务
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None, rounds: int = None):
+        settings = get_settings()
+        self.max_workers = max_workers or settings.PASSWORD_HASH_WORKERS
+        self.max_pending = max_pending or settings.PASSWORD_HASH_MAX_PENDING
+        self.rounds = rounds or settings.BCRYPT_ROUNDS
+        self._context = None
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="bcrypt")
+        self._pending = 0  # 执行中 + 排队中的任务数
+
+    @property
+    def context(self) -> "CryptContext":
+        """首次使用时创建 CryptContext"""
+        if self._context is None:
+            self._context = build_crypt_context(self.rounds)
+        return self._context
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Password service is busy, please retry later",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """校验密码；若哈希 cost 已过时，同时返回按当前配置生成的新哈希"""
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
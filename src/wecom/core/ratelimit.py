@@ -0,0 +1,280 @@
+# 基于 Redis 的限流
+# - 令牌桶：控制调用企业微信 API 的频率
+# - 滑动窗口：限制各企业调用本服务的请求数与发送量
+
+import asyncio
+import logging
+import math
+import time
+import weakref
+from collections import namedtuple
+from typing import List, Optional, Sequence
+
+from redis.exceptions import RedisError
+
+from ..config import get_settings
+from .cache import TTLCache
+from .redis_pool import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# key: Redis 键; rate: 每秒补充的令牌数; capacity: 桶容量（允许的突发量）
+Bucket = namedtuple("Bucket", ["key", "rate", "capacity"])
+
+# 同时检查多个桶，全部有足够令牌时才一起扣减
+# 返回需要等待的毫秒数，0 表示已获取
+_TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call("TIME")
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local states = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call("HMGET", key, "tokens", "ts")
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+    if tokens < cost then
+        wait = math.max(wait, math.ceil((cost - tokens) * 1000 / rate))
+    end
+    states[i] = {tokens, rate, capacity}
+end
+for i, key in ipairs(KEYS) do
+    local tokens = states[i][1]
+    if wait == 0 then
+        tokens = tokens - cost
+    end
+    redis.call("HSET", key, "tokens", tostring(tokens), "ts", now)
+    redis.call("PEXPIRE", key, math.ceil(states[i][3] * 1000 / states[i][2]) + 1000)
+end
+return wait
+"""
+
+
+def wecom_buckets(corp_id: str, agent_id: int = None) -> list:
+    """企业微信 API 频率限制对应的令牌桶（每企业、每应用）"""
+    settings = get_settings()
+    buckets = [Bucket(
+        f"wecom:ratelimit:corp:{corp_id}",
+        settings.WECOM_CORP_RATE_LIMIT,
+        settings.WECOM_CORP_RATE_BURST,
+    )]
+    if agent_id is not None:
+        buckets.append(Bucket(
+            f"wecom:ratelimit:agent:{corp_id}:{agent_id}",
+            settings.WECOM_AGENT_RATE_LIMIT,
+            settings.WECOM_AGENT_RATE_BURST,
+        ))
+    return buckets
+
+
+def _script_args(buckets: Sequence[Bucket], cost: int):
+    keys = [b.key for b in buckets]
+    args = [cost]
+    for b in buckets:
+        args.extend([b.rate, b.capacity])
+    return keys, args
+
+
+class TokenBucket:
+    """Redis 令牌桶（同步客户端，供 Celery worker 使用）"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._script = redis.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    def try_acquire(self, buckets: Sequence[Bucket], cost: int = 1) -> float:
+        """尝试获取令牌，返回需要等待的秒数（0 表示成功）"""
+        keys, args = _script_args(buckets, cost)
+        return int(self._script(keys=keys, args=args)) / 1000
+
+    def acquire(self, buckets: Sequence[Bucket], cost: int = 1, max_wait: float = 1.0) -> float:
+        """
+        在 max_wait 秒内阻塞等待令牌
+        返回 0 表示成功，否则返回仍需等待的秒数，由调用方决定是否稍后重试
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.try_acquire(buckets, cost)
+            if wait == 0 or time.monotonic() + wait > deadline:
+                return wait
+            time.sleep(wait)
+
+
+class AsyncTokenBucket:
+    """Redis 令牌桶（asyncio 客户端）"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._script = redis.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def try_acquire(self, buckets: Sequence[Bucket], cost: int = 1) -> float:
+        keys, args = _script_args(buckets, cost)
+        return int(await self._script(keys=keys, args=args)) / 1000
+
+    async def acquire(self, buckets: Sequence[Bucket], cost: int = 1):
+        """等待直到获取令牌"""
+        while True:
+            wait = await self.try_acquire(buckets, cost)
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+
+# 滑动窗口计数（上一窗口按剩余比例加权 + 当前窗口计数）
+# key: Redis 键; limit: 每个窗口允许的数量; window: 窗口长度（毫秒）
+Window = namedtuple("Window", ["key", "limit", "window"])
+
+# 检查结果：reset 为最受限窗口恢复额度的秒数，retry_after 仅在拒绝时有意义
+LimitResult = namedtuple("LimitResult", ["allowed", "limit", "remaining", "reset", "retry_after"])
+
+# 同时检查多个窗口，全部未超限时才一起计数
+# 返回 {allowed, limit, remaining, reset_ms, retry_after_ms}，取剩余额度最少的窗口
+_SLIDING_WINDOW_SCRIPT = """
+local now_parts = redis.call("TIME")
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local allowed = 1
+local states = {}
+local result_limit, remaining, reset, retry_after = 0, nil, 0, 0
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i * 2])
+    local window = tonumber(ARGV[i * 2 + 1])
+    local start = now - now % window
+    local state = redis.call("HMGET", key, "start", "curr", "prev")
+    local st, curr, prev = tonumber(state[1]), tonumber(state[2]) or 0, tonumber(state[3]) or 0
+    if st ~= start then
+        if st == start - window then prev = curr else prev = 0 end
+        curr = 0
+    end
+    local elapsed = now - start
+    local used = prev * (window - elapsed) / window + curr
+    local left = math.floor(limit - used)
+    local wait = 0
+    if used + cost > limit then
+        allowed = 0
+        -- 上一窗口的权重线性下降，算出降到可用时的等待时间；仍不够时等到下个窗口
+        if prev > 0 and curr + cost <= limit then
+            wait = math.ceil(window * (1 - (limit - curr - cost) / prev) - elapsed)
+        else
+            wait = window - elapsed
+        end
+    end
+    if remaining == nil or left < remaining then
+        result_limit, remaining, reset = limit, left, window - elapsed
+    end
+    retry_after = math.max(retry_after, wait)
+    states[i] = {start, curr, prev, window}
+end
+for i, key in ipairs(KEYS) do
+    local s = states[i]
+    if allowed == 1 then
+        s[2] = s[2] + cost
+    end
+    redis.call("HSET", key, "start", s[1], "curr", s[2], "prev", s[3])
+    redis.call("PEXPIRE", key, s[4] * 2)
+end
+if allowed == 1 then
+    remaining = remaining - cost
+end
+return {allowed, result_limit, math.max(remaining, 0), reset, retry_after}
+"""
+
+
+class LocalSlidingWindow:
+    """进程内的滑动窗口计数，Redis 不可用时使用，额度按 worker 数平分"""
+
+    def __init__(self, share: Optional[int] = None, maxsize: int = 100000):
+        self.share = max(1, share or get_settings().WORKERS)
+        self._states = TTLCache(maxsize=maxsize, ttl=3600)
+
+    def hit(self, windows: Sequence[Window], cost: int = 1) -> LimitResult:
+        now = int(time.time() * 1000)
+        states, allowed = [], True
+        best, retry_after = None, 0
+        for w in windows:
+            limit = max(1, math.ceil(w.limit / self.share))
+            start = now - now % w.window
+            st, curr, prev = self._states.get(w.key) or (None, 0, 0)
+            if st != start:
+                prev, curr = (curr if st == start - w.window else 0), 0
+            elapsed = now - start
+            used = prev * (w.window - elapsed) / w.window + curr
+            if used + cost > limit:
+                allowed = False
+                retry_after = max(retry_after, w.window - elapsed)
+            left = math.floor(limit - used)
+            if best is None or left < best[1]:
+                best = (limit, left, w.window - elapsed)
+            states.append((w, start, curr, prev))
+        for w, start, curr, prev in states:
+            self._states.set(w.key, (start, curr + cost if allowed else curr, prev), ttl=w.window * 2 / 1000)
+        limit, left, reset = best
+        if allowed:
+            left -= cost
+        return LimitResult(allowed, limit, max(left, 0), reset / 1000, retry_after / 1000)
+
+
+class SlidingWindowLimiter:
+    """
+    Redis 滑动窗口限流（asyncio 客户端）
+    Redis 超时或出错时退化为进程内计数，并在 degrade_seconds 内不再访问 Redis，
+    避免 Redis 变慢拖慢所有请求
+    """
+
+    def __init__(
+        self,
+        redis,
+        timeout: Optional[float] = None,
+        degrade_seconds: float = 1.0,
+        local: Optional[LocalSlidingWindow] = None,
+    ):
+        self.redis = redis
+        self._script = redis.register_script(_SLIDING_WINDOW_SCRIPT)
+        self.timeout = timeout or get_settings().RATE_LIMIT_REDIS_TIMEOUT_MS / 1000
+        self.degrade_seconds = degrade_seconds
+        self.local = local or LocalSlidingWindow()
+        self._degraded_until = 0.0
+
+    async def hit(self, windows: Sequence[Window], cost: int = 1) -> LimitResult:
+        if time.monotonic() >= self._degraded_until:
+            keys = [w.key for w in windows]
+            args: List = [cost]
+            for w in windows:
+                args.extend([w.limit, w.window])
+            try:
+                allowed, limit, remaining, reset, retry_after = await asyncio.wait_for(
+                    self._script(keys=keys, args=args), self.timeout
+                )
+                return LimitResult(bool(allowed), int(limit), int(remaining),
+                                   int(reset) / 1000, int(retry_after) / 1000)
+            except (asyncio.TimeoutError, RedisError, OSError) as e:
+                logger.warning("Rate limiter falling back to local counters: %r", e)
+                self._degraded_until = time.monotonic() + self.degrade_seconds
+        return self.local.hit(windows, cost)
+
+
+def quota_windows(api_key: str, tier: Optional[str], kind: str) -> List[Window]:
+    """按订阅等级生成企业的配额窗口，kind 为 requests（请求数）或 sends（发送人次）"""
+    settings = get_settings()
+    quotas = settings.RATE_LIMIT_REQUESTS if kind == "requests" else settings.RATE_LIMIT_SENDS
+    tier = tier if tier in quotas else "basic"
+    limit = quotas.get(tier)
+    if not limit:
+        return []
+    return [Window(f"wecom:quota:{kind}:{api_key}", limit, settings.RATE_LIMIT_WINDOW * 1000)]
+
+
+_limiters: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_rate_limiter() -> SlidingWindowLimiter:
+    """当前事件循环共享的入站限流器"""
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = SlidingWindowLimiter(get_async_redis())
+        _limiters[loop] = limiter
+    return limiter
@@ -0,0 +1,72 @@
+# 进程共享的 Redis 客户端：同步一个、asyncio 每个事件循环一个，各自持有一个连接池
+# - 连接参数（含 REDIS_PASSWORD）统一取自 Settings，所有子系统复用，连接数不再随客户端对象数量增长
+# - 连接池为阻塞式：连接数达到 REDIS_MAX_CONNECTIONS 时等待空闲连接（最多 REDIS_POOL_TIMEOUT 秒），而不是直接报错
+# - redis.asyncio 的连接绑定创建它的事件循环，同步 WeComClient 的后台循环与主循环各用一个池
+# - 连接参数在首次使用时读取，修改后需重启进程生效
+
+import asyncio
+import threading
+import weakref
+from typing import Optional
+
+from redis import BlockingConnectionPool, Redis
+from redis.asyncio import BlockingConnectionPool as AsyncBlockingConnectionPool
+from redis.asyncio import Redis as AsyncRedis
+
+from ..config import get_settings
+
+_sync_redis: Optional[Redis] = None
+_sync_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRedis]" = \
+    weakref.WeakKeyDictionary()
+
+
+def pool_kwargs() -> dict:
+    settings = get_settings()
+    return {
+        "host": settings.REDIS_HOST,
+        "port": settings.REDIS_PORT,
+        "db": settings.REDIS_DB,
+        "password": settings.REDIS_PASSWORD or None,
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "timeout": settings.REDIS_POOL_TIMEOUT,
+    }
+
+
+def get_sync_redis() -> Redis:
+    """进程共享的同步 Redis 客户端（线程安全，供 Celery 任务与同步代码使用）"""
+    global _sync_redis
+    if _sync_redis is None:
+        with _sync_lock:
+            if _sync_redis is None:
+                _sync_redis = Redis(connection_pool=BlockingConnectionPool(**pool_kwargs()))
+    return _sync_redis
+
+
+def get_async_redis() -> AsyncRedis:
+    """当前事件循环共享的 asyncio Redis 客户端"""
+    loop = asyncio.get_running_loop()
+    redis = _async_clients.get(loop)
+    if redis is None:
+        redis = AsyncRedis(connection_pool=AsyncBlockingConnectionPool(**pool_kwargs()))
+        _async_clients[loop] = redis
+    return redis
+
+
+async def close_async_redis():
+    """关闭当前事件循环的连接池（应用关闭时调用）"""
+    redis = _async_clients.pop(asyncio.get_running_loop(), None)
+    if redis is not None:
+        await redis.aclose()
+        await redis.connection_pool.disconnect()
+
+
+def close_sync_redis():
+    global _sync_redis
+    with _sync_lock:
+        redis, _sync_redis = _sync_redis, None
+    if redis is not None:
+        redis.close()
+        redis.connection_pool.disconnect()
@@ -0,0 +1,175 @@
+# 企业微信 API 调用的容错：按企业熔断、重试预算与带抖动的指数退避
+# - 熔断器：连续失败达到阈值后打开，期间直接失败不占用连接；
+#   冷却后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开
+# - 重试预算：窗口内重试次数不超过 min_retries + ratio × 请求数，上游故障时不会被重试放大流量
+# - 退避：full jitter，delay = random(0, min(max_delay, base × 2^attempt))
+# 状态保存在进程内，同步客户端的后台线程与主事件循环共享，因此用线程锁保护
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from ..config import get_settings
+from . import metrics
+
+# 企业微信系统繁忙
+ERRCODE_BUSY = -1
+# access_token 无效 / 已过期
+TOKEN_ERRCODES = (40014, 42001)
+# 接口调用超过频率限制
+RATE_LIMIT_ERRCODES = (45009, 45033)
+
+
+class WeComAPIError(Exception):
+    """企业微信接口返回错误或不可用"""
+
+    def __init__(self, errcode: int, errmsg: str = "", api: str = ""):
+        self.errcode = errcode
+        self.errmsg = errmsg
+        self.api = api
+        super().__init__(f"{api or 'WeCom API'} failed: {errcode} {errmsg}".strip())
+
+
+class RequestNotSentError(WeComAPIError):
+    """请求确定没有到达企业微信（取 token 失败或连接未建立），非幂等请求也可以安全重发"""
+
+
+class CircuitOpenError(WeComAPIError):
+    """该企业的熔断器处于打开状态"""
+
+    def __init__(self, corp_id: str, retry_after: float):
+        self.corp_id = corp_id
+        self.retry_after = retry_after
+        super().__init__(ERRCODE_BUSY, f"circuit open for corp {corp_id}, retry in {retry_after:.1f}s")
+
+
+def backoff_delay(attempt: int, base: Optional[float] = None, cap: Optional[float] = None) -> float:
+    """第 attempt 次重试（从0开始）前的等待秒数"""
+    settings = get_settings()
+    base = settings.WECOM_RETRY_BASE_DELAY if base is None else base
+    cap = settings.WECOM_RETRY_MAX_DELAY if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, open_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """请求前调用，熔断打开时抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.open_seconds - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(self.name, max(remaining, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def release(self):
+        """请求被取消时归还半开状态的探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._probing = False
+                self.opened_at = time.monotonic()
+                if self.state != self.OPEN:
+                    self._set_state(self.OPEN)
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.WECOM_CIRCUIT_STATE.labels(self.name).set(
+            {self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[state]
+        )
+
+
+class RetryBudget:
+    """滑动窗口内的重试配额"""
+
+    def __init__(self, ratio: float, min_retries: int, window: float):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and events[0] <= now - self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        """预算充足时记下一次重试并返回 True"""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CorpGuard:
+    """单个企业的熔断器与重试预算"""
+
+    def __init__(self, corp_id: str):
+        settings = get_settings()
+        self.breaker = CircuitBreaker(
+            corp_id, settings.WECOM_BREAKER_FAILURES, settings.WECOM_BREAKER_OPEN_SECONDS
+        )
+        self.budget = RetryBudget(
+            settings.WECOM_RETRY_BUDGET_RATIO,
+            settings.WECOM_RETRY_BUDGET_MIN,
+            settings.WECOM_RETRY_BUDGET_WINDOW,
+        )
+
+
+_guards: Dict[str, CorpGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(corp_id: str) -> CorpGuard:
+    guard = _guards.get(corp_id)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.setdefault(corp_id, CorpGuard(corp_id))
+    return guard
+
+
+def reset_guards():
+    """清除全部企业的熔断与预算状态（测试及配置变更后使用）"""
+    with _guards_lock:
+        _guards.clear()
@@ -1,7 +1,9 @@
 import secrets
 import string
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from auth import SecretManager
+from .auth import get_secret_manager, invalidate_corp, invalidate_enterprise_credentials
+from . import subscriber_cache
 from ..db.models import Enterprise
 
 def generate_secure_key(length=32):
@@ -9,13 +11,33 @@ def generate_secure_key(length=32):
     alphabet = string.ascii_letters + string.digits
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
-def register_enterprise(db: Session, name: str, wecom_corp_id: str, wecom_secret: str):
+def check_subscriber_cluster(db: Session, enterprise: Enterprise):
+    """
+    订阅者的通知记录写在其企业所在的 db_cluster，同一订阅者关联的企业必须在同一集群
+    （未分库的企业视为默认集群），否则抛出 ValueError
+    """
+    if enterprise.subscriber_id is None:
+        return
+    conflict = db.execute(
+        select(Enterprise.id).where(
+            Enterprise.subscriber_id == enterprise.subscriber_id,
+            Enterprise.id != enterprise.id,
+            Enterprise.db_cluster.is_distinct_from(enterprise.db_cluster)
+        ).limit(1)
+    ).scalar()
+    if conflict is not None:
+        raise ValueError(
+            f"Subscriber {enterprise.subscriber_id} is linked to enterprises on another db_cluster"
+        )
+
+def register_enterprise(db: Session, name: str, wecom_corp_id: str, wecom_secret: str,
+                        subscription_tier: str = "basic", subscriber_id: int = None):
     # 生成API凭证
     api_key = generate_secure_key(32)  # 32位随机字符串
     secret_key = generate_secure_key(64)  # 64位随机字符串
     
     # 加密存储（核心修改）
-    secret_manager = SecretManager()
+    secret_manager = get_secret_manager()
     encrypted_secret = secret_manager.encrypt_secret(secret_key)
     
     # 保存记录
@@ -24,8 +46,11 @@ def register_enterprise(db: Session, name: str, wecom_corp_id: str, wecom_secret
         api_key=api_key,
         encrypted_secret=encrypted_secret,  # 使用新字段
         wecom_corp_id=wecom_corp_id,
-        wecom_secret=wecom_secret
+        wecom_secret=wecom_secret,
+        subscription_tier=subscription_tier,
+        subscriber_id=subscriber_id
     )
+    check_subscriber_cluster(db, enterprise)
     db.add(enterprise)
     db.commit()
     
@@ -34,4 +59,39 @@ def register_enterprise(db: Session, name: str, wecom_corp_id: str, wecom_secret
         "api_key": api_key,
         "secret_key": secret_key,  # 最后一次明文展示
         "expires_in": 3600  # 要求客户端立即保存
-    }
\ No newline at end of file
+    }
+
+def update_enterprise(db: Session, enterprise_id: int, **fields):
+    """更新企业信息并使各 worker 的凭据缓存失效"""
+    enterprise = db.get(Enterprise, enterprise_id)
+    if enterprise is None:
+        return None
+    # 轮换 api_key 时旧 key 也要失效，否则在缓存 TTL 内仍可认证
+    old_api_key = enterprise.api_key
+    old_corp_id = enterprise.wecom_corp_id
+    relinked = "subscriber_id" in fields or "db_cluster" in fields
+    old_subscriber_id = enterprise.subscriber_id if relinked else None
+    for key, value in fields.items():
+        setattr(enterprise, key, value)
+    if relinked:
+        try:
+            check_subscriber_cluster(db, enterprise)
+        except ValueError:
+            db.rollback()
+            raise
+        # 订阅者所在集群的缓存
+        subscriber_cache.invalidate_cluster(old_subscriber_id)
+        subscriber_cache.invalidate_cluster(enterprise.subscriber_id)
+    db.commit()
+    invalidate_enterprise_credentials(old_api_key)
+    if enterprise.api_key != old_api_key:
+        invalidate_enterprise_credentials(enterprise.api_key)
+    # worker 中按 corp_id 缓存的 secret 与回调加解密器
+    invalidate_corp(old_corp_id)
+    if enterprise.wecom_corp_id != old_corp_id:
+        invalidate_corp(enterprise.wecom_corp_id)
+    return enterprise
+
+def deactivate_enterprise(db: Session, enterprise_id: int):
+    """停用企业，已缓存的凭据立即失效"""
+    return update_enterprise(db, enterprise_id, is_active=False)
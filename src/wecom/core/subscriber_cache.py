@@ -0,0 +1,78 @@
+# 已验证 JWT 与订阅者记录的进程内缓存
+
+import time
+from typing import Optional
+
+from ..config import get_settings
+from ..models.subscription_models import SubscriberInDB
+from .cache import TTLCache
+
+_settings = get_settings()
+
+# token -> claims，条目在 token 的 exp 时过期
+verified_tokens = TTLCache(
+    maxsize=_settings.TOKEN_CACHE_SIZE,
+    ttl=_settings.TOKEN_CACHE_MAX_TTL
+)
+# email -> SubscriberInDB 快照
+subscribers = TTLCache(
+    maxsize=_settings.SUBSCRIBER_CACHE_SIZE,
+    ttl=_settings.SUBSCRIBER_CACHE_TTL
+)
+
+# subscriber_id -> 关联企业的 db_cluster（"" 表示默认库）
+clusters = TTLCache(
+    maxsize=_settings.SUBSCRIBER_CACHE_SIZE,
+    ttl=_settings.SUBSCRIBER_CACHE_TTL
+)
+
+
+def get_claims(token: str) -> Optional[dict]:
+    return verified_tokens.get(token)
+
+
+def cache_claims(token: str, claims: dict):
+    """缓存已验证的 claims，有效期不超过 token 本身的 exp"""
+    exp = claims.get("exp")
+    ttl = verified_tokens.ttl
+    if exp is not None:
+        ttl = min(ttl, float(exp) - time.time())
+    if ttl > 0:
+        verified_tokens.set(token, claims, ttl=ttl)
+
+
+def get_subscriber(email: str) -> Optional[SubscriberInDB]:
+    return subscribers.get(email)
+
+
+def cache_subscriber(subscriber) -> SubscriberInDB:
+    """缓存订阅者快照（不缓存 ORM 对象，避免跨会话使用）"""
+    snapshot = SubscriberInDB.model_validate(subscriber)
+    subscribers.set(snapshot.contact_email, snapshot)
+    return snapshot
+
+
+def invalidate_subscriber(email: str):
+    """订阅者信息变更后调用"""
+    subscribers.pop(email)
+
+
+def get_cluster(subscriber_id: int) -> Optional[str]:
+    """返回缓存的 db_cluster，未缓存时返回 None（默认库缓存为空字符串）"""
+    return clusters.get(subscriber_id)
+
+
+def cache_cluster(subscriber_id: int, cluster: Optional[str]) -> str:
+    cluster = cluster or ""
+    clusters.set(subscriber_id, cluster)
+    return cluster
+
+
+def invalidate_cluster(subscriber_id: Optional[int]):
+    """订阅者关联的企业或企业的 db_cluster 变更后调用"""
+    if subscriber_id is not None:
+        clusters.pop(subscriber_id)
+
+
+def cache_stats() -> dict:
+    return {"tokens": verified_tokens.stats(), "subscribers": subscribers.stats()}
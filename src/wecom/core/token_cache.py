@@ -0,0 +1,252 @@
+# access_token 两级缓存：进程内 L1 + Redis L2，分布式单飞刷新与提前续期
+
+import asyncio
+import logging
+import secrets
+import time
+import weakref
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from redis.asyncio import Redis as AsyncRedis
+
+from ..config import get_settings
+from .redis_pool import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# 返回 (token, expires_in) 的获取函数
+TokenFetcher = Callable[[], Awaitable[Tuple[str, int]]]
+
+# 仅在锁仍归自己所有时释放
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+_token_caches: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AccessTokenCache]" = \
+    weakref.WeakKeyDictionary()
+
+
+class AccessTokenCache:
+    """
+    两级 access_token 缓存
+    - L1：进程内字典，命中时无网络开销
+    - L2：Redis，跨 worker 共享
+    - 未命中时通过 Redis 锁保证每个企业只有一个 worker 请求企业微信
+    - 剩余有效期低于 refresh_margin 时在后台提前续期
+    - 超过 idle_timeout 未使用的企业从缓存中移除，后台不再为其续期
+    """
+
+    def __init__(
+        self,
+        redis: AsyncRedis,
+        ttl: Optional[int] = None,
+        refresh_margin: Optional[int] = None,
+        lock_timeout: Optional[float] = None,
+        poll_interval: float = 0.05,
+        idle_timeout: Optional[float] = None,
+    ):
+        settings = get_settings()
+        self.redis = redis
+        self.ttl = ttl or settings.WECOM_TOKEN_TTL
+        self.refresh_margin = refresh_margin or settings.WECOM_TOKEN_REFRESH_MARGIN
+        self.lock_timeout = lock_timeout or settings.WECOM_TOKEN_LOCK_TIMEOUT
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout or settings.WECOM_TOKEN_IDLE_TIMEOUT
+        self._local: Dict[str, Tuple[str, float]] = {}  # corp_id -> (token, 过期时间)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._fetchers: Dict[str, TokenFetcher] = {}
+        self._last_used: Dict[str, float] = {}  # corp_id -> 最近一次 get 的时间（monotonic）
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._refresher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def cache_key(corp_id: str) -> str:
+        return f"wecom_token:{corp_id}"
+
+    @staticmethod
+    def lock_key(corp_id: str) -> str:
+        return f"wecom_token_lock:{corp_id}"
+
+    async def get(self, corp_id: str, fetch: TokenFetcher) -> str:
+        """获取 access_token，必要时刷新"""
+        self._touch(corp_id, fetch)
+        cached = self._local.get(corp_id)
+        now = time.time()
+        if cached and cached[1] > now:
+            if cached[1] - now < self.refresh_margin:
+                self._schedule_refresh(corp_id)
+            return cached[0]
+
+        lock = self._locks.setdefault(corp_id, asyncio.Lock())
+        async with lock:
+            # 等锁期间其他协程可能已经写入 L1
+            cached = self._local.get(corp_id)
+            if cached and cached[1] > time.time():
+                return cached[0]
+            return await self._load(corp_id, fetch)
+
+    async def get_many(self, fetchers: Dict[str, TokenFetcher]) -> Dict[str, str]:
+        """
+        批量获取多个企业的 access_token（如跨企业群发）
+        L1 未命中的企业用一次流水线（MGET + 各自的 PTTL）读取 L2，仍未命中的再逐个走 get 刷新
+        """
+        tokens: Dict[str, str] = {}
+        missing = []
+        now = time.time()
+        for corp_id, fetch in fetchers.items():
+            self._touch(corp_id, fetch)
+            cached = self._local.get(corp_id)
+            if cached and cached[1] > now:
+                if cached[1] - now < self.refresh_margin:
+                    self._schedule_refresh(corp_id)
+                tokens[corp_id] = cached[0]
+            else:
+                missing.append(corp_id)
+        if not missing:
+            return tokens
+
+        keys = [self.cache_key(corp_id) for corp_id in missing]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.mget(keys)
+            for key in keys:
+                pipe.pttl(key)
+            values, *pttls = await pipe.execute()
+        now = time.time()
+        unresolved = []
+        for corp_id, token, pttl in zip(missing, values, pttls):
+            if not token or pttl is None or pttl <= 0:
+                unresolved.append(corp_id)
+                continue
+            token = token.decode() if isinstance(token, bytes) else token
+            self._local[corp_id] = (token, now + pttl / 1000)
+            tokens[corp_id] = token
+
+        fetched = await asyncio.gather(*(self.get(c, fetchers[c]) for c in unresolved))
+        tokens.update(zip(unresolved, fetched))
+        return tokens
+
+    def _touch(self, corp_id: str, fetch: TokenFetcher):
+        self._fetchers[corp_id] = fetch
+        self._last_used[corp_id] = time.monotonic()
+
+    def forget_idle(self) -> int:
+        """移除超过 idle_timeout 未使用的企业（获取函数、L1 token 和锁），返回移除数量"""
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [corp_id for corp_id, used in self._last_used.items() if used < deadline]
+        forgotten = 0
+        for corp_id in idle:
+            lock = self._locks.get(corp_id)
+            if lock is not None and lock.locked():
+                continue
+            forgotten += 1
+            self._last_used.pop(corp_id, None)
+            self._fetchers.pop(corp_id, None)
+            self._local.pop(corp_id, None)
+            self._locks.pop(corp_id, None)
+            self._refreshing.pop(corp_id, None)
+        return forgotten
+
+    def invalidate(self, corp_id: str):
+        """丢弃 L1 中的 token（Redis 中的由调用方决定是否删除）"""
+        self._local.pop(corp_id, None)
+
+    async def delete(self, corp_id: str):
+        """删除两级缓存中的 token"""
+        self.invalidate(corp_id)
+        await self.redis.delete(self.cache_key(corp_id))
+
+    async def _read_l2(self, corp_id: str, min_ttl: float = 0) -> Optional[str]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self.cache_key(corp_id))
+            pipe.pttl(self.cache_key(corp_id))
+            token, pttl = await pipe.execute()
+        if not token or pttl is None or pttl <= min_ttl * 1000:
+            return None
+        token = token.decode() if isinstance(token, bytes) else token
+        self._local[corp_id] = (token, time.time() + pttl / 1000)
+        return token
+
+    async def _load(self, corp_id: str, fetch: TokenFetcher, min_ttl: float = 0) -> str:
+        """读取 L2，未命中时抢占分布式锁刷新，抢不到则等待持锁者写入"""
+        while True:
+            token = await self._read_l2(corp_id, min_ttl)
+            if token:
+                return token
+            lock_value = secrets.token_hex(8)
+            acquired = await self.redis.set(
+                self.lock_key(corp_id), lock_value,
+                nx=True, px=int(self.lock_timeout * 1000)
+            )
+            if acquired:
+                try:
+                    return await self._refresh(corp_id, fetch)
+                finally:
+                    await self.redis.eval(
+                        _RELEASE_LOCK_SCRIPT, 1, self.lock_key(corp_id), lock_value
+                    )
+            await asyncio.sleep(self.poll_interval)
+
+    async def _refresh(self, corp_id: str, fetch: TokenFetcher) -> str:
+        token, expires_in = await fetch()
+        ttl = min(self.ttl, expires_in) if expires_in else self.ttl
+        await self.redis.setex(self.cache_key(corp_id), ttl, token)
+        self._local[corp_id] = (token, time.time() + ttl)
+        logger.info("Refreshed access token for corp %s (ttl=%ss)", corp_id, ttl)
+        return token
+
+    def _schedule_refresh(self, corp_id: str):
+        """即将过期时在后台续期，当前请求继续使用旧 token"""
+        task = self._refreshing.get(corp_id)
+        if task is None or task.done():
+            self._refreshing[corp_id] = asyncio.create_task(self.renew(corp_id))
+
+    async def renew(self, corp_id: str):
+        """提前续期：若其他 worker 已续期则直接采用其结果"""
+        fetch = self._fetchers.get(corp_id)
+        if fetch is None:
+            return
+        try:
+            async with self._locks.setdefault(corp_id, asyncio.Lock()):
+                await self._load(corp_id, fetch, min_ttl=self.refresh_margin)
+        except Exception:
+            logger.exception("Failed to renew access token for corp %s", corp_id)
+
+    async def _refresh_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            forgotten = self.forget_idle()
+            if forgotten:
+                logger.info("Stopped renewing access tokens for %d idle corps", forgotten)
+            now = time.time()
+            expiring = [
+                corp_id for corp_id in list(self._fetchers)
+                if self._local.get(corp_id, ("", 0))[1] - now < self.refresh_margin
+            ]
+            await asyncio.gather(*(self.renew(corp_id) for corp_id in expiring))
+
+    def start_refresher(self, interval: float = 60):
+        """启动后台续期任务（应用启动时调用）"""
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop(interval))
+
+    async def stop_refresher(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+
+def get_token_cache() -> AccessTokenCache:
+    """获取当前事件循环共享的 token 缓存"""
+    loop = asyncio.get_running_loop()
+    cache = _token_caches.get(loop)
+    if cache is None:
+        cache = AccessTokenCache(get_async_redis())
+        _token_caches[loop] = cache
+    return cache
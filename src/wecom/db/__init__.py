@@ -1,5 +1,18 @@
-from .database import Base, engine, SessionScoped, get_db, POOL_CONFIG, monitor_pool_status
-from .models import Enterprise
+from . import database
+from .database import (
+    Base, SessionScoped, AsyncSessionLocal, get_engine, get_async_engine,
+    get_db, get_sync_db, POOL_CONFIG, monitor_pool_status
+)
+from .models import ContactSyncCheckpoint, Enterprise, ExternalContact, Notification, Subscriber
 
-__all__ = ['Base', 'engine', 'SessionScoped', 'get_db', 'POOL_CONFIG', 'monitor_pool_status' \
-           'Enterprise']
\ No newline at end of file
+__all__ = ['Base', 'engine', 'async_engine', 'SessionScoped', 'AsyncSessionLocal',
+           'get_engine', 'get_async_engine', 'get_db', 'get_sync_db', 'POOL_CONFIG',
+           'monitor_pool_status', 'Enterprise', 'Subscriber', 'Notification',
+           'ExternalContact', 'ContactSyncCheckpoint']
+
+
+def __getattr__(name):
+    # engine / async_engine 在首次访问时创建
+    if name in ("engine", "async_engine"):
+        return getattr(database, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
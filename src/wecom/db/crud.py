@@ -1,12 +1,89 @@
-# from sqlalchemy.orm import Session
-# from . import models, schemas
-
-# def get_subscriber_by_email(db: Session, email: str):
-#     return db.query(models.Subscriber).filter(models.Subscriber.contact_email == email).first()
-
-# def create_subscriber(db: Session, subscriber: dict):
-#     db_subscriber = models.Subscriber(**subscriber)
-#     db.add(db_subscriber)
-#     db.commit()
-#     db.refresh(db_subscriber)
-#     return db_subscriber
\ No newline at end of file
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from ..core.subscriber_cache import invalidate_subscriber
+
+async def get_subscriber_by_email(db: AsyncSession, email: str):
+    result = await db.execute(
+        select(models.Subscriber).where(models.Subscriber.contact_email == email)
+    )
+    return result.scalars().first()
+
+async def create_subscriber(db: AsyncSession, subscriber: dict):
+    db_subscriber = models.Subscriber(**subscriber)
+    db.add(db_subscriber)
+    await db.commit()
+    await db.refresh(db_subscriber)
+    return db_subscriber
+
+async def update_subscriber_password(db: AsyncSession, subscriber: models.Subscriber, hashed_password: str):
+    subscriber.hashed_password = hashed_password
+    await db.commit()
+    invalidate_subscriber(subscriber.contact_email)
+    return subscriber
+
+async def update_subscriber(db: AsyncSession, subscriber: models.Subscriber, **fields):
+    invalidate_subscriber(subscriber.contact_email)  # 邮箱可能被修改
+    for key, value in fields.items():
+        setattr(subscriber, key, value)
+    await db.commit()
+    await db.refresh(subscriber)
+    invalidate_subscriber(subscriber.contact_email)
+    return subscriber
+
+async def get_active_enterprise_by_api_key(db: AsyncSession, api_key: str):
+    result = await db.execute(
+        select(models.Enterprise).where(
+            models.Enterprise.api_key == api_key,
+            models.Enterprise.is_active.is_(True)
+        )
+    )
+    return result.scalars().first()
+
+async def get_active_enterprise_by_corp_id(db: AsyncSession, corp_id: str):
+    result = await db.execute(
+        select(models.Enterprise).where(
+            models.Enterprise.wecom_corp_id == corp_id,
+            models.Enterprise.is_active.is_(True)
+        )
+    )
+    return result.scalars().first()
+
+async def get_subscriber_cluster(db: AsyncSession, subscriber_id: int) -> Optional[str]:
+    """
+    订阅者关联企业所在的 db_cluster（通知记录写在该库），未关联或未分库时返回 None
+    同一订阅者的企业必须在同一集群（由 services.check_subscriber_cluster 保证），否则抛出 MultipleResultsFound
+    """
+    result = await db.execute(
+        select(models.Enterprise.db_cluster)
+        .where(models.Enterprise.subscriber_id == subscriber_id)
+        .distinct()
+    )
+    return result.scalar_one_or_none()
+
+async def create_notifications(db: AsyncSession, rows: Iterable[dict]):
+    """批量写入通知记录（单条 INSERT 多组参数）"""
+    rows = list(rows)
+    if rows:
+        await db.execute(insert(models.Notification), rows)
+        await db.commit()
+    return len(rows)
+
+def notifications_query(subscriber_id: int, before: Optional[Tuple[datetime, int]] = None):
+    """按 (created_at, id) 倒序的键集分页查询，走 ix_notifications_subscriber_created_id 索引"""
+    Notification = models.Notification
+    stmt = select(Notification).where(Notification.subscriber_id == subscriber_id)
+    if before is not None:
+        stmt = stmt.where(tuple_(Notification.created_at, Notification.id) < tuple_(*before))
+    return stmt.order_by(Notification.created_at.desc(), Notification.id.desc())
+
+async def list_notifications(
+    db: AsyncSession,
+    subscriber_id: int,
+    limit: int,
+    before: Optional[Tuple[datetime, int]] = None
+):
+    result = await db.execute(notifications_query(subscriber_id, before).limit(limit))
+    return result.scalars().all()
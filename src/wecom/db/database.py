@@ -1,36 +1,74 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import QueuePool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy import event
 from sqlalchemy.engine import make_url
-from ..config import get_settings
+from ..config import get_settings, subscribe
+from ..core import metrics
+from .routing import ReplicaSet, RoutingSession
+import asyncio
 import logging
+import threading
 import time
 
 # 获取配置
 settings = get_settings()
 Base = declarative_base()
 
-# 连接池配置参数
-POOL_CONFIG = {
-    "pool_size": settings.POOL_SIZE,        # 常驻连接数
-    "max_overflow": settings.MAX_OVERFLOW,      # 最大溢出连接数
-    "pool_recycle": settings.POOL_RECYCLE,   # 连接回收时间（秒）
-    "pool_pre_ping": settings.POOL_PRE_PING,  # 执行前健康检查
-    "pool_timeout": settings.POOL_TIMEOUT,     # 获取连接超时时间
-    "echo_pool": settings.ECHO_POOL      # 调试时开启
-}
+def build_pool_config(settings) -> dict:
+    """连接池配置参数"""
+    return {
+        "pool_size": settings.POOL_SIZE,        # 常驻连接数
+        "max_overflow": settings.MAX_OVERFLOW,      # 最大溢出连接数
+        "pool_recycle": settings.POOL_RECYCLE,   # 连接回收时间（秒）
+        "pool_pre_ping": settings.POOL_PRE_PING,  # 执行前健康检查
+        "pool_timeout": settings.POOL_TIMEOUT,     # 获取连接超时时间
+        "echo_pool": settings.ECHO_POOL      # 调试时开启
+    }
+
+POOL_CONFIG = build_pool_config(settings)
+
+# 变更后需要重建引擎的配置项
+_ENGINE_SETTINGS = (
+    "POSTGRES_HOST", "POSTGRES_PORT", "POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD",
+    "POOL_SIZE", "MAX_OVERFLOW", "POOL_RECYCLE", "POOL_PRE_PING", "POOL_TIMEOUT", "ECHO_POOL",
+    "DB_REPLICA_URLS",
+)
+
+class InstrumentedQueuePool(metrics.CheckoutTimingMixin, QueuePool):
+    """记录取连接耗时的队列连接池"""
+
+class InstrumentedAsyncQueuePool(metrics.CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    """记录取连接耗时的异步连接池"""
+
+def instrument_pool(engine, name: str):
+    """连接取出/归还时更新连接池指标"""
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_conn, connection_record, connection_proxy):
+        """连接取出时记录"""
+        logging.debug("Connection checked out: %s", id(dbapi_conn))
+        metrics.update_pool_gauges(engine.pool, name)
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_conn, connection_record):
+        """连接归还时记录"""
+        logging.debug("Connection checked in: %s", id(dbapi_conn))
+        metrics.update_pool_gauges(engine.pool, name)
 
 def setup_connection_pool():
     """创建带连接池的引擎"""
     # 构建连接字符串
-    conn_str = make_url(str(settings.SQLALCHEMY_DATABASE_URL))
+    conn_str = make_url(str(settings.SQLALCHEMY_DATABASE_URL)).set(
+        drivername="postgresql+psycopg2"  # 与依赖中的 psycopg2-binary 保持一致
+    )
     
     # 创建带连接池的引擎
     engine = create_engine(
         conn_str,
-        poolclass=QueuePool,  # 使用队列连接池
+        poolclass=InstrumentedQueuePool,  # 使用队列连接池
+        pool_logging_name="sync",  # 同时作为指标中的 pool 标签
         **POOL_CONFIG,
         connect_args={
             "connect_timeout": 10,      # 连接超时设置
@@ -38,36 +76,111 @@ def setup_connection_pool():
             "options": "-c statement_timeout=5000"  # 查询超时5秒
         }
     )
-    
+
     # 添加连接池事件监听
-    @event.listens_for(engine, "checkout")
-    def on_checkout(dbapi_conn, connection_record, connection_proxy):
-        """连接取出时记录"""
-        logging.debug("Connection checked out: %s", id(dbapi_conn))
-        
-    @event.listens_for(engine, "checkin")
-    def on_checkin(dbapi_conn, connection_record):
-        """连接归还时记录"""
-        logging.debug("Connection checked in: %s", id(dbapi_conn))
-    
+    instrument_pool(engine, "sync")
     return engine
 
-# 初始化引擎
-engine = setup_connection_pool()
+def setup_async_connection_pool():
+    """创建基于 asyncpg 的异步引擎（与同步引擎各自使用独立的连接池）"""
+    conn_str = make_url(str(settings.SQLALCHEMY_DATABASE_URL)).set(
+        drivername="postgresql+asyncpg"
+    )
+    async_engine = create_async_engine(
+        conn_str,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_logging_name="async",
+        **POOL_CONFIG,
+        connect_args={
+            "timeout": 10,              # 连接超时设置
+            "command_timeout": 5,       # 单条语句超时5秒
+            "server_settings": {"statement_timeout": "5000"}
+        }
+    )
+    instrument_pool(async_engine.sync_engine, "async")
+    return async_engine
+
+def setup_replicas():
+    """创建只读副本引擎，未配置时返回 None"""
+    if not settings.DB_REPLICA_URLS:
+        return None
+    return ReplicaSet(settings.DB_REPLICA_URLS, POOL_CONFIG)
+
+# 引擎在首次使用时创建（应用启动时由 lifespan 创建），导入本模块不会加载数据库驱动
+_engine = None
+_async_engine = None
+_replicas = None
+_engine_lock = threading.Lock()
+
+# 异步会话工厂：提交后不过期对象，避免在响应序列化时触发隐式 IO
+# 配置了只读副本时，只读查询由 RoutingSession 分发到副本
+# 引擎创建后绑定；RoutingSession 在未绑定时也会按需创建引擎
+AsyncSessionLocal = async_sessionmaker(
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 # 创建线程安全的会话工厂
-SessionFactory = sessionmaker(bind=engine, autoflush=False)
+SessionFactory = sessionmaker(autoflush=False)
 
 # 使用scoped_session管理线程局部会话
 SessionScoped = scoped_session(SessionFactory)
 
-def get_db():
+def get_engine():
+    """同步引擎（供脚本和 Celery 任务使用）"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = setup_connection_pool()
+                SessionFactory.configure(bind=_engine)
+    return _engine
+
+def get_async_engine():
+    """异步引擎（供请求处理使用），同时创建只读副本"""
+    global _async_engine, _replicas
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _replicas = setup_replicas()
+                _async_engine = setup_async_connection_pool()
+                AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+def get_replicas():
+    get_async_engine()
+    return _replicas
+
+def __getattr__(name):
+    # 兼容 database.engine / database.async_engine 等写法，访问时才创建引擎
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    if name == "replicas":
+        return get_replicas()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def get_db():
     """
-    获取数据库会话（微服务安全版）
+    获取请求级别的异步数据库会话（FastAPI 依赖）
     使用示例：
-    with get_db() as db:
-        db.query(...)
+    async def handler(db: AsyncSession = Depends(get_db)):
+        await db.execute(select(...))
     """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logging.error("Database error: %s", str(e))
+            await db.rollback()
+            raise
+
+def get_sync_db():
+    """获取同步数据库会话（供脚本和 Celery 任务使用）"""
+    get_engine()
     db = SessionScoped()
     try:
         yield db
@@ -79,9 +192,45 @@ def get_db():
         # 关闭会话时自动归还连接到池
         SessionScoped.remove()
 
+@subscribe
+def rebuild_engines(old_settings, new_settings):
+    """配置热加载后，数据库或连接池参数有变化时重建引擎"""
+    global settings, _engine, _async_engine, _replicas
+    settings = new_settings
+    if all(getattr(old_settings, k) == getattr(new_settings, k) for k in _ENGINE_SETTINGS):
+        return
+    POOL_CONFIG.clear()
+    POOL_CONFIG.update(build_pool_config(new_settings))
+    with _engine_lock:
+        old_engine, old_async_engine, old_replicas = _engine, _async_engine, _replicas
+        # 尚未创建的引擎保持懒加载，下次使用时按新配置创建
+        if old_engine is not None:
+            _engine = setup_connection_pool()
+            SessionFactory.configure(bind=_engine)
+        if old_async_engine is not None:
+            _replicas = setup_replicas()
+            _async_engine = setup_async_connection_pool()
+            AsyncSessionLocal.configure(bind=_async_engine)
+    # 关闭旧池中的空闲连接，使用中的连接归还后随旧池释放
+    if old_engine is not None:
+        old_engine.dispose()
+    try:
+        loop = asyncio.get_running_loop()
+        if old_async_engine is not None:
+            loop.create_task(old_async_engine.dispose())
+        if old_replicas:
+            loop.create_task(old_replicas.dispose())
+        if _replicas:
+            _replicas.start_checker(new_settings.DB_REPLICA_CHECK_INTERVAL)
+    except RuntimeError:
+        pass
+    logging.info("Database engines rebuilt with %s", POOL_CONFIG)
+
 # 监控连接池状态
 def monitor_pool_status():
-    """打印连接池状态（可用于定时任务）"""
+    """打印连接池状态（可用于定时任务），同时刷新连接池指标"""
+    engine = get_engine()
+    metrics.update_pool_gauges(engine.pool, "sync")
     print(f"[Pool Status] {time.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Current checked out connections: {engine.pool.checkedout()}")
     print(f"Current idle connections: {engine.pool.checkedin()}")
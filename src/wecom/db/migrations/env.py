@@ -0,0 +1,58 @@
+# alembic 迁移环境：表结构以 wecom.db.models 为准
+
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool, text
+from sqlalchemy.engine import make_url
+
+from wecom.config import get_settings
+from wecom.db import Base
+from wecom.db import models  # noqa: F401 注册所有模型
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# 多个实例同时执行迁移时，只有一个能持有该锁
+MIGRATION_LOCK_ID = 0x7765636F6D  # "wecom"
+
+
+def get_url():
+    url = config.get_main_option("sqlalchemy.url")
+    if url:
+        return make_url(url)
+    return make_url(str(get_settings().SQLALCHEMY_DATABASE_URL)).set(
+        drivername="postgresql+psycopg2"
+    )
+
+
+def run_migrations_offline():
+    """生成 SQL 脚本而不连接数据库：alembic upgrade head --sql"""
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = create_engine(get_url(), poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            if connection.dialect.name == "postgresql":
+                connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            context.run_migrations()
+    connectable.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,70 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+已用 create_all 建表的数据库执行 alembic stamp 0001 即可纳入迁移管理
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "enterprises",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(255), nullable=False, unique=True),
+        sa.Column("is_active", sa.Boolean(), server_default="TRUE", nullable=False),
+        sa.Column("api_key", sa.String(64), nullable=False, unique=True),
+        sa.Column("encrypted_secret", sa.LargeBinary(), nullable=False),
+        sa.Column("wecom_corp_id", sa.String(64), nullable=False, unique=True),
+        sa.Column("wecom_secret", sa.String(64), nullable=False, unique=True),
+        sa.Column("db_cluster", sa.String(100)),
+        sa.Column("callback_token", sa.String(64)),
+        sa.Column("encoding_aes_key", sa.String(43)),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "subscribers",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("company_name", sa.String(255), nullable=False),
+        sa.Column("contact_email", sa.String(255), nullable=False, unique=True),
+        sa.Column("wecom_corp_id", sa.String(64), nullable=False),
+        sa.Column("is_active", sa.Boolean(), server_default="TRUE", nullable=False),
+        sa.Column("subscription_tier", sa.String(32), server_default="basic", nullable=False),
+        sa.Column("hashed_password", sa.String(255), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_table(
+        "notifications",
+        sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+                  primary_key=True, autoincrement=True),
+        sa.Column("subscriber_id", sa.Integer(),
+                  sa.ForeignKey("subscribers.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("enterprise_id", sa.Integer(),
+                  sa.ForeignKey("enterprises.id", ondelete="SET NULL")),
+        sa.Column("recipient", sa.String(64), nullable=False),
+        sa.Column("msgtype", sa.String(32), server_default="text", nullable=False),
+        sa.Column("content", sa.Text()),
+        sa.Column("status", sa.String(16), nullable=False),
+        sa.Column("errcode", sa.Integer()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index(
+        "ix_notifications_subscriber_created_id",
+        "notifications", ["subscriber_id", "created_at", "id"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_notifications_subscriber_created_id", table_name="notifications")
+    op.drop_table("notifications")
+    op.drop_table("subscribers")
+    op.drop_table("enterprises")
@@ -0,0 +1,52 @@
+"""external contacts and sync checkpoints
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "external_contacts",
+        sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+                  primary_key=True, autoincrement=True),
+        sa.Column("corp_id", sa.String(64), nullable=False),
+        sa.Column("external_userid", sa.String(64), nullable=False),
+        sa.Column("follow_userid", sa.String(64), nullable=False),
+        sa.Column("name", sa.String(255)),
+        sa.Column("type", sa.Integer()),
+        sa.Column("corp_name", sa.String(255)),
+        sa.Column("unionid", sa.String(64)),
+        sa.Column("remark", sa.String(255)),
+        sa.Column("tag_ids", sa.JSON()),
+        sa.Column("add_time", sa.Integer()),
+        sa.Column("synced_at", sa.DateTime(timezone=True), nullable=False),
+        sa.UniqueConstraint("corp_id", "external_userid", "follow_userid",
+                            name="uq_external_contacts_corp_contact_follow"),
+    )
+    op.create_index(
+        "ix_external_contacts_corp_follow_synced",
+        "external_contacts", ["corp_id", "follow_userid", "synced_at"]
+    )
+    op.create_table(
+        "contact_sync_checkpoints",
+        sa.Column("corp_id", sa.String(64), primary_key=True),
+        sa.Column("follow_userid", sa.String(64), primary_key=True),
+        sa.Column("cursor", sa.String(255)),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("completed_at", sa.DateTime(timezone=True)),
+    )
+
+
+def downgrade():
+    op.drop_table("contact_sync_checkpoints")
+    op.drop_index("ix_external_contacts_corp_follow_synced", table_name="external_contacts")
+    op.drop_table("external_contacts")
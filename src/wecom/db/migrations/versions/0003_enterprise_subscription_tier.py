@@ -0,0 +1,25 @@
+"""subscription tier on enterprises
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 不从 subscribers 回填：订阅者的等级与 corp_id 均为注册时自行填写，不可信，现有企业统一从 basic 开始
+    op.add_column(
+        "enterprises",
+        sa.Column("subscription_tier", sa.String(32), server_default="basic", nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_column("enterprises", "subscription_tier")
@@ -0,0 +1,29 @@
+"""link enterprises to the subscriber that owns their notifications
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 不按 corp_id 回填：订阅者的 corp_id 为注册时自行填写，需由管理员核实后关联
+    with op.batch_alter_table("enterprises") as batch:
+        batch.add_column(sa.Column("subscriber_id", sa.Integer()))
+        batch.create_foreign_key(
+            "fk_enterprises_subscriber_id", "subscribers", ["subscriber_id"], ["id"],
+            ondelete="SET NULL",
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("enterprises") as batch:
+        batch.drop_constraint("fk_enterprises_subscriber_id", type_="foreignkey")
+        batch.drop_column("subscriber_id")
@@ -0,0 +1,34 @@
+"""drop cross-database foreign keys from notifications
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# 0001 中的外键未命名，使用 PostgreSQL 的默认命名；SQLite 批量模式按同样的规则为反射出的外键命名
+NAMING_CONVENTION = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+
+def upgrade():
+    # 通知记录按企业的 db_cluster 分库写入，而订阅者和企业只在默认库中，外键在分库上无法满足
+    with op.batch_alter_table("notifications", naming_convention=NAMING_CONVENTION) as batch:
+        batch.drop_constraint("notifications_subscriber_id_fkey", type_="foreignkey")
+        batch.drop_constraint("notifications_enterprise_id_fkey", type_="foreignkey")
+
+
+def downgrade():
+    with op.batch_alter_table("notifications", naming_convention=NAMING_CONVENTION) as batch:
+        batch.create_foreign_key(
+            "notifications_subscriber_id_fkey", "subscribers", ["subscriber_id"], ["id"],
+            ondelete="CASCADE",
+        )
+        batch.create_foreign_key(
+            "notifications_enterprise_id_fkey", "enterprises", ["enterprise_id"], ["id"],
+            ondelete="SET NULL",
+        )
@@ -1,4 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, LargeBinary
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Boolean, DateTime, LargeBinary, Text, ForeignKey, Index,
+    JSON, UniqueConstraint
+)
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -14,4 +17,80 @@ class Enterprise(Base):
     wecom_corp_id = Column(String(64), unique=True, nullable=False)  # 唯一+非空
     wecom_secret = Column(String(64), unique=True, nullable=False)  # 唯一+非空
     db_cluster = Column(String(100))  # 允许为空
-    created_at = Column(DateTime(timezone=True), server_default=func.now())  # 自动生成时间戳
\ No newline at end of file
+    callback_token = Column(String(64))  # 回调配置中的 Token
+    encoding_aes_key = Column(String(43))  # 回调配置中的 EncodingAESKey
+    subscription_tier = Column(String(32), server_default='basic', nullable=False)  # 入站配额等级，由管理员设置
+    # 投递记录归属的订阅者，由管理员核实后关联（订阅者注册时填写的 corp_id 不可信）
+    subscriber_id = Column(
+        Integer, ForeignKey("subscribers.id", ondelete="SET NULL", name="fk_enterprises_subscriber_id")
+    )
+    created_at = Column(DateTime(timezone=True), server_default=func.now())  # 自动生成时间戳
+
+# 订阅者模型
+class Subscriber(Base):
+    __tablename__ = "subscribers"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    company_name = Column(String(255), nullable=False)
+    contact_email = Column(String(255), unique=True, nullable=False)  # 登录账号
+    wecom_corp_id = Column(String(64), nullable=False)
+    is_active = Column(Boolean, server_default='TRUE', nullable=False)
+    subscription_tier = Column(String(32), server_default='basic', nullable=False)
+    hashed_password = Column(String(255), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+# 通知（消息投递）记录
+class Notification(Base):
+    __tablename__ = "notifications"
+    __table_args__ = (
+        # 按订阅者分页：WHERE subscriber_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC
+        Index("ix_notifications_subscriber_created_id", "subscriber_id", "created_at", "id"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    # 记录写在企业所在的 db_cluster，订阅者和企业只在默认库中，因此不设外键
+    subscriber_id = Column(Integer, nullable=False)
+    enterprise_id = Column(Integer)
+    recipient = Column(String(64), nullable=False)  # 接收成员 userid
+    msgtype = Column(String(32), server_default='text', nullable=False)
+    content = Column(Text)
+    status = Column(String(16), nullable=False)  # sent / invalid / unlicensed / failed
+    errcode = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# 企业客户（外部联系人）与跟进成员的关系，每个 (客户, 跟进成员) 一行
+class ExternalContact(Base):
+    __tablename__ = "external_contacts"
+    __table_args__ = (
+        UniqueConstraint("corp_id", "external_userid", "follow_userid",
+                         name="uq_external_contacts_corp_contact_follow"),
+        # 全量同步结束后按跟进成员清理未再出现的客户
+        Index("ix_external_contacts_corp_follow_synced", "corp_id", "follow_userid", "synced_at"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    corp_id = Column(String(64), nullable=False)
+    external_userid = Column(String(64), nullable=False)
+    follow_userid = Column(String(64), nullable=False)  # 添加了该客户的企业成员
+    name = Column(String(255))
+    type = Column(Integer)  # 1 微信用户，2 企业微信用户
+    corp_name = Column(String(255))
+    unionid = Column(String(64))
+    remark = Column(String(255))
+    tag_ids = Column(JSON)
+    add_time = Column(Integer)  # 添加时间（企业微信返回的时间戳）
+    synced_at = Column(DateTime(timezone=True), nullable=False)
+
+
+# 客户同步进度：每个跟进成员一行，cursor 为空且 completed_at 非空表示已完成
+class ContactSyncCheckpoint(Base):
+    __tablename__ = "contact_sync_checkpoints"
+
+    corp_id = Column(String(64), primary_key=True)
+    follow_userid = Column(String(64), primary_key=True)
+    cursor = Column(String(255))
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    completed_at = Column(DateTime(timezone=True))
@@ -0,0 +1,185 @@
+# 分库引擎注册表：按 Enterprise.db_cluster 懒加载并缓存异步引擎
+# - 每个集群一个连接池，首次使用时创建
+# - 所有集群连接池的容量（pool_size + max_overflow）之和不超过 DB_CLUSTER_MAX_CONNECTIONS，
+#   超出时按 LRU 释放没有连接在用的引擎
+# - 空闲超过 DB_CLUSTER_IDLE_TIMEOUT 的引擎由后台任务释放
+# 未配置 db_cluster 或集群未在 DB_CLUSTERS 中列出的企业使用默认库
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from ..config import get_settings, subscribe
+from . import database
+
+logger = logging.getLogger(__name__)
+
+
+class ClusterCapacityError(RuntimeError):
+    """连接总数已达上限，且没有可以释放的空闲引擎"""
+
+
+class EngineRegistry:
+
+    def __init__(
+        self,
+        clusters: Optional[Dict[str, str]] = None,
+        pool_size: Optional[int] = None,
+        max_overflow: Optional[int] = None,
+        max_connections: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+    ):
+        settings = get_settings()
+        self.clusters = dict(settings.DB_CLUSTERS if clusters is None else clusters)
+        self.pool_size = pool_size or settings.DB_CLUSTER_POOL_SIZE
+        self.max_overflow = settings.DB_CLUSTER_MAX_OVERFLOW if max_overflow is None else max_overflow
+        self.max_connections = max_connections or settings.DB_CLUSTER_MAX_CONNECTIONS
+        self.idle_timeout = idle_timeout or settings.DB_CLUSTER_IDLE_TIMEOUT
+        # 按最近使用排序，最久未用的在前
+        self._engines: "OrderedDict[str, AsyncEngine]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+        self._reaper: Optional[asyncio.Task] = None
+
+    @property
+    def engine_capacity(self) -> int:
+        """单个集群连接池最多持有的连接数"""
+        return self.pool_size + self.max_overflow
+
+    @property
+    def total_capacity(self) -> int:
+        return len(self._engines) * self.engine_capacity
+
+    def __contains__(self, cluster: str) -> bool:
+        return cluster in self._engines
+
+    async def get_engine(self, cluster: Optional[str]) -> AsyncEngine:
+        if not cluster or cluster not in self.clusters:
+            if cluster:
+                logger.debug("Unknown db_cluster %s, using default database", cluster)
+            return database.get_async_engine()
+
+        engine = self._engines.get(cluster)
+        if engine is None:
+            async with self._lock:
+                engine = self._engines.get(cluster)
+                if engine is None:
+                    await self._make_room()
+                    engine = self._create_engine(cluster)
+                    self._engines[cluster] = engine
+        self._engines.move_to_end(cluster)
+        self._last_used[cluster] = time.monotonic()
+        return engine
+
+    def session(self, engine: AsyncEngine) -> AsyncSession:
+        """创建绑定到指定引擎的会话（沿用默认会话工厂的配置）"""
+        return database.AsyncSessionLocal(bind=engine)
+
+    def _create_engine(self, cluster: str) -> AsyncEngine:
+        url = make_url(self.clusters[cluster])
+        connect_args = {}
+        if url.get_backend_name() == "postgresql":
+            url = url.set(drivername="postgresql+asyncpg")
+            connect_args = {
+                "timeout": 10,
+                "command_timeout": 5,
+                "server_settings": {"statement_timeout": "5000"}
+            }
+        name = f"async:{cluster}"
+        engine = create_async_engine(
+            url,
+            poolclass=database.InstrumentedAsyncQueuePool,
+            pool_logging_name=name,
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_recycle=database.POOL_CONFIG["pool_recycle"],
+            pool_pre_ping=database.POOL_CONFIG["pool_pre_ping"],
+            pool_timeout=database.POOL_CONFIG["pool_timeout"],
+            connect_args=connect_args,
+        )
+        database.instrument_pool(engine.sync_engine, name)
+        logger.info("Created engine for db cluster %s", cluster)
+        return engine
+
+    async def _make_room(self):
+        """为新引擎腾出连接配额，按 LRU 释放没有连接在用的引擎"""
+        if self.engine_capacity > self.max_connections:
+            raise ClusterCapacityError("Cluster pool size exceeds DB_CLUSTER_MAX_CONNECTIONS")
+        while self.total_capacity + self.engine_capacity > self.max_connections:
+            victim = next(
+                (name for name, engine in self._engines.items() if engine.pool.checkedout() == 0),
+                None
+            )
+            if victim is None:
+                raise ClusterCapacityError("All cluster connection pools are in use")
+            logger.info("Disposing least recently used engine for db cluster %s", victim)
+            await self._dispose(victim)
+
+    async def _dispose(self, cluster: str):
+        engine = self._engines.pop(cluster)
+        self._last_used.pop(cluster, None)
+        await engine.dispose()
+
+    async def dispose_idle(self) -> int:
+        """释放空闲超时的引擎，返回释放数量"""
+        now = time.monotonic()
+        disposed = 0
+        async with self._lock:
+            for cluster in list(self._engines):
+                idle = now - self._last_used.get(cluster, now)
+                if idle >= self.idle_timeout and self._engines[cluster].pool.checkedout() == 0:
+                    await self._dispose(cluster)
+                    disposed += 1
+        return disposed
+
+    async def dispose_all(self):
+        async with self._lock:
+            for cluster in list(self._engines):
+                await self._dispose(cluster)
+
+    async def _reap_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.dispose_idle()
+            except Exception:
+                logger.exception("Failed to dispose idle cluster engines")
+
+    def start_reaper(self, interval: float = 60):
+        """启动后台释放空闲引擎的任务（应用启动时调用）"""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop(interval))
+
+    async def stop_reaper(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+
+
+engine_registry = EngineRegistry()
+
+
+@subscribe
+def reload_clusters(old_settings, new_settings):
+    """配置热加载后更新集群列表，已移除或连接串变化的集群在下次使用时重建"""
+    changed = [
+        name for name in list(engine_registry._engines)
+        if old_settings.DB_CLUSTERS.get(name) != new_settings.DB_CLUSTERS.get(name)
+    ]
+    engine_registry.clusters = dict(new_settings.DB_CLUSTERS)
+    for name in changed:
+        engine = engine_registry._engines.pop(name)
+        engine_registry._last_used.pop(name, None)
+        try:
+            asyncio.get_running_loop().create_task(engine.dispose())
+        except RuntimeError:
+            pass
@@ -0,0 +1,169 @@
+# 读写分离：只读查询发往只读副本，写操作及其后的查询使用主库
+# - 每个会话首次读取时按轮询选定一个副本，之后的读取都使用它，避免同一会话内读到不同进度的数据；
+#   跳过健康检查失败或连接断开的副本，选定的副本失效时才改选；没有可用副本时回退到主库
+# - 会话内发生过写入（flush/commit）后，后续查询都走主库，保证读到自己的写入
+# - 需要强一致读时调用 use_primary(session)
+
+import asyncio
+import itertools
+import logging
+from typing import List, Optional, Sequence
+
+from sqlalchemy import event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+logger = logging.getLogger(__name__)
+
+# 标记会话后续查询使用主库
+USE_PRIMARY = "use_primary"
+# 会话选定的副本
+REPLICA = "replica"
+
+
+class ReplicaSet:
+    """一组只读副本及其健康状态"""
+
+    def __init__(self, urls: Sequence[str], pool_config: dict, check_timeout: float = 2.0):
+        self.engines: List[AsyncEngine] = [
+            self._create_engine(url, i, pool_config) for i, url in enumerate(urls)
+        ]
+        self.check_timeout = check_timeout
+        self._healthy = {id(engine): True for engine in self.engines}
+        self._counter = itertools.count()
+        self._checker: Optional[asyncio.Task] = None
+
+    def _create_engine(self, url: str, index: int, pool_config: dict) -> AsyncEngine:
+        from .database import InstrumentedAsyncQueuePool, instrument_pool
+
+        url = make_url(url)
+        connect_args = {}
+        if url.get_backend_name() == "postgresql":
+            url = url.set(drivername="postgresql+asyncpg")
+            connect_args = {
+                "timeout": 10,
+                "command_timeout": 5,
+                "server_settings": {"statement_timeout": "5000"}
+            }
+        name = f"replica{index}"
+        engine = create_async_engine(
+            url,
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_logging_name=name,
+            **pool_config,
+            connect_args=connect_args,
+        )
+        instrument_pool(engine.sync_engine, name)
+
+        @event.listens_for(engine.sync_engine, "handle_error")
+        def on_error(context):
+            # 连接断开时立即摘除，由健康检查恢复
+            if context.is_disconnect:
+                self.mark_down(engine)
+
+        return engine
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def is_healthy(self, engine: AsyncEngine) -> bool:
+        return self._healthy.get(id(engine), False)
+
+    def mark_down(self, engine: AsyncEngine):
+        if self._healthy.get(id(engine)):
+            logger.warning("Replica %s marked unhealthy", engine.url.render_as_string())
+        self._healthy[id(engine)] = False
+
+    def choose(self) -> Optional[AsyncEngine]:
+        """轮询选择一个健康的副本，全部不可用时返回 None"""
+        count = len(self.engines)
+        start = next(self._counter)
+        for offset in range(count):
+            engine = self.engines[(start + offset) % count]
+            if self._healthy[id(engine)]:
+                return engine
+        return None
+
+    async def check(self):
+        """对每个副本执行 SELECT 1，更新健康状态"""
+        async def probe(engine):
+            try:
+                async with engine.connect() as conn:
+                    await asyncio.wait_for(conn.execute(select(1)), self.check_timeout)
+                healthy = True
+            except Exception:
+                healthy = False
+            if healthy != self._healthy[id(engine)]:
+                logger.info("Replica %s is %s", engine.url.render_as_string(),
+                            "healthy" if healthy else "unhealthy")
+            self._healthy[id(engine)] = healthy
+        await asyncio.gather(*(probe(engine) for engine in self.engines))
+
+    async def _check_loop(self, interval: float):
+        while True:
+            await self.check()
+            await asyncio.sleep(interval)
+
+    def start_checker(self, interval: float = 5):
+        """启动后台健康检查（应用启动时调用）"""
+        if self.engines and (self._checker is None or self._checker.done()):
+            self._checker = asyncio.create_task(self._check_loop(interval))
+
+    async def stop_checker(self):
+        if self._checker is not None:
+            self._checker.cancel()
+            try:
+                await self._checker
+            except asyncio.CancelledError:
+                pass
+            self._checker = None
+
+    async def dispose(self):
+        await self.stop_checker()
+        for engine in self.engines:
+            await engine.dispose()
+
+
+class RoutingSession(Session):
+    """按语句类型选择主库或副本的会话（作为 AsyncSession 的 sync_session_class）"""
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        from . import database
+
+        primary = database.get_async_engine().sync_engine
+        if self.bind is None:
+            # 会话工厂在引擎创建前生成的会话
+            self.bind = primary
+        bind = super().get_bind(mapper, clause=clause, **kw)
+        replicas = database.get_replicas()
+        # 只对默认主库做读写分离，分库集群的会话保持原样
+        if not replicas or bind is not primary:
+            return bind
+        if self._flushing or not _is_read_only(clause):
+            self.info[USE_PRIMARY] = True
+            return bind
+        if self.info.get(USE_PRIMARY):
+            return bind
+        replica = self.info.get(REPLICA)
+        if replica is None or not replicas.is_healthy(replica):
+            replica = self.info[REPLICA] = replicas.choose()
+        return replica.sync_engine if replica is not None else bind
+
+
+def _is_read_only(clause) -> bool:
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _stick_to_primary(session):
+    # 提交后副本可能尚未同步，本会话后续查询改用主库
+    session.info[USE_PRIMARY] = True
+
+
+def use_primary(session):
+    """后续查询强制使用主库（AsyncSession 或 Session 均可）"""
+    if isinstance(session, AsyncSession):
+        session = session.sync_session
+    session.info[USE_PRIMARY] = True
@@ -0,0 +1,190 @@
+# 写后批量落库：缓冲投递记录，按条数或时间间隔批量写入
+# PostgreSQL(psycopg2) 使用 COPY，其他方言退化为多行 INSERT
+# 记录可指定企业的 db_cluster，分库的记录通过 engine_registry 写入对应集群
+
+import asyncio
+import io
+import logging
+from collections import defaultdict
+from typing import Iterable, List, Optional
+
+from sqlalchemy import Table, insert
+
+from ..config import get_settings
+from . import database
+from .models import Notification
+from .registry import engine_registry
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()  # 停止标记，之前入队的记录都会被写入
+
+
+def _csv_field(value) -> str:
+    """
+    COPY csv 格式的字段：None 输出为未加引号的空值（即 NULL），其余值一律加引号，
+    空字符串因此是 "" 而不是 NULL
+    """
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_rows(engine, table: Table, rows: List[dict]):
+    """通过 COPY FROM STDIN 写入一批记录"""
+    # 列名取自表定义（按表中顺序，只包含记录中出现过的列），不直接拼接记录的键
+    columns = [c.name for c in table.columns if any(c.name in row for row in rows)]
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(",".join(_csv_field(row.get(c)) for c in columns))
+        buf.write("\n")
+    buf.seek(0)
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                buf
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def write_rows(engine, table: Table, rows: List[dict]):
+    """同步批量写入（可直接在 Celery 任务中调用）"""
+    if not rows:
+        return
+    if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+        try:
+            return _copy_rows(engine, table, rows)
+        except Exception:
+            logger.exception("COPY into %s failed, falling back to INSERT", table.name)
+    with engine.begin() as conn:
+        conn.execute(insert(table), rows)
+
+
+class BatchWriter:
+    """
+    进程内写缓冲
+    - 达到 batch_size 条或距首条入队超过 flush_interval 时落库
+    - 缓冲上限 max_buffer，写满后 put 会等待（背压传递给调用方）
+    - stop() 时写入剩余全部记录
+    - 同一批中的记录按 cluster 分组写入各自的库
+    默认库的落库在单独线程中执行，不阻塞事件循环
+    """
+
+    def __init__(
+        self,
+        table: Table,
+        engine=None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_buffer: Optional[int] = None,
+        max_attempts: int = 3,
+    ):
+        settings = get_settings()
+        self.table = table
+        self._engine = engine
+        self.batch_size = batch_size or settings.WRITER_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.WRITER_FLUSH_INTERVAL_MS / 1000
+        self.max_buffer = max_buffer or settings.WRITER_MAX_BUFFER
+        self.max_attempts = max_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def engine(self):
+        # 默认跟随 wecom.db.database 当前的引擎（配置热加载后会被替换）
+        return self._engine or database.get_engine()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._queue = asyncio.Queue(maxsize=self.max_buffer)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务，写入停止前入队的全部记录"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def put(self, row: dict, cluster: Optional[str] = None):
+        if not self.running:
+            # 未启动（如脚本中调用）时直接写入
+            return await self._flush([row], cluster)
+        await self._queue.put((cluster, row))
+
+    async def put_many(self, rows: Iterable[dict], cluster: Optional[str] = None):
+        if not self.running:
+            return await self._flush(list(rows), cluster)
+        for row in rows:
+            await self._queue.put((cluster, row))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            groups = defaultdict(list)
+            for cluster, row in batch:
+                groups[cluster].append(row)
+            for cluster, rows in groups.items():
+                await self._flush(rows, cluster)
+
+    async def _write(self, batch: List[dict], cluster: Optional[str]):
+        if cluster in engine_registry.clusters:
+            engine = await engine_registry.get_engine(cluster)
+            async with engine.begin() as conn:
+                await conn.execute(insert(self.table), batch)
+        else:
+            await asyncio.to_thread(write_rows, self.engine, self.table, batch)
+
+    async def _flush(self, batch: List[dict], cluster: Optional[str] = None):
+        if not batch:
+            return
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self._write(batch, cluster)
+                self.written += len(batch)
+                return
+            except Exception:
+                logger.exception("Failed to write %d rows into %s (attempt %d)",
+                                 len(batch), self.table.name, attempt)
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(0.5 * attempt)
+        self.dropped += len(batch)
+
+
+notification_writer = BatchWriter(Notification.__table__)
@@ -1,38 +1,204 @@
-from fastapi import Depends, HTTPException, status
+import logging
+import math
+from typing import Any, Awaitable, Callable, Type, TypeVar
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # 注意这里的相对路径引用
 from .config import get_settings  
 from .db import crud, database
+from .db.registry import ClusterCapacityError, engine_registry
+from .core.auth import EnterpriseAuthenticator
+from .core import subscriber_cache
+from .core.ratelimit import LimitResult, get_rate_limiter, quota_windows
+from .core.idempotency import (
+    IdempotencyConflict, IdempotencyKeyReused, fingerprint, get_idempotency_store
+)
+
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 async def get_current_subscriber(
     token: str = Depends(oauth2_scheme),
-    db: database.SessionLocal = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无法验证凭据",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        settings = get_settings()
-        payload = jwt.decode(
-            token, 
-            settings.secret_key, 
-            algorithms=[settings.algorithm]
-        )
-        email: str = payload.get("sub")
-        if email is None:
+    payload = subscriber_cache.get_claims(token)
+    if payload is None:
+        # 延迟导入 jose（会加载 cryptography），加快进程启动
+        from jose import JWTError, jwt
+        try:
+            settings = get_settings()
+            payload = jwt.decode(
+                token,
+                settings.SECRET_KEY,
+                algorithms=[settings.ALGORITHM]
+            )
+        except (JWTError, ValidationError) as e:
             raise credentials_exception
-    except (JWTError, ValidationError) as e:
+        subscriber_cache.cache_claims(token, payload)
+    email: str = payload.get("sub")
+    if email is None:
         raise credentials_exception
-    
+
+    subscriber = subscriber_cache.get_subscriber(email)
+    if subscriber is not None:
+        return subscriber
+
     # 通过数据库获取订阅者
-    subscriber = crud.get_subscriber_by_email(db, email=email)
+    subscriber = await crud.get_subscriber_by_email(db, email=email)
     if subscriber is None:
         raise credentials_exception
-    return subscriber
\ No newline at end of file
+    return subscriber_cache.cache_subscriber(subscriber)
+
+async def get_current_enterprise(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(database.get_db)
+) -> dict:
+    """通过 HMAC 签名认证调用方企业，并按订阅等级限制请求数"""
+    enterprise = await EnterpriseAuthenticator(db).authenticate_request(request)
+    await enforce_quota(response, enterprise, "requests")
+    return enterprise
+
+def _rate_limit_headers(result: LimitResult) -> dict:
+    return {
+        "RateLimit-Limit": str(result.limit),
+        "RateLimit-Remaining": str(result.remaining),
+        "RateLimit-Reset": str(math.ceil(result.reset)),
+    }
+
+async def enforce_quota(response: Response, enterprise: dict, kind: str, cost: int = 1):
+    """
+    检查企业配额（requests：请求数；sends：发送人次），写入 RateLimit-* 响应头
+    超限返回 429 和 Retry-After；cost 超过某个窗口的上限时返回 413
+    签名验证通过后才计数，避免他人用泄露的 api_key 耗尽该企业的配额
+    """
+    windows = quota_windows(
+        enterprise["wecom_config"]["api_key"], enterprise.get("subscription_tier"), kind
+    )
+    if not windows:
+        return
+    # 单次请求的用量超过窗口上限时永远无法通过，不返回 Retry-After，避免客户端无限重试
+    too_large = [w for w in windows if cost > w.limit]
+    if too_large:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"{kind.capitalize()} cost {cost} exceeds quota limit {min(w.limit for w in too_large)}"
+        )
+    result = await get_rate_limiter().hit(windows, cost)
+    headers = _rate_limit_headers(result)
+    if not result.allowed:
+        headers["Retry-After"] = str(max(1, math.ceil(result.retry_after)))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{kind.capitalize()} quota exceeded",
+            headers=headers
+        )
+    response.headers.update(headers)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+def verified_body(model: Type[ModelT]):
+    """
+    解析已通过签名验证的请求体（与 get_current_enterprise 一起使用）
+    路由不声明请求体参数，FastAPI 就不会在认证前缓冲整个请求体
+    """
+    async def dependency(
+        request: Request,
+        enterprise: dict = Depends(get_current_enterprise)
+    ) -> ModelT:
+        try:
+            return model.model_validate_json(request.state.verified_body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors(include_url=False))
+    return dependency
+
+IdempotentRunner = Callable[[Callable[[], Awaitable[Any]]], Awaitable[Any]]
+
+def idempotent(
+    request: Request,
+    response: Response,
+    enterprise: dict = Depends(get_current_enterprise)
+) -> IdempotentRunner:
+    """
+    发送接口的幂等执行器：await run(func)
+    带 Idempotency-Key 时按 Key 去重，否则在 IDEMPOTENCY_CONTENT_TTL 内按请求体去重
+    重放的响应带 Idempotent-Replayed: true
+    """
+    settings = get_settings()
+    body_hash = fingerprint(request.state.verified_body)
+    header = request.headers.get("Idempotency-Key")
+    if header:
+        if len(header) > 255:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Idempotency-Key too long")
+        key, ttl = f"{request.url.path}:key:{header}", settings.IDEMPOTENCY_TTL
+    else:
+        key, ttl = f"{request.url.path}:body:{body_hash}", settings.IDEMPOTENCY_CONTENT_TTL
+    corp_id = enterprise["wecom_config"]["corp_id"]
+
+    async def run(func: Callable[[], Awaitable[Any]]):
+        if not ttl:
+            return await func()
+        try:
+            result, replayed = await get_idempotency_store().run(corp_id, key, body_hash, func, ttl)
+        except IdempotencyConflict:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Request with the same idempotency key is in progress",
+                headers={"Retry-After": "1"}
+            )
+        except IdempotencyKeyReused as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        except RedisError as e:
+            # Redis 不可用时不阻塞发送，退化为不去重
+            logger.warning("Idempotency store unavailable, executing without dedup: %s", e)
+            return await func()
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return result
+    return run
+
+async def cluster_engine(cluster):
+    """按 db_cluster 取引擎，连接用尽时返回 503"""
+    try:
+        return await engine_registry.get_engine(cluster)
+    except ClusterCapacityError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connections exhausted",
+            headers={"Retry-After": "1"}
+        )
+
+async def get_subscriber_cluster(
+    current_subscriber=Depends(get_current_subscriber),
+    db: AsyncSession = Depends(database.get_db)
+) -> str:
+    """订阅者的通知记录所在的 db_cluster（即其关联企业的集群），结果按订阅者缓存"""
+    cluster = subscriber_cache.get_cluster(current_subscriber.id)
+    if cluster is None:
+        cluster = subscriber_cache.cache_cluster(
+            current_subscriber.id,
+            await crud.get_subscriber_cluster(db, current_subscriber.id)
+        )
+    return cluster
+
+async def get_subscriber_db(cluster: str = Depends(get_subscriber_cluster)):
+    """订阅者通知记录所在集群上的异步会话"""
+    engine = await cluster_engine(cluster or None)
+    async with engine_registry.session(engine) as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
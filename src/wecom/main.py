@@ -1,17 +1,86 @@
+# 须最先导入，启动耗时从这里开始计算
+from ._bootstrap import import_started
+
+import asyncio
+import logging
+import signal
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .routers import auth, notify
+from .routers import admin, appchat, auth, callback, messages, metrics, notify
 from .db import database
-from .config import get_settings
-app = FastAPI()
+from .config import get_settings, reload_settings
+from .core.auth import listen_for_invalidations
+from .core.client import close_async_http_client
+from .core.metrics import MetricsMiddleware, report_startup
+from .db.registry import engine_registry
+from .db.writer import notification_writer
+from .core.passwords import password_hasher
+from .core.redis_pool import close_async_redis
+from .core.token_cache import get_token_cache
+
+
+def _reload_on_signal():
+    try:
+        reload_settings()
+    except Exception:
+        logging.exception("Settings reload failed, keeping current settings")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_started = time.perf_counter()
+    # kill -HUP <pid> 时热加载配置
+    loop = asyncio.get_running_loop()
+    if hasattr(signal, "SIGHUP"):
+        loop.add_signal_handler(signal.SIGHUP, _reload_on_signal)
+    # 后台提前续期 access_token
+    token_cache = get_token_cache()
+    token_cache.start_refresher()
+    # 订阅企业凭据失效通知
+    invalidation_listener = asyncio.create_task(listen_for_invalidations())
+    # 投递记录批量落库
+    notification_writer.start()
+    # 定期释放空闲的分库引擎
+    engine_registry.start_reaper()
+    # 创建数据库引擎（不建立连接，数据库暂不可用时也能启动）；表结构由 alembic 管理
+    database.get_engine()
+    database.get_async_engine()
+    # 只读副本健康检查
+    replicas = database.get_replicas()
+    if replicas:
+        replicas.start_checker(get_settings().DB_REPLICA_CHECK_INTERVAL)
+    report_startup(import_started, _import_finished, init_started)
+    yield
+    invalidation_listener.cancel()
+    # 写入缓冲中剩余的记录（可能用到分库引擎，须在释放引擎之前）
+    await notification_writer.stop()
+    if replicas:
+        await replicas.dispose()
+    await engine_registry.stop_reaper()
+    await engine_registry.dispose_all()
+    await token_cache.stop_refresher()
+    await close_async_http_client()
+    await close_async_redis()
+    password_hasher.shutdown()
+    if hasattr(signal, "SIGHUP"):
+        loop.remove_signal_handler(signal.SIGHUP)
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 def validate_config():
     settings = get_settings()
     if not all([settings.postgres_host, settings.postgres_user, settings.postgres_password]):
         raise ValueError("Missing required database configuration")
 
-# 初始化数据库
-database.Base.metadata.create_all(bind=database.engine)
-
 # 包含路由
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
-app.include_router(notify.router, prefix="/api", tags=["notifications"])
\ No newline at end of file
+app.include_router(notify.router, prefix="/api", tags=["notifications"])
+app.include_router(messages.router, prefix="/api", tags=["messages"])
+app.include_router(appchat.router, prefix="/api", tags=["appchat"])
+app.include_router(callback.router, tags=["callback"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
+app.include_router(metrics.router)
+
+_import_finished = time.perf_counter()
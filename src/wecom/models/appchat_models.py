@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class ChatSpec(BaseModel):
+    name: str = Field(..., max_length=50)
+    owner: str
+    userlist: List[str] = Field(..., min_length=2, max_length=2000)
+    chatid: Optional[str] = Field(None, pattern=r"^[0-9a-zA-Z]{1,32}$")
+
+class BulkChatCreateRequest(BaseModel):
+    chats: List[ChatSpec] = Field(..., min_length=1)
+    job_id: Optional[str] = Field(None, pattern=r"^[0-9a-zA-Z_-]{1,64}$")  # 续跑时传入上次返回的 job_id
+
+class ChatMemberUpdate(BaseModel):
+    chatid: str
+    add_user_list: List[str] = Field(default_factory=list)
+    del_user_list: List[str] = Field(default_factory=list)
+
+class BulkChatMemberRequest(BaseModel):
+    updates: List[ChatMemberUpdate] = Field(..., min_length=1)
+    job_id: Optional[str] = Field(None, pattern=r"^[0-9a-zA-Z_-]{1,64}$")
+
+class ChatResult(BaseModel):
+    chatid: str
+    status: str  # ok / failed / skipped（之前的运行已成功）
+    errcode: int
+    errmsg: str
+
+class BulkChatResult(BaseModel):
+    job_id: str
+    succeeded: int
+    failed: int
+    skipped: int
+    results: List[ChatResult]
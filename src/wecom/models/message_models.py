@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+class BulkMessageRequest(BaseModel):
+    content: str
+    touser: List[str] = Field(default_factory=list)
+    toparty: List[str] = Field(default_factory=list)
+    totag: List[str] = Field(default_factory=list)
+    agentid: Optional[int] = None
+
+class BatchError(BaseModel):
+    errcode: int
+    errmsg: str
+    touser: int
+    toparty: int
+    totag: int
+
+class BulkMessageResult(BaseModel):
+    batches: int
+    failed_batches: int
+    recipients: Dict[str, str]  # userid -> sent / invalid / unlicensed / failed
+    invalid_parties: List[str]
+    invalid_tags: List[str]
+    errors: List[BatchError]
+
+class QueuedBulkMessage(BaseModel):
+    task_id: str
+    batches: int
+
+class BulkMessageStatus(BaseModel):
+    task_id: str
+    batches: int
+    completed: int
+    result: Optional[BulkMessageResult] = None
@@ -0,0 +1,20 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import List, Optional
+
+class NotificationOut(BaseModel):
+    id: int
+    recipient: str
+    msgtype: str
+    content: Optional[str] = None
+    status: str
+    errcode: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class NotificationPage(BaseModel):
+    company: str
+    notifications: List[NotificationOut]
+    next_cursor: Optional[str] = None  # 为空表示没有更多记录
@@ -7,19 +7,20 @@ class SubscriberBase(BaseModel):
     contact_email: EmailStr
     wecom_corp_id: str
     is_active: bool = True
-    subscription_tier: str = "basic"  # e.g., basic, premium, enterprise
 
+# 注册时不接受 subscription_tier，配额等级由管理员在企业上设置
 class SubscriberCreate(SubscriberBase):
     password: str
 
 class SubscriberInDB(SubscriberBase):
     id: int
+    subscription_tier: str = "basic"  # e.g., basic, premium, enterprise
     created_at: datetime
     updated_at: datetime
     hashed_password: str
 
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,25 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, status
+from pydantic import ValidationError
+from ..config import get_settings, reload_settings
+
+router = APIRouter()
+
+def verify_admin_token(token: Optional[str]):
+    expected = get_settings().ADMIN_TOKEN
+    if not (expected and token and hmac.compare_digest(token, expected)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+@router.post("/reload-config")
+async def reload_config(x_admin_token: Optional[str] = Header(None)):
+    """重新加载配置（等同于向进程发送 SIGHUP，仅作用于处理该请求的 worker）"""
+    verify_admin_token(x_admin_token)
+    try:
+        settings = reload_settings()
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid configuration: {e.error_count()} error(s), keeping current settings"
+        )
+    return {"reloaded": True, "env": settings.ENV, "version": settings.APP_VERSION}
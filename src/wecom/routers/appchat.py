@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends
+from ..dependencies import get_current_enterprise, verified_body
+from ..models.appchat_models import BulkChatCreateRequest, BulkChatMemberRequest, BulkChatResult
+from ..core.appchat import create_chats, update_members
+from ..core.redis_pool import get_async_redis
+from ..core.client import AsyncWeComClient
+
+router = APIRouter()
+
+def _client(enterprise: dict) -> AsyncWeComClient:
+    config = enterprise["wecom_config"]
+    return AsyncWeComClient(config["corp_id"], config["secret"])
+
+@router.post("/appchats/bulk", response_model=BulkChatResult)
+async def bulk_create_chats(
+    request: BulkChatCreateRequest = Depends(verified_body(BulkChatCreateRequest)),
+    enterprise: dict = Depends(get_current_enterprise)
+):
+    """批量建群，部分失败时用返回的 job_id 重新提交同样的列表即可续跑"""
+    return await create_chats(
+        _client(enterprise),
+        [chat.model_dump() for chat in request.chats],
+        redis=get_async_redis(),
+        job_id=request.job_id,
+    )
+
+@router.post("/appchats/members/bulk", response_model=BulkChatResult)
+async def bulk_update_chat_members(
+    request: BulkChatMemberRequest = Depends(verified_body(BulkChatMemberRequest)),
+    enterprise: dict = Depends(get_current_enterprise)
+):
+    """批量增删群成员"""
+    return await update_members(
+        _client(enterprise),
+        [update.model_dump() for update in request.updates],
+        redis=get_async_redis(),
+        job_id=request.job_id,
+    )
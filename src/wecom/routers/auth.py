@@ -1,25 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from datetime import timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models.subscription_models import Token, SubscriberCreate, SubscriberInDB
 from ..config import get_settings
 from ..db import crud
+from ..db.database import get_db
+from ..core.passwords import password_hasher
 
 router = APIRouter()
 
 # Security configurations
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Utility functions
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_hasher.context.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     settings = get_settings()
@@ -29,27 +30,38 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    # 延迟导入 jose（会加载 cryptography），加快进程启动
+    from jose import jwt
     encoded_jwt = jwt.encode(
         to_encode, 
-        settings.secret_key, 
-        algorithm=settings.algorithm
+        settings.SECRET_KEY,
+        algorithm=settings.ALGORITHM
     )
     return encoded_jwt
 
 # Routes
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends()
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db)
 ):
-    subscriber = crud.get_subscriber_by_email(form_data.username)
-    if not subscriber or not verify_password(form_data.password, subscriber.hashed_password):
+    subscriber = await crud.get_subscriber_by_email(db, form_data.username)
+    verified, new_hash = False, None
+    if subscriber:
+        verified, new_hash = await password_hasher.verify_and_update(
+            form_data.password, subscriber.hashed_password
+        )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    access_token_expires = timedelta(minutes=get_settings().access_token_expire_minutes)
+    if new_hash:
+        # bcrypt cost 配置变更后透明地升级哈希
+        await crud.update_subscriber_password(db, subscriber, new_hash)
+
+    access_token_expires = timedelta(minutes=get_settings().SECRET_KEY_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": subscriber.contact_email},
         expires_delta=access_token_expires
@@ -57,18 +69,21 @@ async def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/register", response_model=SubscriberInDB)
-async def register_subscriber(subscriber: SubscriberCreate):
-    db_subscriber = crud.get_subscriber_by_email(subscriber.contact_email)
+async def register_subscriber(
+    subscriber: SubscriberCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    db_subscriber = await crud.get_subscriber_by_email(db, subscriber.contact_email)
     if db_subscriber:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    hashed_password = get_password_hash(subscriber.password)
-    subscriber_data = subscriber.dict()
+    hashed_password = await password_hasher.hash(subscriber.password)
+    subscriber_data = subscriber.model_dump(exclude={"password"})
     subscriber_data.update({
         "hashed_password": hashed_password,
         "is_active": True
     })
-    return crud.create_subscriber(subscriber_data)
\ No newline at end of file
+    return await crud.create_subscriber(db, subscriber_data)
\ No newline at end of file
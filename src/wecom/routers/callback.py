@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import get_settings
+from ..core import callback
+from ..db import crud, database
+
+router = APIRouter()
+
+_MISS = object()
+
+async def get_crypto(corp_id: str, db: AsyncSession = Depends(database.get_db)) -> callback.WeComCrypto:
+    """按企业取回调加解密器，只有缓存未命中时才查询数据库"""
+    crypto = callback.get_cached_crypto(corp_id, _MISS)
+    if crypto is _MISS:
+        enterprise = await crud.get_active_enterprise_by_corp_id(db, corp_id)
+        try:
+            crypto = callback.cache_crypto(
+                corp_id,
+                enterprise.callback_token if enterprise else None,
+                enterprise.encoding_aes_key if enterprise else None,
+            )
+        except callback.CallbackError:
+            crypto = None
+    if crypto is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Callback not configured")
+    return crypto
+
+async def read_body(request: Request) -> bytes:
+    """读取回调请求体，超过 MAX_REQUEST_BODY_SIZE 立即返回 413（与 HMAC 认证接口相同）"""
+    max_size = get_settings().MAX_REQUEST_BODY_SIZE
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="Request body too large")
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_size:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail="Request body too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+@router.get("/callback/{corp_id}", response_class=PlainTextResponse)
+async def verify_url(
+    msg_signature: str = Query(...),
+    timestamp: str = Query(...),
+    nonce: str = Query(...),
+    echostr: str = Query(...),
+    crypto: callback.WeComCrypto = Depends(get_crypto)
+):
+    """回调 URL 验证：校验签名后返回解密的 echostr"""
+    try:
+        return crypto.verify_and_decrypt(msg_signature, timestamp, nonce, echostr)
+    except callback.CallbackError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+
+@router.post("/callback/{corp_id}", response_class=PlainTextResponse)
+async def receive_event(
+    corp_id: str,
+    request: Request,
+    msg_signature: str = Query(...),
+    timestamp: str = Query(...),
+    nonce: str = Query(...),
+    crypto: callback.WeComCrypto = Depends(get_crypto)
+):
+    """
+    接收回调事件：校验、解密、去重后入队即返回
+    企业微信5秒内未收到响应会重试，业务处理全部交给 worker
+    """
+    try:
+        encrypted = callback.extract_encrypted(await read_body(request))
+        event = callback.parse_event(
+            crypto.verify_and_decrypt(msg_signature, timestamp, nonce, encrypted)
+        )
+    except callback.CallbackError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+
+    redis = callback.get_redis()
+    key = callback.event_key(event)
+    if not await callback.mark_seen(redis, corp_id, key):
+        # 重复推送：已入队过，直接确认
+        return "success"
+    from ..tasks import callbacks  # 延迟导入 celery，加快进程启动
+
+    try:
+        await run_in_threadpool(callbacks.enqueue_event, corp_id, event)
+    except Exception:
+        await callback.unmark_seen(redis, corp_id, key)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Queue unavailable")
+    return "success"
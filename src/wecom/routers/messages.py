@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
+from ..dependencies import (
+    IdempotentRunner, enforce_quota, get_current_enterprise, idempotent, verified_body
+)
+from ..models.message_models import (
+    BulkMessageRequest, BulkMessageResult, BulkMessageStatus, QueuedBulkMessage
+)
+from ..config import get_settings
+from ..core.client import AsyncWeComClient
+from ..core.fanout import send_bulk
+from ..core.notifications import record_deliveries
+
+router = APIRouter()
+
+def _check_recipients(message: BulkMessageRequest):
+    if not (message.touser or message.toparty or message.totag):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No recipients"
+        )
+
+async def _check_send_quota(response: Response, enterprise: dict, message: BulkMessageRequest):
+    # 发送量按接收成员计，部门和标签的成员数未知，各按一人次计
+    cost = len(message.touser) + len(message.toparty) + len(message.totag)
+    await enforce_quota(response, enterprise, "sends", cost)
+
+@router.post("/messages/bulk", response_model=BulkMessageResult)
+async def send_bulk_message(
+    response: Response,
+    message: BulkMessageRequest = Depends(verified_body(BulkMessageRequest)),
+    enterprise: dict = Depends(get_current_enterprise),
+    run: IdempotentRunner = Depends(idempotent)
+):
+    """批量发送文本消息，接收人按企业微信上限打包后并发发送；重试的请求返回首次的结果"""
+    _check_recipients(message)
+    config = enterprise["wecom_config"]
+    client = AsyncWeComClient(config["corp_id"], config["secret"], agent_id=message.agentid)
+
+    async def send():
+        await _check_send_quota(response, enterprise, message)
+        result = await send_bulk(
+            client,
+            message.content,
+            touser=message.touser,
+            toparty=message.toparty,
+            totag=message.totag,
+        )
+        await record_deliveries(enterprise, message.content, result["recipients"])
+        return result
+    return await run(send)
+
+@router.post(
+    "/messages/bulk/queued",
+    response_model=QueuedBulkMessage,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def enqueue_bulk_message(
+    response: Response,
+    message: BulkMessageRequest = Depends(verified_body(BulkMessageRequest)),
+    enterprise: dict = Depends(get_current_enterprise),
+    run: IdempotentRunner = Depends(idempotent)
+):
+    """批量发送入队，由 Celery worker 按限流异步投递；重试的请求返回首次入队的任务"""
+    from ..tasks import delivery  # 延迟导入 celery，加快进程启动
+
+    _check_recipients(message)
+    config = enterprise["wecom_config"]
+
+    async def enqueue():
+        await _check_send_quota(response, enterprise, message)
+        result = await run_in_threadpool(
+            delivery.enqueue_bulk,
+            config["corp_id"],
+            message.agentid or get_settings().WECOM_AGENT_ID,
+            message.content,
+            message.touser,
+            message.toparty,
+            message.totag,
+        )
+        return {"task_id": result.id, "batches": len(result.results)}
+    return await run(enqueue)
+
+@router.get("/messages/bulk/{task_id}", response_model=BulkMessageStatus)
+async def get_bulk_message_status(
+    task_id: str,
+    enterprise: dict = Depends(get_current_enterprise)
+):
+    """查询入队批量发送的进度与结果"""
+    from ..tasks import delivery
+
+    corp_id = enterprise["wecom_config"]["corp_id"]
+    result = await run_in_threadpool(delivery.get_bulk_status, task_id, corp_id)
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    return result
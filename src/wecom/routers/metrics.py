@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from ..core.metrics import render_metrics
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 抓取接口"""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
@@ -1,15 +1,65 @@
-from fastapi import APIRouter, Depends
-from ..dependencies import get_current_subscriber
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..dependencies import (
+    cluster_engine, get_current_subscriber, get_subscriber_cluster, get_subscriber_db
+)
 from ..models.subscription_models import SubscriberInDB
+from ..models.notification_models import NotificationOut, NotificationPage
+from ..core.pagination import decode_cursor, encode_cursor
+from ..db import crud
+from ..db.registry import engine_registry
 
 router = APIRouter()
 
-@router.get("/notifications")
+@router.get("/notifications", response_model=NotificationPage)
 async def get_notifications(
-    current_subscriber: SubscriberInDB = Depends(get_current_subscriber)
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_subscriber: SubscriberInDB = Depends(get_current_subscriber),
+    db: AsyncSession = Depends(get_subscriber_db)
 ):
-    """获取当前订阅者的通知记录"""
+    """获取当前订阅者的通知记录（按时间倒序，使用 next_cursor 翻页）"""
+    before = None
+    if cursor:
+        try:
+            before = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    # 多取一条判断是否还有下一页
+    rows = await crud.list_notifications(db, current_subscriber.id, limit + 1, before)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
     return {
         "company": current_subscriber.company_name,
-        "notifications": [...]  # 实际查询数据库的逻辑
-    }
\ No newline at end of file
+        "notifications": rows,
+        "next_cursor": next_cursor
+    }
+
+@router.get("/notifications/export")
+async def export_notifications(
+    current_subscriber: SubscriberInDB = Depends(get_current_subscriber),
+    cluster: str = Depends(get_subscriber_cluster)
+):
+    """以 NDJSON 流式导出全部通知记录，服务端游标分批读取，不在内存中汇总"""
+    subscriber_id = current_subscriber.id
+    engine = await cluster_engine(cluster or None)
+
+    async def generate():
+        # 响应发送期间独立持有会话，不依赖请求级依赖的生命周期
+        async with engine_registry.session(engine) as db:
+            result = await db.stream_scalars(
+                crud.notifications_query(subscriber_id).execution_options(yield_per=1000)
+            )
+            async for notification in result:
+                yield NotificationOut.model_validate(notification).model_dump_json() + "\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=notifications.ndjson"}
+    )
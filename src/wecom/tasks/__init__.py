@@ -0,0 +1,17 @@
+# Celery 任务：企业凭据在 worker 内按 corp_id 从数据库加载，不作为任务参数写入 broker 和结果后端
+
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..db import database
+from ..db.models import Enterprise
+
+
+def load_enterprise(corp_id: str) -> Optional[Enterprise]:
+    """按 corp_id 加载启用中的企业，不存在或已停用时返回 None"""
+    with Session(database.get_engine()) as db:
+        return db.execute(
+            select(Enterprise).where(Enterprise.wecom_corp_id == corp_id, Enterprise.is_active)
+        ).scalar_one_or_none()
@@ -0,0 +1,59 @@
+# 回调事件处理任务：接收端只做校验、解密和入队，业务处理在 worker 中异步进行
+
+import logging
+from typing import Callable, Dict, List, Optional
+
+from ..worker import celery_app
+
+logger = logging.getLogger(__name__)
+
+# 事件类型（MsgType 或 Event 字段）-> 处理函数列表
+_handlers: Dict[str, List[Callable[[str, dict], None]]] = {}
+
+
+def register_handler(event_type: str):
+    """注册事件处理函数：@register_handler("change_external_contact")"""
+    def decorator(func):
+        _handlers.setdefault(event_type, []).append(func)
+        return func
+    return decorator
+
+
+def event_type(event: dict) -> str:
+    if event.get("MsgType") == "event":
+        return event.get("Event", "")
+    return event.get("MsgType", "")
+
+
+def handler_name(handler: Callable) -> str:
+    return f"{handler.__module__}.{handler.__qualname__}"
+
+
+@celery_app.task(bind=True, max_retries=5)
+def process_event(self, corp_id: str, event: dict, done: Optional[List[str]] = None):
+    """依次执行事件的处理函数；某个处理函数失败时重试，已成功的处理函数（done）不再执行"""
+    handlers = _handlers.get(event_type(event), [])
+    if not handlers:
+        logger.debug("No handler for %s event from corp %s", event_type(event), corp_id)
+    done = list(done or [])
+    for handler in handlers:
+        name = handler_name(handler)
+        if name in done:
+            continue
+        try:
+            handler(corp_id, event)
+        except Exception as e:
+            logger.warning("Callback handler %s failed for corp %s: %s",
+                           handler.__name__, corp_id, e)
+            raise self.retry(
+                exc=e,
+                countdown=min(60, 2 ** self.request.retries),
+                args=(corp_id, event),
+                kwargs={"done": done},
+            )
+        done.append(name)
+    return len(handlers)
+
+
+def enqueue_event(corp_id: str, event: dict):
+    return process_event.delay(corp_id, event)
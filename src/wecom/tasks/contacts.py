@@ -0,0 +1,71 @@
+# 客户联系人同步任务：定期或手动触发的同步，以及 change_external_contact 回调的增量处理
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from ..core.redis_pool import get_async_redis
+from ..core.client import AsyncWeComClient, run_sync
+from ..core.contacts import ContactSync
+from ..core.ratelimit import AsyncTokenBucket
+from ..worker import celery_app
+from . import load_enterprise
+from .callbacks import register_handler
+
+logger = logging.getLogger(__name__)
+
+
+def _contact_sync(corp_id: str) -> Optional[ContactSync]:
+    enterprise = load_enterprise(corp_id)
+    if enterprise is None:
+        logger.warning("Skip contact sync for unknown or inactive corp %s", corp_id)
+        return None
+    client = AsyncWeComClient(corp_id, enterprise.wecom_secret)
+    return ContactSync(client)
+
+
+def _with_bucket(sync: ContactSync) -> ContactSync:
+    # 在后台事件循环中调用：令牌桶使用该循环共享的 Redis 客户端
+    sync.bucket = AsyncTokenBucket(get_async_redis())
+    return sync
+
+
+async def _run(sync: ContactSync, full: bool, since: Optional[datetime] = None) -> dict:
+    return await _with_bucket(sync).run(full, since)
+
+
+async def _apply(sync: ContactSync, event: dict) -> int:
+    return await _with_bucket(sync).apply_change(event)
+
+
+@celery_app.task(bind=True, max_retries=5)
+def sync_contacts(self, corp_id: str, full: bool = False, resume_since: Optional[str] = None):
+    """
+    同步企业的客户联系人；失败重试时从检查点继续
+    全量同步失败后以 full=False 重试，并用 resume_since（本轮开始时间）区分本轮已完成的成员
+    """
+    sync = _contact_sync(corp_id)
+    if sync is None:
+        return None
+    started_at = datetime.now(timezone.utc)
+    since = datetime.fromisoformat(resume_since) if resume_since else None
+    try:
+        return run_sync(_run(sync, full, since))
+    except Exception as e:
+        logger.warning("Contact sync for corp %s failed: %s", corp_id, e)
+        if full:
+            resume_since = started_at.isoformat()
+        raise self.retry(
+            exc=e,
+            countdown=min(300, 10 * 2 ** self.request.retries),
+            args=(corp_id,),
+            kwargs={"full": False, "resume_since": resume_since},
+        )
+
+
+@register_handler("change_external_contact")
+def apply_contact_change(corp_id: str, event: dict):
+    """客户变更回调：只更新对应的客户关系"""
+    sync = _contact_sync(corp_id)
+    if sync is not None:
+        run_sync(_apply(sync, event))
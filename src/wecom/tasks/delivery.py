@@ -0,0 +1,146 @@
+# 消息投递任务：按批次发送，并受每企业/每应用令牌桶限流
+
+import logging
+import random
+from typing import Iterable, Optional
+
+from celery import group
+from celery.result import GroupResult
+
+from ..config import get_settings
+from ..core.auth import on_corp_invalidated
+from ..core.cache import TTLCache
+from ..core.client import WeComClient
+from ..core.fanout import merge_batch_result, new_bulk_result, pack_recipients
+from ..core.ratelimit import TokenBucket, wecom_buckets
+from ..core.redis_pool import get_sync_redis
+from ..core.resilience import ERRCODE_BUSY, CircuitOpenError, RequestNotSentError
+from ..worker import celery_app
+from . import load_enterprise
+
+logger = logging.getLogger(__name__)
+
+ERRCODE_FREQ_LIMIT = 45009  # 接口调用超过限制
+MAX_SEND_ATTEMPTS = 8
+
+# 批量任务所属的企业，查询进度时校验
+_OWNER_KEY = "wecom:bulk:owner:{group_id}"
+
+_token_bucket: Optional[TokenBucket] = None
+# corp_id -> 企业微信 secret；企业停用或 secret 轮换后由失效通知清除
+_secrets = TTLCache(maxsize=4096, ttl=get_settings().ENTERPRISE_CACHE_TTL)
+on_corp_invalidated(_secrets.pop)
+
+
+def get_token_bucket() -> TokenBucket:
+    global _token_bucket
+    if _token_bucket is None:
+        _token_bucket = TokenBucket(get_sync_redis())
+    return _token_bucket
+
+
+def get_secret(corp_id: str) -> Optional[str]:
+    """在 worker 内加载企业微信 secret（短时缓存，避免每个批次查询数据库）"""
+    secret = _secrets.get(corp_id)
+    if secret is None:
+        enterprise = load_enterprise(corp_id)
+        if enterprise is None:
+            return None
+        secret = enterprise.wecom_secret
+        _secrets.set(corp_id, secret)
+    return secret
+
+
+@celery_app.task(bind=True, max_retries=None)
+def deliver_batch(self, corp_id: str, agent_id: int, content: str, batch: dict, attempt: int = 0):
+    """
+    发送一个批次（最多1000个成员），返回批次及企业微信响应
+    attempt 为发送失败后的重试次数，限流等待不计入，超过 MAX_SEND_ATTEMPTS 后返回最后的失败响应
+    """
+    wait = get_token_bucket().acquire(wecom_buckets(corp_id, agent_id))
+    if wait:
+        # 令牌不足时延后执行，不占用 worker；沿用原 attempt，等待次数不设上限
+        raise self.retry(countdown=wait)
+
+    secret = get_secret(corp_id)
+    if secret is None:
+        logger.warning("Skip delivery for unknown or inactive corp %s", corp_id)
+        resp = {"errcode": -1, "errmsg": "enterprise not found or inactive"}
+        return {"batch": batch, "resp": resp}
+
+    client = WeComClient(corp_id, secret, agent_id=agent_id)
+    retryable = False
+    try:
+        resp = client.send_text(content, **batch)
+        retryable = resp.get("errcode") in (ERRCODE_FREQ_LIMIT, ERRCODE_BUSY)
+    except CircuitOpenError as e:
+        # 该企业熔断中：等到探测时间再试，不占用 worker 也不访问企业微信
+        if attempt < MAX_SEND_ATTEMPTS:
+            raise self.retry(exc=e, countdown=max(e.retry_after, 1) * (1 + random.random()),
+                             kwargs={"attempt": attempt + 1})
+        resp = {"errcode": e.errcode, "errmsg": e.errmsg}
+    except RequestNotSentError as e:
+        # 请求没有到达企业微信，整批重发不会造成重复消息
+        logger.warning("Delivery to corp %s not sent: %s", corp_id, e)
+        resp = {"errcode": e.errcode, "errmsg": e.errmsg}
+        retryable = True
+    except Exception as e:
+        # 请求可能已送达（如读超时），重发会让整批成员重复收到消息，只记为失败
+        logger.warning("Delivery to corp %s failed: %s", corp_id, e)
+        resp = {"errcode": -1, "errmsg": str(e)}
+
+    if retryable and attempt < MAX_SEND_ATTEMPTS:
+        # 指数退避加随机抖动，避免多个 worker 同时重试
+        countdown = min(60, 2 ** attempt) * (0.5 + random.random())
+        raise self.retry(countdown=countdown, kwargs={"attempt": attempt + 1})
+    return {"batch": batch, "resp": resp}
+
+
+def enqueue_bulk(
+    corp_id: str,
+    agent_id: int,
+    content: str,
+    touser: Iterable[str] = (),
+    toparty: Iterable[str] = (),
+    totag: Iterable[str] = (),
+) -> GroupResult:
+    """将批量发送拆分为批次任务入队，并记录任务所属企业"""
+    result = group(
+        deliver_batch.s(corp_id, agent_id, content, batch)
+        for batch in pack_recipients(touser, toparty, totag)
+    ).apply_async()
+    result.save()
+    get_sync_redis().set(
+        _OWNER_KEY.format(group_id=result.id), corp_id, ex=celery_app.conf.result_expires
+    )
+    return result
+
+
+def get_bulk_status(group_id: str, corp_id: str) -> Optional[dict]:
+    """查询批量发送进度，全部完成后汇总每个接收人的结果；任务不存在或不属于该企业时返回 None"""
+    owner = get_sync_redis().get(_OWNER_KEY.format(group_id=group_id))
+    if owner is None or (owner.decode() if isinstance(owner, bytes) else owner) != corp_id:
+        return None
+    result = GroupResult.restore(group_id, app=celery_app)
+    if result is None:
+        return None
+    status = {
+        "task_id": group_id,
+        "batches": len(result.results),
+        "completed": result.completed_count(),
+        "result": None,
+    }
+    if result.ready():
+        merged = new_bulk_result()
+        for item in result.results:
+            if item.successful():
+                merge_batch_result(merged, item.result["batch"], item.result["resp"])
+            else:
+                merged["batches"] += 1
+                merged["failed_batches"] += 1
+                merged["errors"].append({
+                    "errcode": -1, "errmsg": str(item.result),
+                    "touser": 0, "toparty": 0, "totag": 0,
+                })
+        status["result"] = merged
+    return status
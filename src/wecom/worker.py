@@ -0,0 +1,36 @@
+# Celery 应用：celery -A wecom.worker worker -Q wecom.delivery,wecom.callback
+
+from celery import Celery
+from celery.signals import worker_process_init
+from .config import get_settings
+
+settings = get_settings()
+
+celery_app = Celery(
+    "wecom",
+    broker=str(settings.CELERY_BROKER_URL),
+    backend=str(settings.CELERY_RESULT_BACKEND),
+    include=["wecom.tasks.delivery", "wecom.tasks.callbacks", "wecom.tasks.contacts"],
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    result_expires=3600,
+    task_acks_late=True,  # 执行完成后再确认，worker 异常退出时任务会重新投递
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=settings.CELERY_PREFETCH_MULTIPLIER,  # 每个进程预取的批次数
+    task_routes={
+        "wecom.tasks.delivery.*": {"queue": settings.CELERY_DELIVERY_QUEUE},
+        "wecom.tasks.callbacks.*": {"queue": settings.CELERY_CALLBACK_QUEUE},
+        "wecom.tasks.contacts.*": {"queue": settings.CELERY_CALLBACK_QUEUE},
+    },
+)
+
+
+@worker_process_init.connect
+def start_invalidation_listener(**kwargs):
+    """每个 worker 子进程订阅企业失效通知，及时清除缓存的 secret 和回调配置"""
+    from .core.auth import start_invalidation_thread
+    start_invalidation_thread()
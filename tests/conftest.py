@@ -1,5 +1,10 @@
 import os
 import pytest
+from wecom.config import settings as settings_module
+from wecom.core import resilience
+
+# 未配置 .env 时提供测试用 SECRET_KEY（导入 wecom.db 时即需要）
+os.environ.setdefault("SECRET_KEY", "test_secret")
 
 @pytest.fixture(scope="module", autouse=True)
 def set_test_env():
@@ -9,4 +14,13 @@ def set_test_env():
     if original_db is not None:
         os.environ["POSTGRES_DB"] = original_db
     else:
-        del os.environ["POSTGRES_DB"]
\ No newline at end of file
+        del os.environ["POSTGRES_DB"]
+
+@pytest.fixture(autouse=True)
+def fresh_settings():
+    """每个测试重新读取环境变量生成配置快照，并清除熔断状态"""
+    settings_module.reset_settings()
+    resilience.reset_guards()
+    yield
+    settings_module.reset_settings()
+    resilience.reset_guards()
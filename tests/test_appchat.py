@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+from fakeredis import FakeAsyncRedis
+from wecom.core.appchat import ERRCODE_CHAT_EXISTS, create_chats, make_chatid, update_members
+
+
+class FakeClient:
+    """记录建群与改群请求，已创建的 chatid 再次创建时返回 86215"""
+    corp_id = "corp_1"
+    agent_id = 1000002
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)  # 返回错误的群名或 chatid
+        self.chats = {}
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _enter(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+
+    async def create_appchat(self, name, owner, userlist, chatid=None):
+        self.calls.append(("create", chatid))
+        await self._enter()
+        if name in self.fail:
+            return {"errcode": 45009, "errmsg": "api freq out of limit"}
+        if chatid in self.chats:
+            return {"errcode": ERRCODE_CHAT_EXISTS, "errmsg": "chatid exists"}
+        self.chats[chatid] = set(userlist)
+        return {"errcode": 0, "errmsg": "ok", "chatid": chatid}
+
+    async def update_appchat(self, chatid, name=None, owner=None, add_user_list=(), del_user_list=()):
+        self.calls.append(("update", chatid))
+        await self._enter()
+        if chatid in self.fail:
+            raise ConnectionError("reset by peer")
+        self.chats[chatid] |= set(add_user_list)
+        self.chats[chatid] -= set(del_user_list)
+        return {"errcode": 0, "errmsg": "ok"}
+
+
+def _chats(n):
+    return [{"name": f"群{i}", "owner": "a", "userlist": ["a", f"u{i}"]} for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_create_chats_concurrently_with_per_item_results():
+    client = FakeClient(fail={"群3"})
+    result = await create_chats(client, _chats(20), redis=FakeAsyncRedis(), job_id="job1", concurrency=4)
+
+    assert (result["succeeded"], result["failed"], result["skipped"]) == (19, 1, 0)
+    assert result["results"][3]["status"] == "failed"
+    assert result["results"][0]["chatid"] == make_chatid("corp_1", "job1", 0)
+    assert 1 < client.max_in_flight <= 4
+
+
+@pytest.mark.asyncio
+async def test_resume_skips_completed_items():
+    redis = FakeAsyncRedis()
+    client = FakeClient(fail={"群3"})
+    first = await create_chats(client, _chats(5), redis=redis)
+
+    client.fail.clear()
+    client.calls.clear()
+    second = await create_chats(client, _chats(5), redis=redis, job_id=first["job_id"])
+
+    assert client.calls == [("create", first["results"][3]["chatid"])]
+    assert (second["succeeded"], second["failed"], second["skipped"]) == (1, 0, 4)
+    assert len(client.chats) == 5
+
+
+@pytest.mark.asyncio
+async def test_resume_without_progress_treats_existing_chat_as_created():
+    # 进度丢失（或写入前进程退出）时，确定性的 chatid 保证不会重复建群
+    client = FakeClient()
+    await create_chats(client, _chats(3), redis=FakeAsyncRedis(), job_id="job1")
+    result = await create_chats(client, _chats(3), redis=FakeAsyncRedis(), job_id="job1")
+
+    assert result["succeeded"] == 3
+    assert {r["errcode"] for r in result["results"]} == {ERRCODE_CHAT_EXISTS}
+    assert len(client.chats) == 3
+
+
+@pytest.mark.asyncio
+async def test_update_members():
+    redis = FakeAsyncRedis()
+    client = FakeClient()
+    client.chats = {"c1": {"a", "b"}, "c2": {"a", "b"}}
+    client.fail = {"c2"}
+    updates = [
+        {"chatid": "c1", "add_user_list": ["c"], "del_user_list": ["b"]},
+        {"chatid": "c2", "add_user_list": ["d"]},
+    ]
+
+    result = await update_members(client, updates, redis=redis, job_id="job2")
+    assert [r["status"] for r in result["results"]] == ["ok", "failed"]
+    assert result["results"][1]["errcode"] == -1
+    assert client.chats["c1"] == {"a", "c"}
+
+    client.fail.clear()
+    result = await update_members(client, updates, redis=redis, job_id="job2")
+    assert [r["status"] for r in result["results"]] == ["skipped", "ok"]
+    assert client.chats["c2"] == {"a", "b", "d"}
@@ -0,0 +1,135 @@
+import base64
+import os
+import pytest
+from fakeredis import aioredis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from wecom.core import callback
+from wecom.core.callback import CallbackError, WeComCrypto
+from wecom.db import database
+from wecom.routers import callback as callback_router
+from wecom.tasks import callbacks
+
+CORP_ID = "ww_corp_1"
+TOKEN = "callback_token"
+AES_KEY = base64.b64encode(os.urandom(32)).decode().rstrip("=")
+
+EVENT_XML = (
+    "<xml><ToUserName><![CDATA[ww_corp_1]]></ToUserName>"
+    "<FromUserName><![CDATA[sys]]></FromUserName><CreateTime>1700000000</CreateTime>"
+    "<MsgType><![CDATA[event]]></MsgType><Event><![CDATA[change_contact]]></Event>"
+    "<ChangeType><![CDATA[update_user]]></ChangeType><UserID><![CDATA[zhangsan]]></UserID></xml>"
+)
+
+
+@pytest.fixture
+def crypto():
+    return WeComCrypto(TOKEN, AES_KEY, CORP_ID)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    redis = aioredis.FakeRedis()
+    queued = []
+    monkeypatch.setattr(callback, "get_redis", lambda: redis)
+    monkeypatch.setattr(callbacks, "enqueue_event", lambda corp_id, event: queued.append((corp_id, event)))
+    callback.cache_crypto(CORP_ID, TOKEN, AES_KEY)
+    callback.cache_crypto("ww_unconfigured", None, None)
+
+    app = FastAPI()
+    app.include_router(callback_router.router)
+    app.dependency_overrides[database.get_db] = lambda: None
+    with TestClient(app) as test_client:
+        test_client.queued = queued
+        yield test_client
+    callback.invalidate_crypto(CORP_ID)
+    callback.invalidate_crypto("ww_unconfigured")
+
+
+def test_decrypt_roundtrip_and_signature(crypto):
+    encrypted = crypto.encrypt(EVENT_XML)
+    signature = crypto.signature("1700000000", "nonce", encrypted)
+    assert crypto.verify_and_decrypt(signature, "1700000000", "nonce", encrypted) == EVENT_XML
+    with pytest.raises(CallbackError):
+        crypto.verify_and_decrypt("0" * 40, "1700000000", "nonce", encrypted)
+    # 其他企业的 ReceiveId 不能通过校验
+    other = WeComCrypto(TOKEN, AES_KEY, "ww_other")
+    with pytest.raises(CallbackError):
+        other.decrypt(encrypted)
+
+
+def test_event_key_prefers_msgid():
+    assert callback.event_key({"MsgId": "123"}) == "123"
+    base = callback.parse_event(EVENT_XML)
+    assert callback.event_key(base) == callback.event_key(dict(base))
+    assert callback.event_key(base) != callback.event_key({**base, "UserID": "lisi"})
+
+
+def test_verify_url(client, crypto):
+    echostr = crypto.encrypt("echo-12345")
+    params = {
+        "msg_signature": crypto.signature("1", "n", echostr),
+        "timestamp": "1", "nonce": "n", "echostr": echostr,
+    }
+    resp = client.get(f"/callback/{CORP_ID}", params=params)
+    assert resp.status_code == 200
+    assert resp.text == "echo-12345"
+
+    params["msg_signature"] = "bad"
+    assert client.get(f"/callback/{CORP_ID}", params=params).status_code == 403
+    assert client.get("/callback/ww_unconfigured", params=params).status_code == 404
+
+
+def test_events_are_deduplicated(client, crypto):
+    def post():
+        encrypted = crypto.encrypt(EVENT_XML)
+        body = f"<xml><ToUserName>{CORP_ID}</ToUserName><Encrypt><![CDATA[{encrypted}]]></Encrypt></xml>"
+        params = {"msg_signature": crypto.signature("1", "n", encrypted), "timestamp": "1", "nonce": "n"}
+        return client.post(f"/callback/{CORP_ID}", params=params, content=body)
+
+    # 企业微信重试时密文不同（随机前缀），但事件内容相同
+    for _ in range(3):
+        resp = post()
+        assert resp.status_code == 200
+        assert resp.text == "success"
+    assert len(client.queued) == 1
+    corp_id, event = client.queued[0]
+    assert corp_id == CORP_ID
+    assert event["ChangeType"] == "update_user"
+
+
+def test_garbled_plaintext_is_rejected(crypto):
+    # 解密后的消息体不是合法 UTF-8（如密文被篡改）时按校验失败处理
+    plain = os.urandom(16) + (4).to_bytes(4, "big") + b"\xff\xfe\xfd\xfc" + CORP_ID.encode()
+    pad = 32 - len(plain) % 32
+    encryptor = crypto._cipher.encryptor()
+    encrypted = base64.b64encode(
+        encryptor.update(plain + bytes([pad]) * pad) + encryptor.finalize()
+    ).decode()
+    with pytest.raises(CallbackError):
+        crypto.decrypt(encrypted)
+
+
+def test_oversized_callback_body_is_rejected(client, monkeypatch):
+    monkeypatch.setenv("MAX_REQUEST_BODY_SIZE", "1024")
+    params = {"msg_signature": "x", "timestamp": "1", "nonce": "n"}
+    resp = client.post(f"/callback/{CORP_ID}", params=params, content=b"<xml>" + b"a" * 2048)
+    assert resp.status_code == 413
+    assert client.queued == []
+
+
+def test_retry_skips_handlers_that_already_succeeded(monkeypatch):
+    calls = []
+
+    def first(corp_id, event):
+        calls.append("first")
+
+    def second(corp_id, event):
+        calls.append("second")
+        if calls.count("second") == 1:
+            raise RuntimeError("temporary failure")
+
+    monkeypatch.setitem(callbacks._handlers, "test_event", [first, second])
+    event = {"MsgType": "event", "Event": "test_event"}
+    assert callbacks.process_event.apply(args=(CORP_ID, event)).get() == 2
+    assert calls == ["first", "second", "second"]
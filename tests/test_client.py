@@ -0,0 +1,207 @@
+import json
+import pytest
+import httpx
+from fakeredis import FakeAsyncRedis
+from wecom.core.client import AsyncWeComClient, WeComClient
+from wecom.core.resilience import WeComAPIError
+from wecom.core.token_cache import AccessTokenCache
+
+
+def make_transport(calls):
+    """模拟企业微信 API，记录所有请求"""
+    def handler(request: httpx.Request):
+        calls.append(request)
+        if request.url.path.endswith("/service/get_provider_token"):
+            return httpx.Response(200, json={
+                "errcode": 0, "errmsg": "ok",
+                "provider_access_token": "token_abc", "expires_in": 7200
+            })
+        if request.url.path.endswith("/message/send"):
+            return httpx.Response(200, json={"errcode": 0, "errmsg": "ok"})
+        return httpx.Response(404)
+    return httpx.MockTransport(handler)
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def http(calls):
+    return httpx.AsyncClient(
+        base_url="https://qyapi.weixin.qq.com/cgi-bin",
+        transport=make_transport(calls)
+    )
+
+
+@pytest.mark.asyncio
+async def test_send_message_reuses_cached_token(http, calls):
+    client = AsyncWeComClient("corp_1", "secret_1", redis=FakeAsyncRedis(), http=http)
+
+    assert (await client.send_message("zhangsan", "hello"))["errcode"] == 0
+    assert (await client.send_message("lisi", "world"))["errcode"] == 0
+
+    paths = [req.url.path for req in calls]
+    assert paths.count("/cgi-bin/service/get_provider_token") == 1
+    assert paths.count("/cgi-bin/message/send") == 2
+
+    payload = json.loads(calls[-1].content)
+    assert payload["touser"] == "lisi"
+    assert calls[-1].url.params["access_token"] == "token_abc"
+
+
+@pytest.mark.asyncio
+async def test_token_error_raises(calls):
+    def handler(request):
+        return httpx.Response(200, json={"errcode": 40013, "errmsg": "invalid corpid"})
+    http = httpx.AsyncClient(base_url="https://qyapi.weixin.qq.com/cgi-bin",
+                             transport=httpx.MockTransport(handler))
+    client = AsyncWeComClient("bad_corp", "secret", redis=FakeAsyncRedis(), http=http)
+    with pytest.raises(Exception, match="invalid corpid"):
+        await client.get_access_token()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("response", [
+    httpx.Response(404, text="<html>Not Found</html>"),
+    httpx.Response(403, json={"message": "forbidden"}),
+    httpx.Response(200, json={"message": "blocked by proxy"}),
+])
+async def test_token_non_wecom_response_raises_api_error(response):
+    http = httpx.AsyncClient(base_url="https://qyapi.weixin.qq.com/cgi-bin",
+                             transport=httpx.MockTransport(lambda request: response))
+    client = AsyncWeComClient("corp_1", "secret", redis=FakeAsyncRedis(), http=http)
+    with pytest.raises(WeComAPIError):
+        await client.get_access_token()
+
+
+def test_sync_client_wraps_async(monkeypatch, calls):
+    monkeypatch.setattr(
+        "wecom.core.client.get_async_http_client",
+        lambda: httpx.AsyncClient(base_url="https://qyapi.weixin.qq.com/cgi-bin",
+                                  transport=make_transport(calls))
+    )
+    client = WeComClient("corp_2", "secret_2")
+    client._async._token_cache = AccessTokenCache(FakeAsyncRedis())
+    assert client.send_message("wangwu", "hi") == {"errcode": 0, "errmsg": "ok"}
+    assert client.access_token == "token_abc"
+
+
+def _client_with(handler, corp_id="corp_r"):
+    http = httpx.AsyncClient(base_url="https://qyapi.weixin.qq.com/cgi-bin",
+                             transport=httpx.MockTransport(handler))
+    return AsyncWeComClient(corp_id, "secret", redis=FakeAsyncRedis(), http=http)
+
+
+def _token_handler(send):
+    tokens = iter(f"token_{i}" for i in range(100))
+
+    def handler(request):
+        if request.url.path.endswith("get_provider_token"):
+            return httpx.Response(200, json={"errcode": 0, "provider_access_token": next(tokens)})
+        return send(request)
+    return handler
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr("wecom.core.client.backoff_delay", lambda attempt: 0)
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_refreshed_and_retried_once(no_backoff):
+    used = []
+
+    def send(request):
+        used.append(request.url.params["access_token"])
+        return httpx.Response(200, json={"errcode": 42001, "errmsg": "access_token expired"})
+
+    client = _client_with(_token_handler(send))
+    resp = await client.send_message("zhangsan", "hi")
+
+    assert resp["errcode"] == 42001
+    assert used == ["token_0", "token_1"]
+
+
+@pytest.mark.asyncio
+async def test_busy_is_retried_with_backoff(no_backoff):
+    responses = iter([{"errcode": -1, "errmsg": "system busy"}] * 2 + [{"errcode": 0, "errmsg": "ok"}])
+    client = _client_with(_token_handler(lambda r: httpx.Response(200, json=next(responses))))
+    assert (await client.send_message("zhangsan", "hi"))["errcode"] == 0
+
+
+@pytest.mark.asyncio
+async def test_post_not_retried_after_read_timeout(no_backoff):
+    sends = []
+
+    def send(request):
+        sends.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    client = _client_with(_token_handler(send))
+    with pytest.raises(httpx.ReadTimeout):
+        await client.send_message("zhangsan", "hi")
+    # 请求可能已送达，重试会造成重复消息
+    assert len(sends) == 1
+
+    gets = []
+    def get(request):
+        gets.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+    client = _client_with(_token_handler(get), corp_id="corp_r2")
+    with pytest.raises(httpx.ReadTimeout):
+        await client.get_follow_user_list()
+    assert len(gets) == 4
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_limits_retries(monkeypatch, no_backoff):
+    monkeypatch.setenv("WECOM_RETRY_BUDGET_MIN", "2")
+    monkeypatch.setenv("WECOM_RETRY_BUDGET_RATIO", "0")
+    monkeypatch.setenv("WECOM_BREAKER_FAILURES", "100")
+    sends = []
+
+    def send(request):
+        sends.append(request)
+        return httpx.Response(200, json={"errcode": -1, "errmsg": "system busy"})
+
+    client = _client_with(_token_handler(send))
+    for _ in range(3):
+        await client.send_message("zhangsan", "hi")
+    # 3 次请求 + 预算内的 2 次重试
+    assert len(sends) == 5
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_half_open_probe_closes_it(monkeypatch, no_backoff):
+    from wecom.core import resilience
+    monkeypatch.setenv("WECOM_RETRY_ATTEMPTS", "0")
+    monkeypatch.setenv("WECOM_BREAKER_FAILURES", "3")
+    monkeypatch.setenv("WECOM_BREAKER_OPEN_SECONDS", "30")
+    healthy = False
+    sends = []
+
+    def send(request):
+        sends.append(request)
+        if healthy:
+            return httpx.Response(200, json={"errcode": 0, "errmsg": "ok"})
+        return httpx.Response(503)
+
+    client = _client_with(_token_handler(send))
+    for _ in range(3):
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.send_message("zhangsan", "hi")
+    with pytest.raises(resilience.CircuitOpenError):
+        await client.send_message("zhangsan", "hi")
+    assert len(sends) == 3
+
+    # 其他企业不受影响
+    other = _client_with(_token_handler(lambda r: httpx.Response(200, json={"errcode": 0})), corp_id="other")
+    assert (await other.send_message("lisi", "hi"))["errcode"] == 0
+
+    breaker = resilience.get_guard("corp_r").breaker
+    breaker.opened_at -= 31
+    healthy = True
+    assert (await client.send_message("zhangsan", "hi"))["errcode"] == 0
+    assert breaker.state == breaker.CLOSED
@@ -46,4 +46,34 @@ def test_pool_config():
     settings = get_settings()
     assert settings.POOL_SIZE == 10
     assert settings.MAX_OVERFLOW == 5
-    assert settings.POOL_TIMEOUT == 30
\ No newline at end of file
+    assert settings.POOL_TIMEOUT == 30
+def test_settings_snapshot_cached(mock_env):
+    assert get_settings() is get_settings()
+
+def test_settings_immutable(mock_env):
+    settings = get_settings()
+    with pytest.raises(ValidationError):
+        settings.POOL_SIZE = 20
+
+def test_reload_notifies_subscribers(mock_env, monkeypatch):
+    from wecom.config import reload_settings, subscribe
+    from wecom.config import settings as settings_module
+    changes = []
+    monkeypatch.setattr(settings_module, "_listeners", [])
+    subscribe(lambda old, new: changes.append((old.POOL_SIZE, new.POOL_SIZE)))
+
+    old = get_settings()
+    monkeypatch.setenv("POOL_SIZE", "20")
+    assert get_settings().POOL_SIZE == old.POOL_SIZE  # 未重新加载前保持不变
+
+    new = reload_settings()
+    assert get_settings() is new
+    assert changes == [(old.POOL_SIZE, 20)]
+
+def test_invalid_reload_keeps_current(mock_env, monkeypatch):
+    from wecom.config import reload_settings
+    current = get_settings()
+    monkeypatch.setenv("POOL_SIZE", "not_a_number")
+    with pytest.raises(ValidationError):
+        reload_settings()
+    assert get_settings() is current
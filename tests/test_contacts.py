@@ -0,0 +1,196 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from wecom.core.contacts import ContactSync, ContactSyncError, load_checkpoints, save_page
+from wecom.db import Base, ExternalContact
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # 文件库：多个成员的分页在不同线程中并发写入
+    engine = create_engine(f"sqlite:///{tmp_path / 'contacts.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def _item(external_userid, userid, name=None):
+    return {
+        "external_contact": {"external_userid": external_userid, "name": name or external_userid, "type": 1},
+        "follow_info": {"userid": userid, "remark": "", "createtime": 1700000000, "tag_id": ["t1"]},
+    }
+
+
+class FakeClient:
+    """按成员返回分页客户，记录每次翻页请求"""
+    corp_id = "corp_1"
+
+    def __init__(self, contacts, fail_at=None):
+        self.contacts = contacts  # userid -> [external_userid]
+        self.fail_at = fail_at  # (userid, cursor) 时返回错误
+        self.pages = []
+        self.details = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_follow_user_list(self):
+        return {"errcode": 0, "follow_user": list(self.contacts)}
+
+    async def batch_get_external_contacts(self, userid_list, cursor="", limit=100):
+        userid = userid_list[0]
+        self.pages.append((userid, cursor))
+        if self.fail_at == (userid, cursor):
+            return {"errcode": 45009, "errmsg": "api freq out of limit"}
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        start = int(cursor or 0)
+        ids = self.contacts[userid][start:start + limit]
+        end = start + limit
+        return {
+            "errcode": 0,
+            "external_contact_list": [_item(e, userid) for e in ids],
+            "next_cursor": str(end) if end < len(self.contacts[userid]) else "",
+        }
+
+    async def get_external_contact(self, external_userid):
+        if external_userid not in self.details:
+            return {"errcode": 84061, "errmsg": "not external contact"}
+        return {"errcode": 0, **self.details[external_userid]}
+
+
+def _contacts(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(select(ExternalContact.follow_userid, ExternalContact.external_userid))
+        return sorted(tuple(r) for r in rows)
+
+
+@pytest.mark.asyncio
+async def test_full_sync_paginates_each_follow_user_concurrently(engine):
+    client = FakeClient({f"user{u}": [f"ext{u}_{i}" for i in range(25)] for u in range(6)})
+    sync = ContactSync(client, engine=engine, concurrency=3, page_size=10)
+
+    stats = await sync.run()
+
+    assert stats == {"users": 6, "skipped": 0, "contacts": 150, "removed": 0}
+    assert len(_contacts(engine)) == 150
+    assert [c for u, c in client.pages if u == "user0"] == ["", "10", "20"]
+    assert 1 < client.max_in_flight <= 3
+    assert all(cp["completed_at"] is not None for cp in load_checkpoints(engine, "corp_1").values())
+
+
+@pytest.mark.asyncio
+async def test_resume_from_checkpoint_and_skip_completed_users(engine):
+    client = FakeClient({"a": [f"a{i}" for i in range(30)], "b": ["b0"]}, fail_at=("a", "20"))
+    sync = ContactSync(client, engine=engine, page_size=10)
+    with pytest.raises(ContactSyncError):
+        await sync.run()
+    assert load_checkpoints(engine, "corp_1")["a"]["cursor"] == "20"
+
+    client.fail_at = None
+    client.pages.clear()
+    stats = await sync.run()
+
+    # b 已完成被跳过，a 从中断的游标继续
+    assert client.pages == [("a", "20")]
+    assert stats["skipped"] == 1
+    assert len(_contacts(engine)) == 31
+
+
+@pytest.mark.asyncio
+async def test_full_resync_removes_stale_contacts_and_follow_users(engine):
+    client = FakeClient({"a": ["x", "y"], "b": ["z"]})
+    sync = ContactSync(client, engine=engine)
+    await sync.run()
+
+    client.contacts = {"a": ["y"]}
+    stats = await sync.run(full=True)
+
+    assert _contacts(engine) == [("a", "y")]
+    assert stats["removed"] == 2
+    assert set(load_checkpoints(engine, "corp_1")) == {"a"}
+
+
+@pytest.mark.asyncio
+async def test_resume_since_redoes_users_completed_before_full_sync(engine):
+    client = FakeClient({"a": ["x"], "b": ["y"]})
+    sync = ContactSync(client, engine=engine)
+    await sync.run()
+    client.pages.clear()
+
+    # 全量同步开始前已完成的成员不能跳过
+    stats = await sync.run(since=datetime.now(timezone.utc))
+    assert sorted(client.pages) == [("a", ""), ("b", "")]
+    assert stats["skipped"] == 0
+
+
+def test_failed_full_sync_task_resumes_from_checkpoints(engine, monkeypatch):
+    from wecom.tasks import contacts as tasks
+
+    client = FakeClient({"a": ["a0"], "c": ["c0"], "b": [f"b{i}" for i in range(25)]})
+    sync = ContactSync(client, engine=engine, concurrency=1, page_size=10)
+    previous = ContactSync(FakeClient({"a": ["stale"], "c": ["c0"], "b": ["b0"]}), engine=engine)
+    asyncio.run(previous.run())
+
+    fetch = client.batch_get_external_contacts
+
+    async def fail_once(userid_list, cursor="", limit=100):
+        resp = await fetch(userid_list, cursor, limit)
+        if client.fail_at == (userid_list[0], cursor):
+            client.fail_at = None
+        return resp
+    client.batch_get_external_contacts = fail_once
+    client.fail_at = ("b", "10")
+    monkeypatch.setattr(tasks, "_contact_sync", lambda corp_id: sync)
+    monkeypatch.setattr(tasks, "_with_bucket", lambda s: s)
+
+    tasks.sync_contacts.apply(args=("corp_1",), kwargs={"full": True}).get()
+
+    # 重试时本轮已完成的 a、c 被跳过，b 从中断的游标继续，而不是从头开始
+    assert client.pages == [("a", ""), ("c", ""), ("b", ""), ("b", "10"), ("b", "10"), ("b", "20")]
+    assert len(_contacts(engine)) == 27
+    assert ("a", "stale") not in _contacts(engine)
+
+
+def test_resumed_page_keeps_rows_synced_since_start(engine):
+    started = datetime.now(timezone.utc) - timedelta(hours=1)
+    old = started - timedelta(days=1)
+    rows = lambda ids, at: [{
+        "corp_id": "corp_1", "external_userid": e, "follow_userid": "a", "synced_at": at
+    } for e in ids]
+    save_page(engine, "corp_1", "a", rows(["stale"], old), None, old)
+    save_page(engine, "corp_1", "a", rows(["p1"], started + timedelta(seconds=1)), "1", started)
+
+    removed = save_page(engine, "corp_1", "a", rows(["p2"], datetime.now(timezone.utc)), "", started)
+
+    assert removed == 1
+    assert _contacts(engine) == [("a", "p1"), ("a", "p2")]
+
+
+@pytest.mark.asyncio
+async def test_apply_change_events(engine):
+    client = FakeClient({"a": ["x"], "b": ["x"]})
+    sync = ContactSync(client, engine=engine)
+    await sync.run()
+
+    client.details["x"] = {
+        "external_contact": {"external_userid": "x", "name": "新名字", "type": 1},
+        "follow_user": [{"userid": "a", "remark": "vip", "createtime": 1, "tags": [{"tag_id": "t2"}]}],
+    }
+    assert await sync.apply_change({
+        "ChangeType": "edit_external_contact", "UserID": "a", "ExternalUserID": "x"
+    }) == 1
+    with engine.connect() as conn:
+        row = conn.execute(select(ExternalContact)).one()
+    assert (row.follow_userid, row.name, row.remark, row.tag_ids) == ("a", "新名字", "vip", ["t2"])
+
+    await sync.apply_change({"ChangeType": "del_follow_user", "UserID": "a", "ExternalUserID": "x"})
+    assert _contacts(engine) == []
+
+    # 详情接口返回关系不存在时视为删除
+    client.details.clear()
+    await sync.apply_change({"ChangeType": "add_external_contact", "UserID": "a", "ExternalUserID": "x"})
+    assert _contacts(engine) == []
@@ -83,7 +83,8 @@ def test_table_creation(test_db):
     expected_columns = {
         "id", "name", "is_active", "api_key", 
         "encrypted_secret", "wecom_corp_id",
-        "wecom_secret", "db_cluster", "created_at"
+        "wecom_secret", "db_cluster", "callback_token",
+        "encoding_aes_key", "created_at"
     }
     assert column_names == expected_columns
     
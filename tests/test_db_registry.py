@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import text
+from wecom.db import database
+from wecom.db.registry import ClusterCapacityError, EngineRegistry
+
+
+@pytest.fixture
+def clusters(tmp_path):
+    return {name: f"sqlite+aiosqlite:///{tmp_path / name}.db" for name in ("a", "b", "c")}
+
+
+@pytest.mark.asyncio
+async def test_engines_are_created_lazily_and_cached(clusters):
+    registry = EngineRegistry(clusters, pool_size=2, max_overflow=0, max_connections=10)
+    assert await registry.get_engine(None) is database.get_async_engine()
+    assert await registry.get_engine("unknown") is database.get_async_engine()
+    assert "a" not in registry
+
+    engine = await registry.get_engine("a")
+    assert await registry.get_engine("a") is engine
+    async with registry.session(engine) as db:
+        assert (await db.execute(text("select 1"))).scalar() == 1
+    await registry.dispose_all()
+
+
+@pytest.mark.asyncio
+async def test_lru_engine_is_disposed_at_connection_cap(clusters):
+    registry = EngineRegistry(clusters, pool_size=2, max_overflow=0, max_connections=4)
+    await registry.get_engine("a")
+    await registry.get_engine("b")
+    await registry.get_engine("a")  # b 成为最久未使用
+    await registry.get_engine("c")
+    assert "a" in registry and "c" in registry and "b" not in registry
+    assert registry.total_capacity <= 4
+    await registry.dispose_all()
+
+
+@pytest.mark.asyncio
+async def test_busy_engines_are_not_evicted(clusters):
+    registry = EngineRegistry(clusters, pool_size=1, max_overflow=0, max_connections=1)
+    engine = await registry.get_engine("a")
+    async with engine.connect():
+        with pytest.raises(ClusterCapacityError):
+            await registry.get_engine("b")
+    assert await registry.get_engine("b") is not None
+    assert "a" not in registry
+    await registry.dispose_all()
+
+
+@pytest.mark.asyncio
+async def test_dispose_idle(clusters):
+    registry = EngineRegistry(clusters, pool_size=1, max_overflow=0,
+                              max_connections=10, idle_timeout=60)
+    await registry.get_engine("a")
+    await registry.get_engine("b")
+    registry._last_used["a"] -= 120  # 两分钟前使用过
+    assert await registry.dispose_idle() == 1
+    assert "a" not in registry and "b" in registry
+    await registry.dispose_all()
@@ -0,0 +1,85 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from wecom.db import Base, Subscriber, database
+from wecom.db.routing import ReplicaSet, RoutingSession, use_primary
+
+
+async def make_db(path, company):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(Subscriber.__table__.insert(), [{
+            "id": 1, "company_name": company, "contact_email": "u@example.com",
+            "wecom_corp_id": "corp", "hashed_password": "x"
+        }])
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def routed(tmp_path, monkeypatch):
+    """主库与两个副本中同一订阅者的公司名不同，用于判断查询落在哪个库"""
+    await make_db(tmp_path / "primary.db", "primary")
+    await make_db(tmp_path / "r0.db", "replica0")
+    await make_db(tmp_path / "r1.db", "replica1")
+    primary = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    replicas = ReplicaSet(
+        [f"sqlite+aiosqlite:///{tmp_path / 'r0.db'}", f"sqlite+aiosqlite:///{tmp_path / 'r1.db'}"],
+        {"pool_size": 2, "max_overflow": 0}
+    )
+    monkeypatch.setattr(database, "get_async_engine", lambda: primary)
+    monkeypatch.setattr(database, "get_replicas", lambda: replicas)
+    factory = async_sessionmaker(primary, sync_session_class=RoutingSession, expire_on_commit=False)
+    yield factory, replicas
+    await replicas.dispose()
+    await primary.dispose()
+
+
+async def company(db):
+    return (await db.execute(select(Subscriber.company_name))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_session_sticks_to_one_replica(routed):
+    factory, _ = routed
+    seen = set()
+    for _ in range(2):
+        async with factory() as db:
+            # 同一会话内的读取都落在同一个副本
+            reads = {await company(db) for _ in range(4)}
+        assert len(reads) == 1
+        seen |= reads
+    # 不同会话轮询使用各个副本
+    assert seen == {"replica0", "replica1"}
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_replica_is_skipped(routed):
+    factory, replicas = routed
+    replicas.mark_down(replicas.engines[0])
+    async with factory() as db:
+        assert {await company(db) for _ in range(4)} == {"replica1"}
+    async with factory() as db:
+        assert await company(db) == "replica1"
+        # 选定的副本失效后改用其他可用的库
+        replicas.mark_down(replicas.engines[1])
+        assert await company(db) == "primary"
+    await replicas.check()
+    assert all(replicas.is_healthy(e) for e in replicas.engines)
+
+
+@pytest.mark.asyncio
+async def test_reads_stick_to_primary_after_write(routed):
+    factory, _ = routed
+    async with factory() as db:
+        assert await company(db) != "primary"
+        subscriber = await db.get(Subscriber, 1)
+        subscriber.company_name = "updated"
+        await db.commit()
+        # 写入后的读取必须看到自己的修改
+        assert await company(db) == "updated"
+
+    async with factory() as db:
+        use_primary(db)
+        assert await company(db) == "updated"
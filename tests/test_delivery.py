@@ -0,0 +1,134 @@
+import httpx
+import pytest
+from fakeredis import FakeRedis
+from wecom.core.resilience import CircuitOpenError, RequestNotSentError
+from wecom.tasks import delivery
+
+
+class FakeBucket:
+    def __init__(self, waits=()):
+        self.waits = list(waits)
+
+    def acquire(self, buckets):
+        return self.waits.pop(0) if self.waits else 0
+
+
+class FakeClient:
+    """按顺序返回预设的响应或抛出预设的异常"""
+    outcomes = []
+    sends = []
+
+    def __init__(self, corp_id, secret, agent_id=None):
+        self.secret = secret
+
+    def send_text(self, content, **batch):
+        FakeClient.sends.append((self.secret, batch))
+        outcome = FakeClient.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def deliver(monkeypatch):
+    FakeClient.sends = []
+    # eager 模式下每次 retry 都是递归调用，减少次数以免栈过深
+    monkeypatch.setattr(delivery, "MAX_SEND_ATTEMPTS", 3)
+    monkeypatch.setattr(delivery, "WeComClient", FakeClient)
+    monkeypatch.setattr(delivery, "get_secret", lambda corp_id: f"secret_of_{corp_id}")
+
+    def run(outcomes, waits=()):
+        FakeClient.outcomes = list(outcomes)
+        bucket = FakeBucket(waits)
+        monkeypatch.setattr(delivery, "get_token_bucket", lambda: bucket)
+        batch = {"touser": ["a", "b"], "toparty": [], "totag": []}
+        return delivery.deliver_batch.apply(args=("corp_1", 1000002, "hi", batch)).get()
+    return run
+
+
+def test_rate_limit_waits_do_not_use_up_send_attempts(deliver):
+    ok = {"errcode": 0, "errmsg": "ok"}
+    busy = {"errcode": -1, "errmsg": "system busy"}
+    waits = [1] * (delivery.MAX_SEND_ATTEMPTS * 3)
+
+    result = deliver([busy] * delivery.MAX_SEND_ATTEMPTS + [ok], waits=waits)
+
+    assert result["resp"] == ok
+    assert len(FakeClient.sends) == delivery.MAX_SEND_ATTEMPTS + 1
+    # secret 在 worker 内加载，不是任务参数
+    assert FakeClient.sends[0][0] == "secret_of_corp_1"
+
+
+def test_send_attempts_are_bounded(deliver):
+    busy = {"errcode": 45009, "errmsg": "freq limit"}
+    result = deliver([busy] * (delivery.MAX_SEND_ATTEMPTS + 1))
+    assert result["resp"] == busy
+    assert len(FakeClient.sends) == delivery.MAX_SEND_ATTEMPTS + 1
+
+
+def test_only_unsent_errors_are_resent(deliver):
+    ok = {"errcode": 0, "errmsg": "ok"}
+    result = deliver([RequestNotSentError(-1, "connect failed", "message/send"),
+                      CircuitOpenError("corp_1", 0), ok])
+    assert result["resp"] == ok
+    assert len(FakeClient.sends) == 3
+
+    # 读超时时请求可能已送达，重发会造成重复消息
+    FakeClient.sends.clear()
+    result = deliver([httpx.ReadTimeout("timed out"), ok])
+    assert result["resp"]["errcode"] == -1
+    assert len(FakeClient.sends) == 1
+
+
+class FakeGroupResult:
+    def __init__(self, results):
+        self.id = "group_1"
+        self.results = results
+        self.saved = False
+
+    def save(self):
+        self.saved = True
+
+    def completed_count(self):
+        return len(self.results)
+
+    def ready(self):
+        return True
+
+
+class FakeTaskResult:
+    def __init__(self, result):
+        self.result = result
+
+    def successful(self):
+        return True
+
+
+def test_bulk_status_is_only_visible_to_owner(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(delivery, "get_sync_redis", lambda: redis)
+    signatures = []
+
+    class FakeGroup:
+        def __init__(self, sigs):
+            signatures.extend(sigs)
+
+        def apply_async(self):
+            return FakeGroupResult([None] * len(signatures))
+
+    monkeypatch.setattr(delivery, "group", FakeGroup)
+    result = delivery.enqueue_bulk("corp_1", 1000002, "hi", touser=[f"u{i}" for i in range(1500)])
+
+    assert result.saved and len(signatures) == 2
+    assert all("secret" not in repr(sig.args) for sig in signatures)
+    assert signatures[0].args[:3] == ("corp_1", 1000002, "hi")
+
+    batch = {"touser": ["u0"], "toparty": [], "totag": []}
+    done = FakeGroupResult([FakeTaskResult({"batch": batch, "resp": {"errcode": 0, "errmsg": "ok"}})])
+    monkeypatch.setattr(delivery.GroupResult, "restore", lambda group_id, app=None: done)
+
+    assert delivery.get_bulk_status("group_1", "corp_2") is None
+    assert delivery.get_bulk_status("group_unknown", "corp_1") is None
+    status = delivery.get_bulk_status("group_1", "corp_1")
+    assert status["completed"] == 1
+    assert status["result"]["recipients"] == {"u0": "sent"}
@@ -0,0 +1,263 @@
+import hashlib
+import hmac
+from types import SimpleNamespace
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from fakeredis import FakeAsyncRedis
+from pydantic import BaseModel
+from wecom.core import auth
+from wecom.core.auth import EnterpriseAuthenticator, SecretManager
+from wecom.core.ratelimit import SlidingWindowLimiter
+from wecom.db import database
+from wecom.dependencies import get_current_enterprise, verified_body
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def scalars(self):
+        return self
+
+    def first(self):
+        return self.row
+
+
+class FakeSession:
+    """只记录查询次数的异步数据库会话"""
+    def __init__(self, enterprise=None):
+        self.enterprise = enterprise
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        return FakeResult(self.enterprise)
+
+
+class Enterprise:
+    id = 1
+    name = "Test Corp"
+    is_active = True
+    api_key = "api_key_1"
+    wecom_corp_id = "corp_1"
+    wecom_secret = "wecom_secret_1"
+    db_cluster = None
+
+
+class FakeRequest:
+    def __init__(self, body: bytes, api_key: str, signature: str, chunk_size: int = 4):
+        self.chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        self.headers = {"X-API-Key": api_key, "X-Signature": signature}
+        self.state = SimpleNamespace()
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def sign(secret: str, body: bytes) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    auth.credential_cache.clear()
+    yield
+    auth.credential_cache.clear()
+
+
+@pytest.fixture
+def secret_manager():
+    return SecretManager()
+
+
+@pytest.fixture
+def enterprise(secret_manager):
+    ent = Enterprise()
+    ent.encrypted_secret = secret_manager.encrypt_secret("client_secret")
+    return ent
+
+
+@pytest.mark.asyncio
+async def test_credentials_cached_after_first_request(enterprise, secret_manager):
+    session = FakeSession(enterprise)
+    authenticator = EnterpriseAuthenticator(session, secret_manager=secret_manager)
+    body = b'{"content": "hi"}'
+
+    for _ in range(3):
+        result = await authenticator.authenticate_request(
+            FakeRequest(body, "api_key_1", sign("client_secret", body))
+        )
+    assert result["enterprise_id"] == 1
+    assert result["wecom_config"]["corp_id"] == "corp_1"
+    assert session.queries == 1
+
+
+@pytest.mark.asyncio
+async def test_invalid_api_key_is_negatively_cached(secret_manager):
+    session = FakeSession(None)
+    authenticator = EnterpriseAuthenticator(session, secret_manager=secret_manager)
+    for _ in range(3):
+        with pytest.raises(HTTPException) as exc:
+            await authenticator.authenticate_request(FakeRequest(b"", "unknown", "sig"))
+        assert exc.value.status_code == 403
+    assert session.queries == 1
+
+
+@pytest.mark.asyncio
+async def test_bad_signature_rejected(enterprise, secret_manager):
+    authenticator = EnterpriseAuthenticator(FakeSession(enterprise), secret_manager=secret_manager)
+    with pytest.raises(HTTPException) as exc:
+        await authenticator.authenticate_request(
+            FakeRequest(b"body", "api_key_1", sign("wrong_secret", b"body"))
+        )
+    assert exc.value.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_invalidation_drops_cached_entry(monkeypatch, enterprise, secret_manager):
+    published = []
+    monkeypatch.setattr(auth, "get_sync_redis", lambda: type(
+        "R", (), {"publish": lambda self, ch, msg: published.append((ch, msg))})())
+    session = FakeSession(enterprise)
+    await EnterpriseAuthenticator(session, secret_manager=secret_manager).load_credentials("api_key_1")
+    assert "api_key_1" in auth.credential_cache
+
+    auth.invalidate_enterprise_credentials("api_key_1")
+    assert "api_key_1" not in auth.credential_cache
+    assert published == [(auth.INVALIDATION_CHANNEL, "api_key_1")]
+
+
+@pytest.mark.asyncio
+async def test_streamed_body_is_verified_and_kept(enterprise, secret_manager):
+    authenticator = EnterpriseAuthenticator(FakeSession(enterprise), secret_manager=secret_manager)
+    body = b'{"content": "hello", "touser": ["zhangsan", "lisi"]}'
+    request = FakeRequest(body, "api_key_1", sign("client_secret", body))
+    await authenticator.authenticate_request(request)
+    assert request.state.verified_body == body
+    assert request._body == body
+
+
+@pytest.mark.asyncio
+async def test_oversized_body_rejected(monkeypatch, enterprise, secret_manager):
+    monkeypatch.setenv("MAX_REQUEST_BODY_SIZE", "16")
+    authenticator = EnterpriseAuthenticator(FakeSession(enterprise), secret_manager=secret_manager)
+    body = b"x" * 17
+    with pytest.raises(HTTPException) as exc:
+        await authenticator.authenticate_request(
+            FakeRequest(body, "api_key_1", sign("client_secret", body))
+        )
+    assert exc.value.status_code == 413
+
+    # Content-Length 超限时不读取请求体
+    request = FakeRequest(body, "api_key_1", sign("client_secret", body))
+    request.headers["content-length"] = "17"
+    request.chunks = None
+    with pytest.raises(HTTPException) as exc:
+        await authenticator.authenticate_request(request)
+    assert exc.value.status_code == 413
+
+
+class Message(BaseModel):
+    content: str
+
+
+def test_handler_receives_verified_body(monkeypatch, enterprise, secret_manager):
+    monkeypatch.setattr(auth, "get_secret_manager", lambda: secret_manager)
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(message: Message = Depends(verified_body(Message))):
+        return {"content": message.content}
+
+    app.dependency_overrides[database.get_db] = lambda: FakeSession(enterprise)
+    client = TestClient(app)
+    body = b'{"content": "hi"}'
+    resp = client.post("/echo", content=body, headers={
+        "X-API-Key": "api_key_1", "X-Signature": sign("client_secret", body)
+    })
+    assert resp.status_code == 200
+    assert resp.json() == {"content": "hi"}
+
+    bad = b'{"text": "hi"}'
+    resp = client.post("/echo", content=bad, headers={
+        "X-API-Key": "api_key_1", "X-Signature": sign("client_secret", bad)
+    })
+    assert resp.status_code == 422
+
+
+def test_request_quota_by_subscription_tier(monkeypatch, enterprise, secret_manager):
+    monkeypatch.setattr(auth, "get_secret_manager", lambda: secret_manager)
+    monkeypatch.setenv("RATE_LIMIT_REQUESTS", '{"basic": 1, "premium": 2}')
+    limiter = SlidingWindowLimiter(FakeAsyncRedis(), timeout=1)
+    monkeypatch.setattr("wecom.dependencies.get_rate_limiter", lambda: limiter)
+    enterprise.subscription_tier = "premium"
+    app = FastAPI()
+
+    @app.post("/ping")
+    async def ping(enterprise: dict = Depends(get_current_enterprise)):
+        return {"tier": enterprise["subscription_tier"]}
+
+    app.dependency_overrides[database.get_db] = lambda: FakeSession(enterprise)
+    client = TestClient(app)
+    headers = {"X-API-Key": "api_key_1", "X-Signature": sign("client_secret", b"")}
+
+    first, second, third = (client.post("/ping", headers=headers) for _ in range(3))
+    assert first.json() == {"tier": "premium"}
+    assert (first.headers["RateLimit-Limit"], first.headers["RateLimit-Remaining"]) == ("2", "1")
+    assert second.headers["RateLimit-Remaining"] == "0"
+    assert third.status_code == 429
+    assert int(third.headers["Retry-After"]) >= 1
+    assert third.headers["RateLimit-Remaining"] == "0"
+
+
+def test_register_does_not_accept_subscription_tier():
+    from wecom.models.subscription_models import SubscriberCreate
+
+    subscriber = SubscriberCreate(
+        company_name="acme", contact_email="a@example.com", wecom_corp_id="corp_1",
+        password="pw", subscription_tier="enterprise",
+    )
+    assert "subscription_tier" not in subscriber.model_dump()
+
+
+def test_rotating_api_key_invalidates_old_and_new_key(monkeypatch, enterprise):
+    from wecom.core import services
+
+    invalidated = []
+    monkeypatch.setattr(services, "invalidate_enterprise_credentials", invalidated.append)
+    monkeypatch.setattr(services, "invalidate_corp", lambda corp_id: None)
+    db = SimpleNamespace(get=lambda model, pk: enterprise, commit=lambda: None)
+    old_key = enterprise.api_key
+
+    services.update_enterprise(db, 1, api_key="api_key_2")
+    assert invalidated == [old_key, "api_key_2"]
+
+
+def test_corp_invalidation_evicts_worker_secrets_and_callback_config(monkeypatch):
+    from wecom.core import callback, services
+    from wecom.tasks import delivery
+
+    published = []
+    monkeypatch.setattr(auth, "get_sync_redis", lambda: type(
+        "R", (), {"publish": lambda self, ch, msg: published.append((ch, msg))})())
+    monkeypatch.setattr(services, "invalidate_enterprise_credentials", lambda api_key: None)
+    ent = SimpleNamespace(api_key="api_key_1", wecom_corp_id="corp_1")
+    db = SimpleNamespace(get=lambda model, pk: ent, commit=lambda: None)
+
+    delivery._secrets.set("corp_1", "secret_1")
+    callback._cryptos.set("corp_1", object())
+    services.deactivate_enterprise(db, 1)
+    assert "corp_1" not in delivery._secrets and "corp_1" not in callback._cryptos
+    assert published == [(auth.INVALIDATION_CHANNEL, "corp:corp_1")]
+
+    # 其他进程收到通知后同样清除
+    delivery._secrets.set("corp_1", "secret_1")
+    callback._cryptos.set("corp_1", object())
+    auth._handle_invalidation(b"corp:corp_1")
+    assert "corp_1" not in delivery._secrets and "corp_1" not in callback._cryptos
+
+
+def test_authenticators_share_one_secret_manager():
+    assert EnterpriseAuthenticator(None).secret_manager is EnterpriseAuthenticator(None).secret_manager
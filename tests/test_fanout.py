@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from wecom.core.fanout import pack_recipients, send_bulk
+
+
+class FakeClient:
+    """记录每次发送的接收人，并按规则返回企业微信响应"""
+    corp_id = "corp_1"
+
+    def __init__(self, invalid=(), fail_batches=()):
+        self.invalid = set(invalid)
+        self.fail_batches = set(fail_batches)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_text(self, content, touser=(), toparty=(), totag=()):
+        index = len(self.calls)
+        self.calls.append({"touser": list(touser), "toparty": list(toparty), "totag": list(totag)})
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        if index in self.fail_batches:
+            return {"errcode": 45009, "errmsg": "api freq out of limit"}
+        invalid = [u for u in touser if u in self.invalid]
+        return {"errcode": 0, "errmsg": "ok", "invaliduser": "|".join(invalid)}
+
+
+def test_pack_recipients_into_maximal_batches():
+    users = (f"user{i}" for i in range(2500))
+    parties = [str(i) for i in range(150)]
+    batches = list(pack_recipients(users, toparty=parties, totag=["1"]))
+
+    assert [len(b["touser"]) for b in batches] == [1000, 1000, 500]
+    assert [len(b["toparty"]) for b in batches] == [100, 50, 0]
+    assert [b["totag"] for b in batches] == [["1"], [], []]
+
+
+def test_pack_parties_beyond_user_batches():
+    batches = list(pack_recipients([], toparty=[str(i) for i in range(250)]))
+    assert [len(b["toparty"]) for b in batches] == [100, 100, 50]
+    assert all(b["touser"] == [] for b in batches)
+
+
+@pytest.mark.asyncio
+async def test_send_bulk_maps_results_to_recipients():
+    client = FakeClient(invalid={"user5", "user1500"}, fail_batches={2})
+    users = [f"user{i}" for i in range(2100)]
+
+    result = await send_bulk(client, "hello", touser=iter(users), concurrency=2)
+
+    assert result["batches"] == 3
+    assert result["failed_batches"] == 1
+    assert result["errors"][0]["errcode"] == 45009
+    assert client.max_in_flight <= 2
+    failed = set(client.calls[2]["touser"])
+    assert len(result["recipients"]) == 2100
+    assert result["recipients"]["user5"] == "invalid"
+    assert result["recipients"]["user1500"] == ("failed" if "user1500" in failed else "invalid")
+    assert all(result["recipients"][u] == "failed" for u in failed)
+    sent = [u for u, s in result["recipients"].items() if s == "sent"]
+    assert len(sent) == 2100 - len(failed) - len({"user5", "user1500"} - failed)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_send_bulk_leaves_no_batches_sending():
+    class SlowClient(FakeClient):
+        completed = 0
+
+        async def send_text(self, content, **batch):
+            self.calls.append(batch)
+            await asyncio.sleep(0.05)
+            self.completed += 1
+            return {"errcode": 0, "errmsg": "ok"}
+
+    client = SlowClient()
+    users = [f"user{i}" for i in range(5000)]
+    send = asyncio.create_task(send_bulk(client, "hello", touser=users, concurrency=2))
+    while not client.calls:
+        await asyncio.sleep(0)
+    send.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await send
+
+    await asyncio.sleep(0.1)
+    # 取消后不再开始新的批次，在途的批次也随之取消
+    assert len(client.calls) <= 2
+    assert client.completed == 0
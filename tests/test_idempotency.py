@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from fakeredis import FakeAsyncRedis
+from wecom.core.idempotency import IdempotencyConflict, IdempotencyKeyReused, IdempotencyStore
+
+
+class Counter:
+    def __init__(self, delay=0.0, fail=False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("wecom down")
+        return {"sent": self.calls}
+
+
+def _store(redis=None, **kwargs):
+    return IdempotencyStore(redis or FakeAsyncRedis(), ttl=60, lock_ttl=10, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_replay_returns_first_response():
+    store, send = _store(), Counter()
+    assert await store.run("corp", "k1", "h", send) == ({"sent": 1}, False)
+    assert await store.run("corp", "k1", "h", send) == ({"sent": 1}, True)
+    assert send.calls == 1
+    # 不同企业的相同 Key 互不影响
+    assert await store.run("corp2", "k1", "h", send) == ({"sent": 2}, False)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_are_coalesced():
+    store, send = _store(), Counter(delay=0.05)
+    results = await asyncio.gather(*(store.run("corp", "k1", "h", send) for _ in range(10)))
+
+    assert send.calls == 1
+    assert {r[0]["sent"] for r in results} == {1}
+    assert sum(1 for _, replayed in results if not replayed) == 1
+
+
+@pytest.mark.asyncio
+async def test_duplicate_in_other_process_waits_for_result():
+    redis = FakeAsyncRedis()
+    first, second = _store(redis), _store(redis, wait_timeout=2)
+    send = Counter(delay=0.2)
+
+    results = await asyncio.gather(
+        first.run("corp", "k1", "h", send),
+        second.run("corp", "k1", "h", send),
+    )
+    assert send.calls == 1
+    assert results[1] == ({"sent": 1}, True)
+
+
+@pytest.mark.asyncio
+async def test_wait_timeout_raises_conflict():
+    redis = FakeAsyncRedis()
+    slow = Counter(delay=0.5)
+    task = asyncio.create_task(_store(redis).run("corp", "k1", "h", slow))
+    await asyncio.sleep(0.01)
+    with pytest.raises(IdempotencyConflict):
+        await _store(redis, wait_timeout=0.1).run("corp", "k1", "h", Counter())
+    await task
+
+
+@pytest.mark.asyncio
+async def test_failure_releases_key_for_retry():
+    store = _store()
+    with pytest.raises(RuntimeError):
+        await store.run("corp", "k1", "h", Counter(fail=True))
+    assert await store.run("corp", "k1", "h", Counter()) == ({"sent": 1}, False)
+
+
+@pytest.mark.asyncio
+async def test_key_reused_with_different_body():
+    store = _store()
+    await store.run("corp", "k1", "h1", Counter())
+    with pytest.raises(IdempotencyKeyReused):
+        await store.run("corp", "k1", "h2", Counter())
+
+
+@pytest.mark.asyncio
+async def test_lock_is_extended_while_running():
+    redis = FakeAsyncRedis()
+    first = IdempotencyStore(redis, ttl=60, lock_ttl=1)
+    second = IdempotencyStore(redis, ttl=60, lock_ttl=1, wait_timeout=3)
+    # 执行时间超过占位过期时间，未续期时第二个进程会在占位过期后重复执行
+    send = Counter(delay=1.5)
+
+    task = asyncio.create_task(first.run("corp", "k1", "h", send))
+    await asyncio.sleep(0.01)
+    assert await second.run("corp", "k1", "h", send) == ({"sent": 1}, True)
+    assert await task == ({"sent": 1}, False)
+    assert send.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_lock_is_not_extended_for_new_owner():
+    redis = FakeAsyncRedis()
+    store = IdempotencyStore(redis, ttl=60, lock_ttl=1)
+    send = Counter(delay=0.5)
+
+    task = asyncio.create_task(store.run("corp", "k1", "h", send))
+    await asyncio.sleep(0.01)
+    # 模拟占位过期后被其他进程重新占用
+    await redis.set("wecom:idempotency:corp:k1", '{"state": "pending", "hash": "h", "owner": "other"}', ex=1)
+    await asyncio.sleep(0.4)
+    assert 0 < await redis.pttl("wecom:idempotency:corp:k1") <= 700
+    await task
@@ -0,0 +1,57 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fakeredis import FakeAsyncRedis
+from prometheus_client import REGISTRY
+from wecom.core.client import AsyncWeComClient
+from wecom.core.metrics import MetricsMiddleware
+from wecom.routers import metrics
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_request_latency_labelled_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    labels = {"method": "GET", "route": "/items/{item_id}", "status": "200"}
+    before = sample("wecom_http_request_duration_seconds_count", labels)
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    assert sample("wecom_http_request_duration_seconds_count", labels) == before + 2
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "wecom_http_request_duration_seconds" in response.text
+
+
+@pytest.mark.asyncio
+async def test_wecom_errcode_counted_per_corp(monkeypatch):
+    # 频率限制会被重试，这里只统计单次调用
+    monkeypatch.setenv("WECOM_RETRY_ATTEMPTS", "0")
+
+    def handler(request):
+        if request.url.path.endswith("get_provider_token"):
+            return httpx.Response(200, json={"errcode": 0, "provider_access_token": "t"})
+        return httpx.Response(200, json={"errcode": 45009, "errmsg": "api freq out of limit"})
+
+    http = httpx.AsyncClient(base_url="https://qyapi.weixin.qq.com/cgi-bin",
+                             transport=httpx.MockTransport(handler))
+    client = AsyncWeComClient("corp_metrics", "secret", redis=FakeAsyncRedis(), http=http)
+    labels = {"corp_id": "corp_metrics", "api": "message/send", "errcode": "45009"}
+    before = sample("wecom_api_errors_total", labels)
+
+    await client.send_message("zhangsan", "hello")
+
+    assert sample("wecom_api_errors_total", labels) == before + 1
+    assert sample("wecom_api_request_duration_seconds_count",
+                  {"corp_id": "corp_metrics", "api": "message/send"}) >= 1
@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import create_engine
+
+pytest.importorskip("alembic")
+from alembic import command  # noqa: E402
+from alembic.autogenerate import compare_metadata  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from alembic.migration import MigrationContext  # noqa: E402
+
+from wecom.db import Base  # noqa: E402
+
+
+@pytest.fixture
+def alembic_config(tmp_path):
+    config = Config()
+    config.set_main_option("script_location", "wecom.db:migrations")
+    config.set_main_option("sqlalchemy.url", f"sqlite:///{tmp_path / 'migrate.db'}")
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def test_migrations_match_models(alembic_config):
+    command.upgrade(alembic_config, "head")
+    engine = create_engine(alembic_config.get_main_option("sqlalchemy.url"))
+    with engine.connect() as conn:
+        diff = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+    engine.dispose()
+    assert diff == []
+
+    command.downgrade(alembic_config, "base")
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from wecom.core.pagination import decode_cursor, encode_cursor
+from wecom.db import Base, Enterprise, Subscriber, crud
+
+
+@pytest_asyncio.fixture
+async def db():
+    """SQLite 内存库，仅用于验证查询逻辑"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        for i in (1, 2):
+            session.add(Subscriber(
+                id=i, company_name=f"公司{i}", contact_email=f"u{i}@example.com",
+                wecom_corp_id=f"corp_{i}", hashed_password="x"
+            ))
+        await session.commit()
+        yield session
+    await engine.dispose()
+
+
+def test_cursor_roundtrip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination_walks_all_records(db):
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(125):
+        # 每3条共享同一时间戳，验证 id 作为次级排序键
+        rows.append({
+            "subscriber_id": 1, "recipient": f"user{i}", "content": "hi",
+            "status": "sent", "created_at": start + timedelta(seconds=i // 3)
+        })
+    rows.append({"subscriber_id": 2, "recipient": "other", "status": "sent", "created_at": start})
+    await crud.create_notifications(db, rows)
+
+    seen, before = [], None
+    while True:
+        page = await crud.list_notifications(db, 1, 50, before)
+        seen.extend(page)
+        if len(page) < 50:
+            break
+        before = decode_cursor(encode_cursor(page[-1].created_at, page[-1].id))
+
+    assert len(seen) == 125
+    assert len({n.id for n in seen}) == 125
+    keys = [(n.created_at, n.id) for n in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert all(n.subscriber_id == 1 for n in seen)
+
+
+@pytest.mark.asyncio
+async def test_deliveries_are_attributed_to_linked_subscriber_only(monkeypatch):
+    from wecom.core import notifications
+
+    written = []
+
+    async def put_many(rows, cluster=None):
+        written.extend(dict(r, cluster=cluster) for r in rows)
+    monkeypatch.setattr(notifications.notification_writer, "put_many", put_many)
+    enterprise = {"enterprise_id": 7, "subscriber_id": None, "db_cluster": "a",
+                  "wecom_config": {"corp_id": "corp_1"}}
+
+    # 未经管理员关联的企业不记录，即使有订阅者自称属于该 corp_id
+    assert await notifications.record_deliveries(enterprise, "hi", {"a": "sent"}) == 0
+    enterprise["subscriber_id"] = 2
+    assert await notifications.record_deliveries(enterprise, "hi", {"a": "sent", "b": "invalid"}) == 2
+    # 记录写入企业所在的集群
+    assert {(r["subscriber_id"], r["enterprise_id"], r["recipient"], r["cluster"]) for r in written} == {
+        (2, 7, "a", "a"), (2, 7, "b", "a")
+    }
+
+
+@pytest.mark.asyncio
+async def test_subscriber_cluster_follows_linked_enterprise(db):
+    assert await crud.get_subscriber_cluster(db, 1) is None
+    db.add(Enterprise(
+        name="企业1", api_key="k1", encrypted_secret=b"x", wecom_corp_id="corp_1",
+        wecom_secret="s1", db_cluster="a", subscriber_id=1
+    ))
+    await db.commit()
+    assert await crud.get_subscriber_cluster(db, 1) == "a"
+    assert await crud.get_subscriber_cluster(db, 2) is None
+
+
+def test_subscriber_enterprises_must_share_a_cluster():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from wecom.core import services
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(Subscriber(id=1, company_name="公司1", contact_email="u1@example.com",
+                          wecom_corp_id="corp_1", hashed_password="x"))
+        for i, cluster in ((1, "a"), (2, None)):
+            db.add(Enterprise(id=i, name=f"企业{i}", api_key=f"k{i}", encrypted_secret=b"x",
+                              wecom_corp_id=f"corp_{i}", wecom_secret=f"s{i}", db_cluster=cluster))
+        db.commit()
+
+        services.update_enterprise(db, 1, subscriber_id=1)
+        # 企业2在默认库，不能与企业1关联到同一订阅者
+        with pytest.raises(ValueError):
+            services.update_enterprise(db, 2, subscriber_id=1)
+        assert db.get(Enterprise, 2).subscriber_id is None
+        services.update_enterprise(db, 2, db_cluster="a", subscriber_id=1)
+        with pytest.raises(ValueError):
+            services.update_enterprise(db, 1, db_cluster="b")
+    engine.dispose()
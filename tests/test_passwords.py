@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from wecom.core.passwords import PasswordHasher
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify():
+    hasher = PasswordHasher(max_workers=2, max_pending=4, rounds=4)
+    hashed = await hasher.hash("securepassword123")
+    assert await hasher.verify("securepassword123", hashed)
+    assert not await hasher.verify("wrongpassword", hashed)
+
+
+@pytest.mark.asyncio
+async def test_rehash_when_rounds_change():
+    old = PasswordHasher(rounds=4)
+    hashed = await old.hash("securepassword123")
+    assert await old.verify_and_update("securepassword123", hashed) == (True, None)
+
+    new = PasswordHasher(rounds=5)
+    verified, new_hash = await new.verify_and_update("securepassword123", hashed)
+    assert verified
+    assert new_hash.startswith("$2b$05$")
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_full():
+    """在途任务达到上限时返回 503，而不是无限排队"""
+    hasher = PasswordHasher(max_workers=1, max_pending=2, rounds=10)
+    results = await asyncio.gather(
+        *(hasher.hash("securepassword123") for _ in range(4)),
+        return_exceptions=True
+    )
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 2
+    assert rejected[0].status_code == 503
+    assert rejected[0].headers["Retry-After"] == "1"
+    assert hasher.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_event_loop_not_blocked():
+    hasher = PasswordHasher(max_workers=1, max_pending=4, rounds=12)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    await hasher.hash("securepassword123")
+    task.cancel()
+    assert ticks > 5
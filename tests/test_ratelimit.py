@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+from fakeredis import FakeRedis, FakeAsyncRedis
+from wecom.core.ratelimit import (
+    AsyncTokenBucket, Bucket, LocalSlidingWindow, SlidingWindowLimiter, TokenBucket, Window,
+    quota_windows, wecom_buckets
+)
+
+
+def test_bucket_allows_burst_then_throttles():
+    bucket = TokenBucket(FakeRedis())
+    buckets = [Bucket("test:corp", 10, 5)]
+
+    assert [bucket.try_acquire(buckets) for _ in range(5)] == [0] * 5
+    wait = bucket.try_acquire(buckets)
+    assert 0 < wait <= 0.1
+
+
+def test_all_buckets_must_have_tokens():
+    bucket = TokenBucket(FakeRedis())
+    corp = Bucket("test:corp", 100, 100)
+    agent = Bucket("test:agent", 1, 1)
+
+    assert bucket.try_acquire([corp, agent]) == 0
+    assert bucket.try_acquire([corp, agent]) > 0
+    # agent 桶拒绝时 corp 桶不应被扣减
+    assert [bucket.try_acquire([corp]) for _ in range(99)] == [0] * 99
+
+
+def test_acquire_gives_up_after_max_wait():
+    bucket = TokenBucket(FakeRedis())
+    slow = [Bucket("test:slow", 0.1, 1)]
+    assert bucket.acquire(slow, max_wait=0.5) == 0
+    assert bucket.acquire(slow, max_wait=0.5) > 0.5
+
+
+def test_wecom_buckets_per_corp_and_agent():
+    keys = [b.key for b in wecom_buckets("corp_1", 1000002)]
+    assert keys == ["wecom:ratelimit:corp:corp_1", "wecom:ratelimit:agent:corp_1:1000002"]
+
+
+@pytest.mark.asyncio
+async def test_async_bucket_waits_for_refill():
+    bucket = AsyncTokenBucket(FakeAsyncRedis())
+    buckets = [Bucket("test:async", 50, 1)]
+    await bucket.acquire(buckets)
+    await bucket.acquire(buckets)
+    assert await bucket.try_acquire(buckets) > 0
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_limits_and_reports_remaining():
+    limiter = SlidingWindowLimiter(FakeAsyncRedis(), timeout=1)
+    windows = [Window("test:quota", 5, 60000)]
+
+    results = [await limiter.hit(windows) for _ in range(5)]
+    assert all(r.allowed for r in results)
+    assert [r.remaining for r in results] == [4, 3, 2, 1, 0]
+    assert results[0].limit == 5 and 0 < results[0].reset <= 60
+
+    rejected = await limiter.hit(windows)
+    assert not rejected.allowed
+    assert rejected.remaining == 0
+    assert 0 < rejected.retry_after <= 60
+    # 按发送量计数时超出部分整体拒绝，不占用额度
+    assert not (await limiter.hit([Window("test:sends", 10, 60000)], cost=11)).allowed
+    assert (await limiter.hit([Window("test:sends", 10, 60000)], cost=10)).allowed
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_weights_previous_window():
+    redis = FakeAsyncRedis()
+    limiter = SlidingWindowLimiter(redis, timeout=1)
+    window = Window("test:weighted", 100, 3600 * 1000)
+    seconds, micros = await redis.time()
+    now_ms = int(seconds) * 1000 + int(micros) // 1000
+    start = now_ms - now_ms % window.window
+    # 上一窗口用满，按当前窗口已过去的比例折算
+    await redis.hset(window.key, mapping={"start": start - window.window, "curr": 100, "prev": 0})
+
+    result = await limiter.hit([window])
+    used = 100 * (window.window - (now_ms - start)) / window.window
+    assert abs(result.remaining - (int(100 - used) - 1)) <= 1
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_local_counters_when_redis_is_slow():
+    class SlowRedis(FakeAsyncRedis):
+        def register_script(self, script):
+            async def slow(keys, args):
+                await asyncio.sleep(1)
+            return slow
+
+    limiter = SlidingWindowLimiter(SlowRedis(), timeout=0.01, local=LocalSlidingWindow(share=2))
+    windows = [Window("test:local", 6, 60000)]
+
+    results = [await limiter.hit(windows) for _ in range(4)]
+    # 进程内额度为 6 / 2 个 worker
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert results[0].limit == 3
+
+
+def test_quota_windows_by_tier(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_REQUESTS", '{"basic": 10, "premium": 100, "enterprise": 0}')
+    assert quota_windows("key", "premium", "requests")[0].limit == 100
+    # 未知等级按 basic 处理，配额为0表示不限
+    assert quota_windows("key", "gold", "requests")[0].limit == 10
+    assert quota_windows("key", "enterprise", "requests") == []
+
+
+@pytest.mark.asyncio
+async def test_cost_above_window_limit_is_rejected_without_retry_after(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_SENDS", '{"basic": 100}')
+    from fastapi import HTTPException, Response
+    from wecom.dependencies import enforce_quota
+
+    limiter = SlidingWindowLimiter(FakeAsyncRedis(), timeout=1)
+    monkeypatch.setattr("wecom.dependencies.get_rate_limiter", lambda: limiter)
+    enterprise = {"wecom_config": {"api_key": "key"}, "subscription_tier": "basic"}
+
+    with pytest.raises(HTTPException) as exc:
+        await enforce_quota(Response(), enterprise, "sends", 101)
+    assert exc.value.status_code == 413
+    assert "Retry-After" not in (exc.value.headers or {})
+
+    # 未计入用量，额度内的请求仍可通过
+    response = Response()
+    await enforce_quota(response, enterprise, "sends", 100)
+    assert response.headers["RateLimit-Remaining"] == "0"
@@ -0,0 +1,35 @@
+import pytest
+from wecom.core import redis_pool
+
+
+@pytest.fixture(autouse=True)
+def redis_env(monkeypatch):
+    monkeypatch.setenv("REDIS_HOST", "redis.test")
+    monkeypatch.setenv("REDIS_PORT", "6380")
+    monkeypatch.setenv("REDIS_PASSWORD", "s3cret")
+    monkeypatch.setenv("REDIS_MAX_CONNECTIONS", "7")
+    redis_pool.close_sync_redis()
+    yield
+    redis_pool.close_sync_redis()
+
+
+def test_sync_client_is_shared_and_configured_from_settings():
+    redis = redis_pool.get_sync_redis()
+    assert redis_pool.get_sync_redis() is redis
+
+    pool = redis.connection_pool
+    assert pool.max_connections == 7
+    assert pool.connection_kwargs["host"] == "redis.test"
+    assert pool.connection_kwargs["port"] == 6380
+    assert pool.connection_kwargs["password"] == "s3cret"
+
+
+@pytest.mark.asyncio
+async def test_async_client_is_shared_per_loop():
+    redis = redis_pool.get_async_redis()
+    assert redis_pool.get_async_redis() is redis
+    assert redis.connection_pool.connection_kwargs["password"] == "s3cret"
+
+    await redis_pool.close_async_redis()
+    assert redis_pool.get_async_redis() is not redis
+    await redis_pool.close_async_redis()
@@ -0,0 +1,83 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+from wecom.config import get_settings
+from wecom.core import subscriber_cache
+from wecom.dependencies import get_current_subscriber
+
+
+class Subscriber:
+    id = 1
+    company_name = "测试公司"
+    contact_email = "test@example.com"
+    wecom_corp_id = "test_corp_123"
+    is_active = True
+    subscription_tier = "basic"
+    hashed_password = "hashed"
+    created_at = datetime(2024, 1, 1)
+    updated_at = datetime(2024, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    subscriber_cache.verified_tokens.clear()
+    subscriber_cache.subscribers.clear()
+
+
+@pytest.fixture
+def db_lookups(monkeypatch):
+    lookups = []
+
+    async def get_subscriber_by_email(db, email):
+        lookups.append(email)
+        return Subscriber() if email == Subscriber.contact_email else None
+    monkeypatch.setattr("wecom.db.crud.get_subscriber_by_email", get_subscriber_by_email)
+    return lookups
+
+
+def make_token(email="test@example.com", minutes=15):
+    settings = get_settings()
+    return jwt.encode(
+        {"sub": email, "exp": datetime.utcnow() + timedelta(minutes=minutes)},
+        settings.SECRET_KEY, algorithm=settings.ALGORITHM
+    )
+
+
+@pytest.mark.asyncio
+async def test_repeated_requests_hit_cache(db_lookups):
+    token = make_token()
+    for _ in range(5):
+        subscriber = await get_current_subscriber(token=token, db=None)
+    assert subscriber.company_name == "测试公司"
+    assert db_lookups == ["test@example.com"]
+    stats = subscriber_cache.cache_stats()
+    assert stats["tokens"]["hits"] == 4
+    assert stats["subscribers"]["hits"] == 4
+
+
+@pytest.mark.asyncio
+async def test_invalidation_forces_reload(db_lookups):
+    token = make_token()
+    await get_current_subscriber(token=token, db=None)
+    subscriber_cache.invalidate_subscriber("test@example.com")
+    await get_current_subscriber(token=token, db=None)
+    assert len(db_lookups) == 2
+
+
+def test_claims_expire_with_token():
+    subscriber_cache.cache_claims("short", {"sub": "a", "exp": time.time() + 0.05})
+    subscriber_cache.cache_claims("expired", {"sub": "b", "exp": time.time() - 1})
+    assert subscriber_cache.get_claims("short") is not None
+    assert subscriber_cache.get_claims("expired") is None
+    time.sleep(0.06)
+    assert subscriber_cache.get_claims("short") is None
+
+
+@pytest.mark.asyncio
+async def test_invalid_token_not_cached(db_lookups):
+    with pytest.raises(HTTPException) as exc:
+        await get_current_subscriber(token="invalidtoken", db=None)
+    assert exc.value.status_code == 401
+    assert len(subscriber_cache.verified_tokens) == 0
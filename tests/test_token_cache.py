@@ -0,0 +1,114 @@
+import asyncio
+import time
+import pytest
+from fakeredis import FakeAsyncRedis, FakeServer
+from wecom.core.token_cache import AccessTokenCache
+
+
+def make_fetcher(counter, token="token_1", expires_in=7200, delay=0.01):
+    async def fetch():
+        counter.append(1)
+        await asyncio.sleep(delay)
+        return f"{token}_{len(counter)}", expires_in
+    return fetch
+
+
+@pytest.mark.asyncio
+async def test_concurrent_miss_fetches_once_across_workers():
+    """多个 worker 同时未命中时只请求一次企业微信"""
+    server = FakeServer()
+    workers = [AccessTokenCache(FakeAsyncRedis(server=server)) for _ in range(3)]
+    counter = []
+    fetch = make_fetcher(counter)
+
+    tokens = await asyncio.gather(*(
+        cache.get("corp_1", fetch) for cache in workers for _ in range(10)
+    ))
+
+    assert len(counter) == 1
+    assert set(tokens) == {"token_1_1"}
+
+
+@pytest.mark.asyncio
+async def test_l1_hit_skips_redis():
+    redis = FakeAsyncRedis()
+    cache = AccessTokenCache(redis)
+    counter = []
+    await cache.get("corp_1", make_fetcher(counter))
+    await redis.flushall()
+
+    assert await cache.get("corp_1", make_fetcher(counter)) == "token_1_1"
+    assert len(counter) == 1
+
+
+@pytest.mark.asyncio
+async def test_expiring_token_is_renewed_in_background():
+    cache = AccessTokenCache(FakeAsyncRedis(), ttl=7000, refresh_margin=600)
+    counter = []
+    fetch = make_fetcher(counter)
+    await cache.get("corp_1", fetch)
+    # 模拟即将过期：L1 与 Redis 中都只剩 60 秒
+    cache._local["corp_1"] = ("token_1_1", time.time() + 60)
+    await cache.redis.expire(cache.cache_key("corp_1"), 60)
+
+    # 当前请求仍拿到旧 token，续期在后台完成
+    assert await cache.get("corp_1", fetch) == "token_1_1"
+    await cache._refreshing["corp_1"]
+    assert len(counter) == 2
+    assert await cache.get("corp_1", fetch) == "token_1_2"
+
+
+@pytest.mark.asyncio
+async def test_delete_forces_refetch():
+    cache = AccessTokenCache(FakeAsyncRedis())
+    counter = []
+    fetch = make_fetcher(counter)
+    await cache.get("corp_1", fetch)
+    await cache.delete("corp_1")
+    assert await cache.get("corp_1", fetch) == "token_1_2"
+
+
+@pytest.mark.asyncio
+async def test_get_many_reads_l2_in_one_pipeline_and_fetches_only_misses():
+    server = FakeServer()
+    warm = AccessTokenCache(FakeAsyncRedis(server=server))
+    for corp_id in ("corp_1", "corp_2"):
+        await warm.get(corp_id, make_fetcher([], token=corp_id))
+
+    redis = FakeAsyncRedis(server=server)
+    cache = AccessTokenCache(redis)
+    pipelines = []
+    pipeline = redis.pipeline
+    redis.pipeline = lambda *a, **kw: pipelines.append(1) or pipeline(*a, **kw)
+    counters = {corp_id: [] for corp_id in ("corp_1", "corp_2", "corp_3")}
+
+    tokens = await cache.get_many({
+        corp_id: make_fetcher(counter, token=corp_id) for corp_id, counter in counters.items()
+    })
+
+    assert tokens == {"corp_1": "corp_1_1", "corp_2": "corp_2_1", "corp_3": "corp_3_1"}
+    assert [len(c) for c in counters.values()] == [0, 0, 1]
+    # 一次批量读取，加上 corp_3 刷新前的单独读取
+    assert len(pipelines) == 2
+
+    await redis.flushall()
+    assert await cache.get_many({"corp_1": make_fetcher([])}) == {"corp_1": "corp_1_1"}
+
+
+@pytest.mark.asyncio
+async def test_idle_corps_are_no_longer_renewed():
+    redis = FakeAsyncRedis()
+    cache = AccessTokenCache(redis, ttl=500, refresh_margin=600, idle_timeout=60)
+    counters = {corp_id: [] for corp_id in ("corp_1", "corp_2")}
+    for corp_id, counter in counters.items():
+        await cache.get(corp_id, make_fetcher(counter, token=corp_id))
+    cache._last_used["corp_1"] -= 120  # 两分钟前使用过
+
+    cache.start_refresher(interval=0.01)
+    await asyncio.sleep(0.1)
+    await cache.stop_refresher()
+
+    # 只有仍在使用的企业被续期
+    assert "corp_1" not in cache._fetchers and "corp_1" not in cache._local
+    assert len(counters["corp_1"]) == 1
+    assert len(counters["corp_2"]) > 1
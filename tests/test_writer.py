@@ -0,0 +1,171 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.pool import StaticPool
+from wecom.db import Base, Notification, Subscriber
+from wecom.db import writer as writer_module
+from wecom.db.registry import EngineRegistry
+from wecom.db.writer import BatchWriter, write_rows
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Subscriber.__table__.insert(), [{
+            "id": 1, "company_name": "公司", "contact_email": "u@example.com",
+            "wecom_corp_id": "corp", "hashed_password": "x"
+        }])
+    yield engine
+    engine.dispose()
+
+
+def _rows(n):
+    return [{"subscriber_id": 1, "recipient": f"user{i}", "status": "sent"} for i in range(n)]
+
+
+def _count(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(Notification.__table__)).scalar()
+
+
+class CountingWriter(BatchWriter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+
+    async def _flush(self, batch, cluster=None):
+        self.batches.append(len(batch))
+        await super()._flush(batch, cluster)
+
+
+class FakeCopyEngine:
+    """模拟 psycopg2 引擎，记录 COPY 语句与数据"""
+
+    class dialect:
+        name = "postgresql"
+        driver = "psycopg2"
+
+    def __init__(self):
+        self.copies = []
+
+    def raw_connection(self):
+        engine = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def copy_expert(self, sql, buf):
+                engine.copies.append((sql, buf.read()))
+
+        class Conn:
+            def cursor(self):
+                return Cursor()
+
+            def commit(self):
+                pass
+
+            def rollback(self):
+                pass
+
+            def close(self):
+                pass
+        return Conn()
+
+
+def test_write_rows_uses_copy_with_unquoted_nulls():
+    engine = FakeCopyEngine()
+    write_rows(engine, Notification.__table__, [
+        {"status": "sent", "recipient": "a", "subscriber_id": 1, "errcode": None, "content": 'say "hi"'},
+        {"status": "failed", "recipient": "b", "subscriber_id": 1, "errcode": 45009, "content": ""},
+    ])
+    (sql, data), = engine.copies
+    # 列按表定义的顺序，而不是第一条记录的键顺序
+    assert sql == ("COPY notifications (subscriber_id, recipient, content, status, errcode) "
+                   "FROM STDIN WITH (FORMAT csv)")
+    assert data.splitlines() == [
+        '"1","a","say ""hi""","sent",',
+        '"1","b","","failed","45009"',
+    ]
+
+
+def test_write_rows_insert_fallback(engine):
+    write_rows(engine, Notification.__table__, _rows(3))
+    assert _count(engine) == 3
+
+
+@pytest.mark.asyncio
+async def test_flushes_by_size_and_on_stop(engine):
+    writer = CountingWriter(Notification.__table__, engine=engine,
+                            batch_size=10, flush_interval=60, max_buffer=100)
+    writer.start()
+    await writer.put_many(_rows(25))
+    await writer.stop()
+    assert writer.batches == [10, 10, 5]
+    assert writer.written == 25
+    assert _count(engine) == 25
+
+
+@pytest.mark.asyncio
+async def test_flushes_by_interval(engine):
+    writer = BatchWriter(Notification.__table__, engine=engine,
+                         batch_size=1000, flush_interval=0.05, max_buffer=100)
+    writer.start()
+    await writer.put_many(_rows(3))
+    for _ in range(50):
+        if writer.written == 3:
+            break
+        await asyncio.sleep(0.02)
+    assert _count(engine) == 3
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_put_blocks_when_buffer_full(engine):
+    writer = BatchWriter(Notification.__table__, engine=engine,
+                         batch_size=1000, flush_interval=60, max_buffer=5)
+    writer._queue = asyncio.Queue(maxsize=writer.max_buffer)
+    writer._task = asyncio.get_running_loop().create_future()  # 模拟消费者暂停
+    await writer.put_many(_rows(5))
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(writer.put({"subscriber_id": 1, "recipient": "x"}), 0.05)
+    writer._task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_rows_are_written_to_their_cluster(engine, tmp_path, monkeypatch):
+    registry = EngineRegistry({"a": f"sqlite+aiosqlite:///{tmp_path / 'a'}.db"},
+                              pool_size=1, max_overflow=0, max_connections=10)
+    cluster_engine = await registry.get_engine("a")
+
+    @event.listens_for(cluster_engine.sync_engine, "connect")
+    def enable_foreign_keys(dbapi_conn, record):
+        dbapi_conn.execute("PRAGMA foreign_keys=ON")
+
+    # 分库中只有通知表，订阅者和企业只在默认库中
+    async with cluster_engine.begin() as conn:
+        await conn.run_sync(Notification.__table__.create)
+    monkeypatch.setattr(writer_module, "engine_registry", registry)
+
+    writer = CountingWriter(Notification.__table__, engine=engine,
+                            batch_size=10, flush_interval=60, max_buffer=100)
+    writer.start()
+    await writer.put_many(_rows(3), cluster="a")
+    await writer.put_many(_rows(2))
+    await writer.put_many(_rows(1), cluster="unknown")  # 未配置的集群写入默认库
+    await writer.stop()
+
+    assert sorted(writer.batches) == [1, 2, 3]
+    assert writer.dropped == 0
+    assert _count(engine) == 3
+    async with cluster_engine.connect() as conn:
+        count = await conn.execute(select(func.count()).select_from(Notification.__table__))
+        assert count.scalar() == 3
+    await registry.dispose_all()